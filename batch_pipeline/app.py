@@ -1,16 +1,17 @@
 #!/usr/bin/env python3
 import argparse
+import functools
+import glob
 import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
-# Import the pipeline
-from pipelines.pipeline import get_pipeline, upload_pipeline
+from infra.batch_config import BatchConfig, DriftConfig
 
-from aws_cdk import core
-from infra.batch_config import BatchConfig
-from infra.sagemaker_pipeline_stack import SageMakerPipelineStack
-from infra.model_registry import ModelRegistry
+if TYPE_CHECKING:
+    from aws_cdk import core
 
 
 # Configure the logger
@@ -18,11 +19,31 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
 
 
-registry = ModelRegistry()
+# Heavy modules (aws_cdk, sagemaker and boto3) are imported on the code paths that
+# use them, to keep the app startup fast.  See test_app.py for the import budget.
 
 
-def create_pipeline(
-    app: core.App,
+@functools.lru_cache(maxsize=None)
+def get_registry():
+    """Gets the registry that caches lookups shared by the stages, and optionally
+    across synth invocations."""
+    from infra.model_registry import ModelRegistry
+
+    return ModelRegistry(
+        cache_ttl=int(os.environ.get("MODEL_REGISTRY_CACHE_TTL", 300)),
+        cache_path=os.environ.get("MODEL_REGISTRY_CACHE_PATH"),
+    )
+
+
+def get_stage_names(config_pattern: str = "*-config.json"):
+    """Gets the sorted stage names from the stage specific config files."""
+    return sorted(
+        os.path.basename(path)[: -len("-config.json")]
+        for path in glob.glob(config_pattern)
+    )
+
+
+def resolve_pipeline(
     project_name: str,
     project_id: str,
     region: str,
@@ -31,6 +52,10 @@ def create_pipeline(
     artifact_bucket: str,
     stage_name: str,
 ):
+    from pipelines.pipeline import get_pipeline, upload_pipeline
+
+    registry = get_registry()
+
     # Get the stage specific deployment config for sagemaker
     with open(f"{stage_name}-config.json", "r") as f:
         j = json.load(f)
@@ -57,6 +82,13 @@ def create_pipeline(
     # Set the default input data uri
     data_uri = f"s3://{artifact_bucket}/{project_id}/batch/{stage_name}"
 
+    # Select the input data partitions with a manifest if enabled
+    manifest_uri = None
+    if batch_config.input_manifest:
+        manifest_uri = (
+            f"s3://{artifact_bucket}/{project_id}/manifests/batch-{stage_name}.json"
+        )
+
     # set the output transform uri
     transform_uri = f"s3://{artifact_bucket}/{project_id}/transform/{stage_name}"
 
@@ -74,9 +106,16 @@ def create_pipeline(
 
     # If we have drift configuration then get the baseline uri
     baseline_uri = None
+    drift_args = {}
     if batch_config.drift_config is not None:
         baseline_uri = registry.get_processing_output(pipeline_execution_arn)
         logger.info(f"Got baseline uri: {baseline_uri}")
+        drift_args = {
+            "inline_drift": batch_config.drift_config.inline,
+            "drift_sample_size": batch_config.drift_config.sample_size,
+            "drift_sample_fraction": batch_config.drift_config.sample_fraction,
+            "drift_confidence_level": batch_config.drift_config.confidence_level,
+        }
 
     # Create batch pipeline
     pipeline = get_pipeline(
@@ -90,6 +129,13 @@ def create_pipeline(
         model_uri=model_uri,
         transform_uri=transform_uri,
         baseline_uri=baseline_uri,
+        manifest_uri=manifest_uri,
+        compact_scores=batch_config.compact_scores,
+        score_columns=batch_config.score_columns,
+        compiled_predictor=batch_config.compiled_predictor,
+        prediction_cache=batch_config.prediction_cache,
+        profile_metrics=batch_config.profile_metrics,
+        **drift_args,
     )
 
     # Create the pipeline definition
@@ -106,22 +152,46 @@ def create_pipeline(
         base_job_prefix=f"{project_id}/batch-{stage_name}",
     )
 
+    return {
+        "stage_name": stage_name,
+        "pipeline_name": sagemaker_pipeline_name,
+        "pipeline_description": sagemaker_pipeline_description,
+        "pipeline_definition_key": pipeline_definition_key,
+        "drift_config": batch_config.drift_config,
+    }
+
+
+def create_pipeline(
+    app: "core.App",
+    project_name: str,
+    project_id: str,
+    sagemaker_pipeline_role_arn: str,
+    artifact_bucket: str,
+    stage_name: str,
+    pipeline_name: str,
+    pipeline_description: str,
+    pipeline_definition_key: str,
+    drift_config: DriftConfig,
+):
+    from aws_cdk import core
+    from infra.sagemaker_pipeline_stack import SageMakerPipelineStack
+
     tags = [
         core.CfnTag(key="sagemaker:deployment-stage", value=stage_name),
         core.CfnTag(key="sagemaker:project-id", value=project_id),
         core.CfnTag(key="sagemaker:project-name", value=project_name),
     ]
 
-    SageMakerPipelineStack(
+    return SageMakerPipelineStack(
         app,
         f"drift-batch-{stage_name}",
-        pipeline_name=sagemaker_pipeline_name,
-        pipeline_description=sagemaker_pipeline_description,
+        pipeline_name=pipeline_name,
+        pipeline_description=pipeline_description,
         pipeline_definition_bucket=artifact_bucket,
         pipeline_definition_key=pipeline_definition_key,
         sagemaker_role_arn=sagemaker_pipeline_role_arn,
         tags=tags,
-        drift_config=batch_config.drift_config,
+        drift_config=drift_config,
     )
 
 
@@ -133,30 +203,40 @@ def main(
     lambda_role_arn: str,
     artifact_bucket: str,
 ):
-    # Create App and stacks
-    app = core.App()
+    # Resolve the stages concurrently, as each blocks on registry lookups and uploads
+    stage_names = get_stage_names()
+    logger.info(f"Resolving stages: {stage_names}")
+    get_registry()
+    with ThreadPoolExecutor(max_workers=max(len(stage_names), 1)) as executor:
+        futures = [
+            executor.submit(
+                resolve_pipeline,
+                project_name=project_name,
+                project_id=project_id,
+                region=region,
+                sagemaker_pipeline_role_arn=sagemaker_pipeline_role_arn,
+                lambda_role_arn=lambda_role_arn,
+                artifact_bucket=artifact_bucket,
+                stage_name=stage_name,
+            )
+            for stage_name in stage_names
+        ]
+        resolved = [future.result() for future in futures]
 
-    create_pipeline(
-        app=app,
-        project_name=project_name,
-        project_id=project_id,
-        region=region,
-        sagemaker_pipeline_role_arn=sagemaker_pipeline_role_arn,
-        lambda_role_arn=lambda_role_arn,
-        artifact_bucket=artifact_bucket,
-        stage_name="staging",
-    )
+    # Create App and stacks on the main thread, in stage order
+    from aws_cdk import core
 
-    create_pipeline(
-        app=app,
-        project_name=project_name,
-        project_id=project_id,
-        region=region,
-        sagemaker_pipeline_role_arn=sagemaker_pipeline_role_arn,
-        lambda_role_arn=lambda_role_arn,
-        artifact_bucket=artifact_bucket,
-        stage_name="prod",
-    )
+    app = core.App()
+
+    for stage in resolved:
+        create_pipeline(
+            app=app,
+            project_name=project_name,
+            project_id=project_id,
+            sagemaker_pipeline_role_arn=sagemaker_pipeline_role_arn,
+            artifact_bucket=artifact_bucket,
+            **stage,
+        )
 
     app.synth()
 
@@ -8,7 +8,13 @@ class DriftConfig:
         evaluation_periods: int = 1,
         datapoints_to_alarm: int = 1,
         statistic: str = "Average",
+        inline: bool = False,
+        sample_size: int = None,
+        sample_fraction: float = None,
+        confidence_level: float = 0.95,
     ):
+        if sample_size is not None and sample_fraction is not None:
+            raise ValueError("Specify only one of sample_size or sample_fraction")
         self.metric_name = metric_name
         self.metric_threshold = metric_threshold
         self.comparison_operator = comparison_operator
@@ -16,6 +22,10 @@ class DriftConfig:
         self.datapoints_to_alarm = datapoints_to_alarm
         self.evaluation_periods = evaluation_periods
         self.statistic = statistic
+        self.inline = inline
+        self.sample_size = sample_size
+        self.sample_fraction = sample_fraction
+        self.confidence_level = confidence_level
 
 
 class BatchConfig:
@@ -28,6 +38,12 @@ class BatchConfig:
         model_package_arn: str = None,
         model_monitor_enabled: bool = False,
         drift_config: dict = None,
+        input_manifest: bool = False,
+        compact_scores: bool = False,
+        score_columns: list = None,
+        compiled_predictor: bool = False,
+        prediction_cache: bool = False,
+        profile_metrics: bool = False,
     ):
         self.stage_name = stage_name
         self.instance_count = instance_count
@@ -35,6 +51,12 @@ class BatchConfig:
         self.model_package_version = model_package_version
         self.model_package_arn = model_package_arn
         self.model_monitor_enabled = model_monitor_enabled
+        self.input_manifest = input_manifest
+        self.compact_scores = compact_scores
+        self.score_columns = score_columns
+        self.compiled_predictor = compiled_predictor
+        self.prediction_cache = prediction_cache
+        self.profile_metrics = profile_metrics
         if type(drift_config) is dict:
             self.drift_config = DriftConfig(**drift_config)
         else:
@@ -1,4 +1,11 @@
+import copy
+import functools
 import logging
+import os
+import pickle
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
 
 import boto3
@@ -8,14 +15,100 @@ from botocore.exceptions import ClientError
 logger = logging.getLogger(__name__)
 
 
+def cached(method):
+    """Caches the result of a registry lookup by method name and arguments."""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = f"{method.__name__}:{args!r}:{sorted(kwargs.items())!r}"
+        return self.get_cached(key, lambda: method(self, *args, **kwargs))
+
+    return wrapper
+
+
 class ModelRegistry:
     """
     Class for managing models in the registry.
     """
 
-    def __init__(self):
+    def __init__(self, cache_ttl: int = 300, cache_path: str = None):
+        """Creates the registry client.
+
+        Args:
+            cache_ttl: The number of seconds to cache registry lookups for.
+            cache_path: Optional pickle file to share cached lookups across processes.
+        """
         config = Config(retries={"max_attempts": 10, "mode": "standard"})
         self.sm_client = boto3.client("sagemaker", config=config)
+        self.cache_ttl = cache_ttl
+        self.cache_path = cache_path
+        self.cache_lock = threading.Lock()
+        self.cache = self.load_cache()
+        # The lookups in flight by key, which concurrent misses wait on
+        self.pending = {}
+
+    def load_cache(self) -> dict:
+        """Loads the unexpired entries from the on-disk cache if it exists."""
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "rb") as f:
+                cache = pickle.load(f)
+            now = time.time()
+            return {k: v for k, v in cache.items() if v[0] > now}
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning(f"Ignoring registry cache {self.cache_path}: {e}")
+            return {}
+
+    def get_cached(self, key: str, fn):
+        """Returns the cached value for a key, or calls fn and caches the result.
+
+        Args:
+            key: The cache key.
+            fn: The function to call on a cache miss.
+
+        Concurrent misses for the same key wait for the first call to complete, so
+        fn is called once per key however many threads look it up.
+
+        Returns:
+            A copy of the cached value.
+        """
+        with self.cache_lock:
+            entry = self.cache.get(key)
+            if entry is not None and entry[0] > time.time():
+                logger.debug(f"Registry cache hit: {key}")
+                return copy.deepcopy(entry[1])
+            future = self.pending.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = self.pending[key] = Future()
+        if not is_owner:
+            logger.debug(f"Registry cache wait: {key}")
+            return copy.deepcopy(future.result())
+
+        try:
+            value = fn()
+        except BaseException as e:
+            with self.cache_lock:
+                del self.pending[key]
+            future.set_exception(e)
+            raise
+        entry = (time.time() + self.cache_ttl, copy.deepcopy(value))
+        with self.cache_lock:
+            self.cache[key] = entry
+            del self.pending[key]
+            if self.cache_path is not None:
+                with open(self.cache_path, "wb") as f:
+                    pickle.dump(self.cache, f)
+        future.set_result(entry[1])
+        return value
+
+    def clear_cache(self):
+        """Clears the cached registry lookups."""
+        with self.cache_lock:
+            self.cache = {}
+            if self.cache_path is not None and os.path.exists(self.cache_path):
+                os.remove(self.cache_path)
 
     def create_model_package_group(
         self,
@@ -59,6 +152,7 @@ class ModelRegistry:
                 logger.error(error_message)
                 raise Exception(error_message)
 
+    @cached
     def get_latest_approved_packages(
         self,
         model_package_group_name: str,
@@ -116,6 +210,7 @@ class ModelRegistry:
             logger.error(error_message)
             raise Exception(error_message)
 
+    @cached
     def get_versioned_approved_packages(
         self,
         model_package_group_name: str,
@@ -136,7 +231,7 @@ class ModelRegistry:
         unique_versions = set(model_package_versions)
 
         try:
-            # Get the approved model package until
+            # Get the approved model package until all versions are found
             args = {
                 "ModelPackageGroupName": model_package_group_name,
                 "ModelApprovalStatus": "Approved",
@@ -144,35 +239,37 @@ class ModelRegistry:
                 "MaxResults": max_results,
             }
             response = self.sm_client.list_model_packages(**args)
-            model_packages = self.select_versioned_packages(
+            versioned_packages = self.index_versioned_packages(
                 response["ModelPackageSummaryList"], unique_versions
             )
 
-            # Fetch more packages if none returned with continuation token
+            # Fetch more packages if not all found with continuation token
             while (
-                len(model_packages) < len(unique_versions) and "NextToken" in response
+                len(versioned_packages) < len(unique_versions)
+                and "NextToken" in response
             ):
                 logger.debug(
                     "Getting more packages for token: {}".format(response["NextToken"])
                 )
                 args = {**args, "NextToken": response["NextToken"]}
                 response = self.sm_client.list_model_packages(**args)
-                model_packages.extend(
-                    self.select_versioned_packages(
-                        response["ModelPackageSummaryList"], unique_versions
-                    )
+                self.index_versioned_packages(
+                    response["ModelPackageSummaryList"],
+                    unique_versions,
+                    versioned_packages,
                 )
 
             # Return error if no packages found
-            if len(model_packages) == 0:
+            if len(versioned_packages) == 0:
                 error_message = f"No approved packages found for: {model_package_group_name} and versions: {model_package_versions}"
                 logger.error(error_message)
                 raise Exception(error_message)
 
             # Return as a list of model package group in order of versions
-            return self.select_versioned_packages(
-                model_packages, model_package_versions
-            )
+            model_packages = []
+            for version in model_package_versions:
+                model_packages += versioned_packages.get(version, [])
+            return model_packages
 
         except ClientError as e:
             error_message = e.response["Error"]["Message"]
@@ -193,13 +290,54 @@ class ModelRegistry:
             Duplicate versions will be preserved.
         """
 
+        versioned_packages = self.index_versioned_packages(
+            model_packages, set(model_package_versions)
+        )
         filtered_packages = []
         for version in model_package_versions:
-            filtered_packages += [
-                p for p in model_packages if p["ModelPackageVersion"] == version
-            ]
+            filtered_packages += versioned_packages.get(version, [])
         return filtered_packages
 
+    def index_versioned_packages(
+        self,
+        model_packages: list,
+        model_package_versions: set,
+        versioned_packages: dict = None,
+    ) -> dict:
+        """Indexes the model packages by version for a set of model package versions.
+
+        Args:
+            model_packages: The list of packages.
+            model_package_versions: The set of versions to index.
+            versioned_packages: Optional existing index to add the packages to.
+
+        Returns:
+            The dict of version to the list of packages with that version.
+        """
+
+        if versioned_packages is None:
+            versioned_packages = {}
+        for p in model_packages:
+            version = p["ModelPackageVersion"]
+            if version in model_package_versions:
+                versioned_packages.setdefault(version, []).append(p)
+        return versioned_packages
+
+    @cached
+    def get_execution_index(self, pipeline_execution_arn: str):
+        """Returns the index of steps and jobs for a pipeline execution.
+
+        Args:
+            pipeline_execution_arn: The pipeline execution arn
+
+        Returns:
+            The pipeline execution index
+        """
+        return PipelineExecutionIndex.from_execution(
+            self.sm_client, pipeline_execution_arn
+        )
+
+    @cached
     def get_pipeline_execution_arn(self, model_package_arn: str):
         """Geturns the execution arn for the latest approved model package
 
@@ -217,6 +355,7 @@ class ModelRegistry:
             "MetadataProperties"
         ]["GeneratedBy"]
 
+    @cached
     def get_model_artifact(
         self,
         pipeline_execution_arn: str,
@@ -232,20 +371,10 @@ class ModelRegistry:
             The model artifact from the training job
         """
 
-        steps = self.sm_client.list_pipeline_execution_steps(
-            PipelineExecutionArn=pipeline_execution_arn
-        )["PipelineExecutionSteps"]
-        training_job_arn = [
-            s["Metadata"]["TrainingJob"]["Arn"]
-            for s in steps
-            if s["StepName"] == step_name
-        ][0]
-        training_job_name = training_job_arn.split("/")[-1]
-        outputs = self.sm_client.describe_training_job(
-            TrainingJobName=training_job_name
-        )
-        return outputs["ModelArtifacts"]["S3ModelArtifacts"]
+        index = self.get_execution_index(pipeline_execution_arn)
+        return index.get_model_artifact(step_name)
 
+    @cached
     def get_processing_output(
         self,
         pipeline_execution_arn: str,
@@ -263,18 +392,81 @@ class ModelRegistry:
             The output from the processing job
         """
 
-        steps = self.sm_client.list_pipeline_execution_steps(
-            PipelineExecutionArn=pipeline_execution_arn
-        )["PipelineExecutionSteps"]
-        processing_job_arn = [
-            s["Metadata"]["ProcessingJob"]["Arn"]
-            for s in steps
-            if s["StepName"] == step_name
-        ][0]
-        processing_job_name = processing_job_arn.split("/")[-1]
-        outputs = self.sm_client.describe_processing_job(
-            ProcessingJobName=processing_job_name
-        )["ProcessingOutputConfig"]["Outputs"]
-        return [
-            o["S3Output"]["S3Uri"] for o in outputs if o["OutputName"] == output_name
-        ][0]
+        index = self.get_execution_index(pipeline_execution_arn)
+        return index.get_processing_output(step_name, output_name)
+
+
+class PipelineExecutionIndex:
+    """
+    Index of the steps of a pipeline execution and the jobs they created.
+    """
+
+    def __init__(self, steps: dict, training_jobs: dict, processing_jobs: dict):
+        self.steps = steps
+        self.training_jobs = training_jobs
+        self.processing_jobs = processing_jobs
+
+    @classmethod
+    def from_execution(
+        cls, sm_client, pipeline_execution_arn: str, max_workers: int = 8
+    ):
+        """Fetches all steps of a pipeline execution and describes their jobs.
+
+        Args:
+            sm_client: The sagemaker client.
+            pipeline_execution_arn: The pipeline execution arn.
+            max_workers: The number of concurrent describe job calls.
+
+        Returns:
+            The index of steps by step name.
+        """
+        args = {"PipelineExecutionArn": pipeline_execution_arn}
+        response = sm_client.list_pipeline_execution_steps(**args)
+        step_list = response["PipelineExecutionSteps"]
+        while "NextToken" in response:
+            args = {**args, "NextToken": response["NextToken"]}
+            response = sm_client.list_pipeline_execution_steps(**args)
+            step_list.extend(response["PipelineExecutionSteps"])
+        steps = {s["StepName"]: s for s in step_list}
+
+        # Describe the training and processing jobs in a single concurrent batch
+        describe = {
+            "TrainingJob": lambda name: sm_client.describe_training_job(
+                TrainingJobName=name
+            ),
+            "ProcessingJob": lambda name: sm_client.describe_processing_job(
+                ProcessingJobName=name
+            ),
+        }
+        jobs = [
+            (step_name, job_type, s["Metadata"][job_type]["Arn"].split("/")[-1])
+            for step_name, s in steps.items()
+            for job_type in describe
+            if job_type in s.get("Metadata", {})
+        ]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            responses = list(executor.map(lambda j: describe[j[1]](j[2]), jobs))
+        described = {job_type: {} for job_type in describe}
+        for (step_name, job_type, _), response in zip(jobs, responses):
+            described[job_type][step_name] = response
+        return cls(steps, described["TrainingJob"], described["ProcessingJob"])
+
+    def get_model_artifact(self, step_name: str = "TrainModel"):
+        """Returns the training job model artifact uri for a given step name."""
+        if step_name not in self.training_jobs:
+            raise Exception(f"No training job found for step: {step_name}")
+        return self.training_jobs[step_name]["ModelArtifacts"]["S3ModelArtifacts"]
+
+    def get_processing_output(
+        self,
+        step_name: str = "BaselineJob",
+        output_name: str = "monitoring_output",
+    ):
+        """Returns a processing job output uri for a given step and output name."""
+        if step_name not in self.processing_jobs:
+            raise Exception(f"No processing job found for step: {step_name}")
+        outputs = self.processing_jobs[step_name]["ProcessingOutputConfig"]["Outputs"]
+        for o in outputs:
+            if o["OutputName"] == output_name:
+                return o["S3Output"]["S3Uri"]
+        raise Exception(f"No output: {output_name} found for step: {step_name}")
@@ -1,6 +1,7 @@
 import boto3
 from datetime import datetime
 import logging
+import math
 import os
 import re
 import json
@@ -19,9 +20,12 @@ def get_processing_job(processing_job_name):
     response = sm_client.describe_processing_job(ProcessingJobName=processing_job_name)
     status = response["ProcessingJobStatus"]
     exit_message = response["ExitMessage"]
-    s3_result_uri = response["ProcessingOutputConfig"]["Outputs"][0]["S3Output"][
-        "S3Uri"
-    ]
+    # Select the monitoring output, which is not the first output for inline drift
+    outputs = response["ProcessingOutputConfig"]["Outputs"]
+    output = next(
+        (o for o in outputs if o["OutputName"] == "monitoring_output"), outputs[0]
+    )
+    s3_result_uri = output["S3Output"]["S3Uri"]
     url_parsed = urlparse(s3_result_uri)
     result_bucket, result_path = url_parsed.netloc, url_parsed.path.lstrip("/")
     return status, exit_message, result_bucket, result_path
@@ -35,18 +39,55 @@ def get_s3_results_json(bucket_name, key_prefix, filename):
     return json.loads(s3_object["Body"].read())
 
 
-def get_baseline_drift(feature):
+def get_sample_error(statistics, confidence_level):
+    # Bound on the cdf error of the sampled rows by the Dvoretzky-Kiefer-Wolfowitz inequality
+    item_count = statistics["dataset"]["item_count"]
+    if item_count == 0:
+        return 1.0
+    return min(math.sqrt(math.log(2 / (1 - confidence_level)) / (2 * item_count)), 1.0)
+
+
+def get_baseline_drift(feature, sample_error=None):
     if "violations" in feature:
         for violation in feature["violations"]:
             if violation["constraint_check_type"] == "baseline_drift_check":
                 desc = violation["description"]
                 matches = re.search("distance: (.+) exceeds threshold: (.+)", desc)
+                metric_prefix = f'feature_baseline_drift_{violation["feature_name"]}'
                 if matches:
+                    distance = float(matches.group(1))
                     yield {
-                        "metric_name": f'feature_baseline_drift_{violation["feature_name"]}',
-                        "metric_value": float(matches.group(1)),
+                        "metric_name": metric_prefix,
+                        "metric_value": distance,
                         "metric_threshold": float(matches.group(2)),
                     }
+                    # Bounds of the distance of a sampled model monitor input
+                    if sample_error is not None:
+                        yield {
+                            "metric_name": f"{metric_prefix}_lower",
+                            "metric_value": max(distance - sample_error, 0.0),
+                        }
+                        yield {
+                            "metric_name": f"{metric_prefix}_upper",
+                            "metric_value": distance + sample_error,
+                        }
+                # Native drift metrics computed by the batch pipeline
+                for metric_name, metric_value in violation.get("metrics", {}).items():
+                    yield {
+                        "metric_name": f"{metric_prefix}_{metric_name}",
+                        "metric_value": metric_value,
+                    }
+                # Bounds of the native drift metrics of a sample
+                intervals = violation.get("confidence_intervals", {})
+                for metric_name, (lower, upper) in intervals.items():
+                    yield {
+                        "metric_name": f"{metric_prefix}_{metric_name}_lower",
+                        "metric_value": lower,
+                    }
+                    yield {
+                        "metric_name": f"{metric_prefix}_{metric_name}_upper",
+                        "metric_value": upper,
+                    }
 
 
 def put_cloudwatch_metric(pipeline_name: str, metrics: list):
@@ -89,7 +130,15 @@ def lambda_handler(event, context):
                 )
                 status_code = 400
                 status = "CompletedWithViolations"
-                metrics = list(get_baseline_drift(violations))
+                sample_error = None
+                if "ConfidenceLevel" in event:
+                    statistics = get_s3_results_json(
+                        result_bucket, result_path, "statistics.json"
+                    )
+                    sample_error = get_sample_error(
+                        statistics, float(event["ConfidenceLevel"])
+                    )
+                metrics = list(get_baseline_drift(violations, sample_error))
                 put_cloudwatch_metric(pipeline_name, metrics)
             except:
                 logger.info("No violations")
@@ -0,0 +1,376 @@
+"""Drift metrics between a Model Monitor baseline and a scored batch.
+
+Computes PSI, two-sample KS, Jensen-Shannon divergence and 1-D Wasserstein
+distance for all features at once, using the KLL bucket histograms from the
+baseline `statistics.json` as a shared binning.  The results are emitted as a
+`constraint_violations.json` compatible report so the EvaluateDrift lambda can
+consume them unchanged.  When the batch is sampled, the KS and Wasserstein
+distances are reported with confidence bounds on the sampling error.
+"""
+import numpy as np
+import pandas as pd
+
+DRIFT_METRICS = ("psi", "ks", "js", "wasserstein")
+
+# Smoothing applied to empty bins for the log based metrics
+EPSILON = 1e-6
+
+# Metrics with a confidence bound from the sample size
+BOUNDED_METRICS = ("ks", "wasserstein")
+
+
+def baseline_histograms(statistics: dict):
+    """Gets the baseline bin edges and counts for each numerical feature.
+
+    Bins are extended with an underflow and overflow bin so that batch values
+    outside of the baseline range are counted as drift.
+
+    Args:
+        statistics: The Model Monitor baseline statistics.
+
+    Returns:
+        A tuple of feature names, edges of shape (F, B+1) padded with nan, and
+        counts of shape (F, B+2) padded with zeros.
+    """
+    names, bucket_list = [], []
+    for feature in statistics["features"]:
+        num_stats = feature.get("numerical_statistics")
+        if num_stats is None or "distribution" not in num_stats:
+            continue
+        buckets = num_stats["distribution"]["kll"]["buckets"]
+        if len(buckets) > 0:
+            names.append(feature["name"])
+            bucket_list.append(buckets)
+
+    max_buckets = max([len(b) for b in bucket_list], default=0)
+    edges = np.full((len(names), max_buckets + 1), np.nan)
+    counts = np.zeros((len(names), max_buckets + 2))
+    for i, buckets in enumerate(bucket_list):
+        edges[i, : len(buckets)] = [b["lower_bound"] for b in buckets]
+        edges[i, len(buckets)] = buckets[-1]["upper_bound"]
+        counts[i, 1 : len(buckets) + 1] = [b["count"] for b in buckets]
+    return names, edges, counts
+
+
+def bin_counts(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Counts the values of each feature column into the baseline bins.
+
+    Args:
+        values: The batch values of shape (N, F), missing values as nan.
+        edges: The padded bin edges of shape (F, B+1).
+
+    Returns:
+        The counts of shape (F, B+2) including underflow and overflow bins.
+    """
+    num_features, num_bins = edges.shape[0], edges.shape[1] + 1
+    index = np.empty(values.shape, dtype=np.int64)
+    for i in range(num_features):
+        e = edges[i][~np.isnan(edges[i])]
+        # Bin 0 is underflow and bin len(e) is overflow, buckets include their upper edge
+        index[:, i] = np.searchsorted(e, values[:, i], side="left")
+        index[values[:, i] == e[0], i] = 1
+        index[np.isnan(values[:, i]), i] = -1
+    # Count all features in a single pass by offsetting each feature's bin index
+    offset = index + np.arange(num_features) * num_bins
+    counts = np.bincount(offset[index >= 0], minlength=num_features * num_bins)
+    return counts.reshape(num_features, num_bins).astype(float)
+
+
+def bin_centers(edges: np.ndarray) -> np.ndarray:
+    """Gets the bin centers, with underflow and overflow placed on the outer edges."""
+    rows = np.arange(edges.shape[0])
+    last = np.sum(~np.isnan(edges), axis=1) - 1
+    centers = np.full((edges.shape[0], edges.shape[1] + 1), np.nan)
+    centers[:, 0] = edges[:, 0]
+    centers[:, 1:-1] = (edges[:, :-1] + edges[:, 1:]) / 2
+    centers[rows, last + 1] = edges[rows, last]
+    return centers
+
+
+def bin_widths(edges: np.ndarray) -> np.ndarray:
+    """Gets the distances between the bin centers, of shape (F, B+1)."""
+    return np.nan_to_num(np.diff(bin_centers(edges), axis=1))
+
+
+def drift_metrics(
+    baseline_counts: np.ndarray,
+    batch_counts: np.ndarray,
+    edges: np.ndarray,
+) -> dict:
+    """Computes the drift metrics for all features at once.
+
+    Args:
+        baseline_counts: The baseline counts of shape (F, B+2).
+        batch_counts: The batch counts of shape (F, B+2).
+        edges: The padded bin edges of shape (F, B+1).
+
+    Returns:
+        A dict of metric name to an array of shape (F,).
+    """
+    p = normalize(baseline_counts)
+    q = normalize(batch_counts)
+
+    # Distance between cumulative distributions for KS and Wasserstein
+    cdf_diff = np.abs(np.cumsum(p, axis=1) - np.cumsum(q, axis=1))
+    widths = bin_widths(edges)
+
+    # Smooth empty bins for the log based metrics
+    ps = normalize(p + EPSILON)
+    qs = normalize(q + EPSILON)
+    m = (ps + qs) / 2
+
+    return {
+        "psi": np.sum((qs - ps) * np.log(qs / ps), axis=1),
+        "ks": np.max(cdf_diff, axis=1),
+        "js": 0.5 * np.sum(ps * np.log2(ps / m), axis=1)
+        + 0.5 * np.sum(qs * np.log2(qs / m), axis=1),
+        "wasserstein": np.sum(cdf_diff[:, :-1] * widths, axis=1),
+    }
+
+
+def confidence_intervals(
+    metrics: dict,
+    edges: np.ndarray,
+    sample_counts: np.ndarray,
+    confidence_level: float = 0.95,
+) -> dict:
+    """Computes confidence bounds on the KS and Wasserstein distances of a sample.
+
+    By the Dvoretzky-Kiefer-Wolfowitz inequality the sample cdf of each feature is
+    within `eps = sqrt(ln(2 / alpha) / 2n)` of the cdf of the whole batch with
+    probability `1 - alpha`, which bounds the error of the KS distance by `eps`
+    and of the Wasserstein distance by `eps` times the width of the bins.
+
+    Args:
+        metrics: The dict of metric name to array of values per feature.
+        edges: The padded bin edges of shape (F, B+1).
+        sample_counts: The number of sampled values of each feature of shape (F,).
+        confidence_level: The probability that the bounds hold.
+
+    Returns:
+        A dict of metric name to a tuple of lower and upper bound arrays.
+    """
+    n = np.asarray(sample_counts, dtype=float)
+    # Features without sampled values can have any cdf
+    eps = np.ones_like(n)
+    eps[n > 0] = np.sqrt(np.log(2 / (1 - confidence_level)) / (2 * n[n > 0]))
+    eps = np.minimum(eps, 1.0)
+    errors = {"ks": eps, "wasserstein": eps * bin_widths(edges).sum(axis=1)}
+    return {
+        name: (
+            np.maximum(metrics[name] - errors[name], 0.0),
+            metrics[name] + errors[name],
+        )
+        for name in BOUNDED_METRICS
+    }
+
+
+def normalize(counts: np.ndarray) -> np.ndarray:
+    """Normalizes counts of shape (F, B) into probabilities per feature."""
+    totals = counts.sum(axis=-1, keepdims=True)
+    return np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+
+
+def get_threshold(constraints: dict, default: float = 0.1) -> float:
+    """Gets the distribution comparison threshold from the baseline constraints."""
+    monitoring_config = constraints.get("monitoring_config", {})
+    distribution = monitoring_config.get("distribution_constraints", {})
+    return float(distribution.get("comparison_threshold", default))
+
+
+def violations_report(
+    names: list,
+    metrics: dict,
+    threshold: float,
+    metric_name: str = "ks",
+    intervals: dict = None,
+) -> dict:
+    """Creates a constraint violations report for features that exceed the threshold.
+
+    Args:
+        names: The feature names.
+        metrics: The dict of metric name to array of values per feature.
+        threshold: The drift threshold for the selected metric.
+        metric_name: The metric that is compared to the threshold.
+        intervals: The optional dict of metric name to lower and upper bounds,
+            reported beside the metrics of a sampled batch.
+
+    Returns:
+        The report in the Model Monitor `constraint_violations.json` format.
+    """
+    violations = []
+    for i, name in enumerate(names):
+        distance = float(metrics[metric_name][i])
+        if distance > threshold:
+            violation = {
+                "feature_name": name,
+                "constraint_check_type": "baseline_drift_check",
+                "description": f"Baseline drift distance: {distance} exceeds threshold: {threshold}",
+                "metrics": {k: float(metrics[k][i]) for k in metrics},
+            }
+            if intervals is not None:
+                violation["confidence_intervals"] = {
+                    k: [float(lower[i]), float(upper[i])]
+                    for k, (lower, upper) in intervals.items()
+                }
+            violations.append(violation)
+    return {"violations": violations}
+
+
+def compare_to_baseline(
+    statistics: dict,
+    constraints: dict,
+    df: pd.DataFrame,
+    metric_name: str = "ks",
+) -> dict:
+    """Compares a scored batch to the baseline and returns the violations report.
+
+    Args:
+        statistics: The Model Monitor baseline statistics.
+        constraints: The Model Monitor baseline constraints.
+        df: The scored batch with the same columns as the baseline.
+        metric_name: The metric that is compared to the threshold.
+
+    Returns:
+        The report in the Model Monitor `constraint_violations.json` format.
+    """
+    names, edges, baseline_counts = baseline_histograms(statistics)
+    values = df.reindex(columns=names).to_numpy(dtype=float)
+    metrics = drift_metrics(baseline_counts, bin_counts(values, edges), edges)
+    return violations_report(names, metrics, get_threshold(constraints), metric_name)
+
+
+class DriftAccumulator:
+    """Accumulates streaming per-feature statistics for a batch against the baseline bins.
+
+    Scored chunks are added with `update`, so the batch is only read once while
+    scoring and never needs to be held in memory as a whole.  When only a sample
+    of the batch is added, set the `confidence_level` to report the violations
+    with confidence bounds on the sampling error.
+
+    Args:
+        statistics: The Model Monitor baseline statistics.
+        confidence_level: The optional confidence level of the bounds.
+    """
+
+    def __init__(self, statistics: dict, confidence_level: float = None):
+        self.confidence_level = confidence_level
+        self.names, self.edges, self.baseline_counts = baseline_histograms(statistics)
+        num_features = len(self.names)
+        self.counts = np.zeros_like(self.baseline_counts)
+        self.num_missing = np.zeros(num_features)
+        self.sum = np.zeros(num_features)
+        self.sum_squares = np.zeros(num_features)
+        self.min = np.full(num_features, np.inf)
+        self.max = np.full(num_features, -np.inf)
+        self.item_count = 0
+
+    def update(self, df: pd.DataFrame):
+        """Adds a chunk of the scored batch to the statistics."""
+        values = df.reindex(columns=self.names).to_numpy(dtype=float)
+        self.add(values)
+
+    def add(self, values: np.ndarray):
+        """Adds an array of shape (N, F) to the statistics."""
+        self.item_count += len(values)
+        missing = np.isnan(values)
+        self.num_missing += missing.sum(axis=0)
+        self.counts += bin_counts(values, self.edges)
+        if len(values) > 0:
+            self.sum += np.nansum(values, axis=0)
+            self.sum_squares += np.nansum(values ** 2, axis=0)
+            present = ~missing.all(axis=0)
+            self.min[present] = np.fmin(
+                self.min[present], np.nanmin(values[:, present], axis=0)
+            )
+            self.max[present] = np.fmax(
+                self.max[present], np.nanmax(values[:, present], axis=0)
+            )
+
+    def metrics(self) -> dict:
+        """Computes the drift metrics for the accumulated batch."""
+        return drift_metrics(self.baseline_counts, self.counts, self.edges)
+
+    def intervals(self, metrics: dict) -> dict:
+        """Computes the confidence bounds of a sampled batch, or None if not sampled."""
+        if self.confidence_level is None:
+            return None
+        num_present = self.item_count - self.num_missing
+        return confidence_intervals(
+            metrics, self.edges, num_present, self.confidence_level
+        )
+
+    def violations(self, constraints: dict, metric_name: str = "ks") -> dict:
+        """Returns the constraint violations report for the accumulated batch."""
+        metrics = self.metrics()
+        violations = violations_report(
+            self.names,
+            metrics,
+            get_threshold(constraints),
+            metric_name,
+            self.intervals(metrics),
+        )
+        # Report baseline features that are not present in the batch
+        for i, name in enumerate(self.names):
+            if self.item_count > 0 and self.num_missing[i] == self.item_count:
+                violations["violations"].append(
+                    {
+                        "feature_name": name,
+                        "constraint_check_type": "missing_column_check",
+                        "description": f"There are missing columns in current dataset: {name}",
+                    }
+                )
+        return violations
+
+    def statistics(self) -> dict:
+        """Returns the batch statistics in the Model Monitor `statistics.json` format."""
+        features = []
+        for i, name in enumerate(self.names):
+            num_present = self.item_count - self.num_missing[i]
+            mean = self.sum[i] / num_present if num_present > 0 else 0.0
+            variance = (
+                self.sum_squares[i] / num_present - mean ** 2
+                if num_present > 0
+                else 0.0
+            )
+            e = self.edges[i][~np.isnan(self.edges[i])]
+            counts = self.counts[i]
+            features.append(
+                {
+                    "name": name,
+                    "inferred_type": "Fractional",
+                    "numerical_statistics": {
+                        "common": {
+                            "num_present": int(num_present),
+                            "num_missing": int(self.num_missing[i]),
+                        },
+                        "mean": float(mean),
+                        "sum": float(self.sum[i]),
+                        "std_dev": float(np.sqrt(max(variance, 0.0))),
+                        "min": float(self.min[i]) if num_present > 0 else None,
+                        "max": float(self.max[i]) if num_present > 0 else None,
+                        "distribution": {
+                            "kll": {
+                                # Out of range values are folded into the outer buckets
+                                "buckets": [
+                                    {
+                                        "lower_bound": float(e[j]),
+                                        "upper_bound": float(e[j + 1]),
+                                        "count": float(
+                                            counts[j + 1]
+                                            + (counts[0] if j == 0 else 0)
+                                            + (counts[len(e)] if j == len(e) - 2 else 0)
+                                        ),
+                                    }
+                                    for j in range(len(e) - 1)
+                                ]
+                            }
+                        },
+                    },
+                }
+            )
+        return {
+            "version": 0.0,
+            "dataset": {"item_count": self.item_count},
+            "features": features,
+        }
@@ -0,0 +1,137 @@
+"""Writes a SageMaker manifest file selecting the input partitions in a date range.
+
+The manifest is a json list of a common S3 prefix followed by the keys relative to
+it.  A processing input with an `s3_data_type` of `ManifestFile` downloads only
+the listed objects, preserving their path relative to the prefix.
+
+Partition dates are parsed from the key relative to the data prefix, for example
+`green_tripdata_2018-02.csv`, `2021-06-01-10.csv` or `2021/06/01/10/scores.csv`.
+
+Usage:
+    python pipelines/manifest.py --data-uri s3://<bucket>/<prefix>/input/data \\
+        --manifest-uri s3://<bucket>/<prefix>/manifests/build.json \\
+        --start 2018-01 --end 2018-04
+"""
+import argparse
+import json
+import logging
+import os
+import re
+from datetime import datetime
+from urllib.parse import urlparse
+
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+# Matches a partition date with an optional day and hour, separated by - or /
+PARTITION_DATE_RE = re.compile(
+    r"(?<!\d)(\d{4})[-/](\d{2})(?:[-/](\d{2})(?:[-/T ](\d{2}))?)?(?!\d)"
+)
+
+
+def split_s3_uri(uri: str):
+    url_parsed = urlparse(uri)
+    return url_parsed.netloc, url_parsed.path.lstrip("/")
+
+
+def parse_date(value: str) -> datetime:
+    """Parses a date of the form YYYY-MM[-DD[THH]], or returns None.
+
+    Values with a field out of range, such as month 13 or February 30, are not
+    dates and also return None.
+    """
+    match = PARTITION_DATE_RE.search(value)
+    if match is None:
+        return None
+    year, month, day, hour = match.groups()
+    try:
+        return datetime(int(year), int(month), int(day or 1), int(hour or 0))
+    except ValueError:
+        return None
+
+
+def parse_date_argument(value: str) -> datetime:
+    """Parses a date command line argument, which is an error if it isn't a date."""
+    date = parse_date(value)
+    if date is None:
+        raise argparse.ArgumentTypeError(f"Not a YYYY-MM[-DD[THH]] date: {value}")
+    return date
+
+
+def select_keys(keys: list, start: datetime = None, end: datetime = None) -> list:
+    """Selects the keys with a partition date in the range [start, end).
+
+    Args:
+        keys: The S3 keys relative to the data prefix.
+        start: The optional inclusive start of the range.
+        end: The optional exclusive end of the range.
+
+    Returns:
+        The sorted selected keys.
+    """
+    selected = []
+    for key in keys:
+        date = parse_date(key)
+        if date is None:
+            logger.warning(f"No partition date found in key: {key}")
+            continue
+        if (start is None or date >= start) and (end is None or date < end):
+            selected.append(key)
+    return sorted(selected)
+
+
+def get_manifest(data_uri: str, keys: list) -> list:
+    """Gets the SageMaker manifest for the keys relative to the data uri."""
+    return [{"prefix": os.path.join(data_uri, "")}] + list(keys)
+
+
+def list_keys(data_uri: str, suffix: str = ".csv") -> list:
+    """Lists the keys under the data uri relative to it."""
+    bucket, prefix = split_s3_uri(os.path.join(data_uri, ""))
+    keys = []
+    paginator = boto3.client("s3").get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for o in page.get("Contents", []):
+            if o["Key"].endswith(suffix):
+                keys.append(o["Key"][len(prefix) :])
+    return keys
+
+
+def write_manifest(
+    data_uri: str, manifest_uri: str, start: datetime = None, end: datetime = None
+) -> list:
+    """Writes the manifest of the partitions under the data uri in a date range.
+
+    Args:
+        data_uri: The input data location.
+        manifest_uri: The location to write the manifest file to.
+        start: The optional inclusive start of the range.
+        end: The optional exclusive end of the range.
+
+    Returns:
+        The manifest
+    """
+    keys = select_keys(list_keys(data_uri), start, end)
+    if len(keys) == 0:
+        raise Exception(f"No partitions found in {data_uri} from {start} to {end}")
+    logger.info(f"Selected {len(keys)} partitions from {start} to {end}")
+    manifest = get_manifest(data_uri, keys)
+    bucket, key = split_s3_uri(manifest_uri)
+    boto3.client("s3").put_object(
+        Bucket=bucket, Key=key, Body=json.dumps(manifest).encode("utf-8")
+    )
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-uri", type=str, required=True)
+    parser.add_argument("--manifest-uri", type=str, required=True)
+    parser.add_argument("--start", type=parse_date_argument, default=None)
+    parser.add_argument("--end", type=parse_date_argument, default=None)
+    args = parser.parse_args()
+    write_manifest(args.data_uri, args.manifest_uri, args.start, args.end)
+    logger.info(f"Wrote manifest to {args.manifest_uri}")
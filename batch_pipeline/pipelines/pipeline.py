@@ -7,13 +7,20 @@
 
 Implements a get_pipeline(**kwargs) method.
 """
+import functools
+import hashlib
 import json
 import os
+import re
 
 import boto3
+import botocore.config
 import sagemaker
 import sagemaker.session
 
+from botocore.exceptions import ClientError
+from infra import image_uris
+
 from sagemaker.inputs import CreateModelInput
 from sagemaker.model import Model
 from sagemaker.model_monitor.dataset_format import DatasetFormat
@@ -34,17 +41,66 @@ from sagemaker.workflow.parameters import (
     ParameterInteger,
     ParameterString,
 )
+from sagemaker.user_agent import prepend_user_agent
 from sagemaker.workflow.pipeline import Pipeline
 from sagemaker.workflow.steps import (
     CreateModelStep,
     ProcessingStep,
     CacheConfig,
 )
-from sagemaker.utils import name_from_base
 
 
 BASE_DIR = os.path.dirname(os.path.realpath(__file__))
 
+# The CloudWatch namespace of the pipeline metrics
+METRICS_NAMESPACE = "aws/sagemaker/ModelBuildingPipeline/data-metrics"
+
+# The timestamp of the job names generated when rendering a definition, and of the
+# profiler rule of training jobs
+GENERATED_NAME_PATTERN = re.compile(
+    r"(?<=-)\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}-\d{1,3}(?=/)|(?<=ProfilerReport-)\d+"
+)
+
+
+class LazySession(sagemaker.session.Session):
+    """A sagemaker session that creates its boto clients on first use.
+
+    Generating a pipeline definition doesn't call the SageMaker APIs, so deferring
+    the clients avoids loading the botocore service models when rendering pipelines.
+    """
+
+    def _initialize(
+        self,
+        boto_session,
+        sagemaker_client,
+        sagemaker_runtime_client,
+        sagemaker_featurestore_runtime_client,
+    ):
+        self.boto_session = boto_session or boto3.Session()
+        self._region_name = self.boto_session.region_name
+        if self._region_name is None:
+            raise ValueError(
+                "Must setup local AWS configuration with a region supported by SageMaker."
+            )
+        self.local_mode = False
+
+    @functools.cached_property
+    def sagemaker_client(self):
+        client = self.boto_session.client("sagemaker")
+        prepend_user_agent(client)
+        return client
+
+    @functools.cached_property
+    def sagemaker_runtime_client(self):
+        config = botocore.config.Config(read_timeout=80)
+        client = self.boto_session.client("runtime.sagemaker", config=config)
+        prepend_user_agent(client)
+        return client
+
+    @functools.cached_property
+    def sagemaker_featurestore_runtime_client(self):
+        return self.boto_session.client("sagemaker-featurestore-runtime")
+
 
 def get_session(region, default_bucket):
     """Gets the sagemaker session based on the region.
@@ -52,21 +108,213 @@ def get_session(region, default_bucket):
         region: the aws region to start the session
         default_bucket: the bucket to use for storing the artifacts
     Returns:
-        `sagemaker.session.Session instance
+        `sagemaker.session.Session instance, which creates its clients on first use
     """
 
     boto_session = boto3.Session(region_name=region)
+    return LazySession(boto_session=boto_session, default_bucket=default_bucket)
+
 
-    sagemaker_client = boto_session.client("sagemaker")
-    runtime_client = boto_session.client("sagemaker-runtime")
-    return sagemaker.session.Session(
-        boto_session=boto_session,
-        sagemaker_client=sagemaker_client,
-        sagemaker_runtime_client=runtime_client,
-        default_bucket=default_bucket,
+def get_profiler_input() -> ProcessingInput:
+    """Gets the profiler module input, which the processing scripts time stages with."""
+    return ProcessingInput(
+        source=os.path.join(BASE_DIR, "profiler.py"),
+        destination="/opt/ml/processing/profiler",
+        input_name="profiler",
     )
 
 
+def get_profile_output() -> ProcessingOutput:
+    """Gets the output of the profile.json written by the processing scripts."""
+    return ProcessingOutput(output_name="profile", source="/opt/ml/processing/profile")
+
+
+def get_profile_arguments(pipeline_name: str, profile_metrics: bool) -> list:
+    """Gets the script arguments to publish the stage profile as CloudWatch metrics.
+    Args:
+        pipeline_name: the pipeline name dimension of the metrics
+        profile_metrics: whether to publish the metrics
+    Returns:
+        the script arguments
+    """
+    if not profile_metrics:
+        return []
+    return ["--metrics-namespace", METRICS_NAMESPACE, "--pipeline-name", pipeline_name]
+
+
+def get_data_input(
+    input_data_uri: ParameterString, input_manifest_uri: ParameterString = None
+) -> ProcessingInput:
+    """Gets the input data for the score step.
+    Args:
+        input_data_uri: the input data url
+        input_manifest_uri: optional manifest url, to download only the listed partitions
+    Returns:
+        the processing input
+    """
+    if input_manifest_uri is not None:
+        return ProcessingInput(
+            source=input_manifest_uri,
+            destination="/opt/ml/processing/input",
+            s3_data_type="ManifestFile",
+        )
+    return ProcessingInput(
+        source=input_data_uri,
+        destination="/opt/ml/processing/input",
+    )
+
+
+def get_baseline_inputs(baseline_uri: str) -> list:
+    """Gets the baseline constraints and statistics inputs to check drift against."""
+    return [
+        ProcessingInput(
+            source=os.path.join(baseline_uri, "constraints.json"),
+            destination="/opt/ml/processing/baseline/constraints",
+            input_name="constraints",
+        ),
+        ProcessingInput(
+            source=os.path.join(baseline_uri, "statistics.json"),
+            destination="/opt/ml/processing/baseline/stats",
+            input_name="baseline",
+        ),
+    ]
+
+
+def get_score_inputs(
+    input_model_uri: ParameterString,
+    data_input: ProcessingInput,
+    baseline_uri: str = None,
+    compiled_predictor: bool = False,
+) -> list:
+    """Gets the inputs of the score step.
+    Args:
+        input_model_uri: the input model url
+        data_input: the input data to score
+        baseline_uri: optional baseline uri, to compute drift while scoring
+        compiled_predictor: whether to provide the tree ensemble predictor module
+    Returns:
+        the processing inputs
+    """
+    inputs = [
+        ProcessingInput(
+            source=input_model_uri,
+            destination="/opt/ml/processing/model",
+        ),
+        data_input,
+    ]
+    if compiled_predictor:
+        inputs += [
+            ProcessingInput(
+                source=os.path.join(BASE_DIR, "tree_ensemble.py"),
+                destination="/opt/ml/processing/predictor",
+                input_name="predictor",
+            ),
+        ]
+    if baseline_uri is not None:
+        # Pass the baseline and drift library to compute drift while scoring
+        inputs += get_baseline_inputs(baseline_uri) + [
+            ProcessingInput(
+                source=os.path.join(BASE_DIR, "drift.py"),
+                destination="/opt/ml/processing/lib",
+                input_name="lib",
+            ),
+        ]
+    return inputs + [get_profiler_input()]
+
+
+def get_score_outputs(inline_monitor: bool, sample_monitor: bool) -> list:
+    """Gets the outputs of the score step.
+    Args:
+        inline_monitor: whether drift is computed while scoring
+        sample_monitor: whether a sample of the scores is the model monitor input
+    Returns:
+        the processing outputs
+    """
+    outputs = [
+        ProcessingOutput(output_name="scores", source="/opt/ml/processing/output"),
+    ]
+    if inline_monitor:
+        outputs += [
+            ProcessingOutput(
+                source="/opt/ml/processing/monitoring",
+                output_name="monitoring_output",
+            ),
+        ]
+    if sample_monitor:
+        # Write a sample of the scores for the model monitor job to read
+        outputs += [
+            ProcessingOutput(
+                output_name="monitoring_input", source="/opt/ml/processing/sample"
+            ),
+        ]
+    return outputs + [get_profile_output()]
+
+
+def get_score_arguments(
+    compact_scores: bool = False,
+    score_columns: list = None,
+    compiled_predictor: bool = False,
+    prediction_cache_uri: str = None,
+    inline_monitor: bool = False,
+    drift_sample_size: int = None,
+    drift_sample_fraction: float = None,
+    drift_confidence_level: float = None,
+) -> list:
+    """Gets the arguments of the score script.
+    Args:
+        compact_scores: write only the row key, prediction and score columns
+        score_columns: optional feature columns to include in the compact scores
+        compiled_predictor: predict with the model flattened into a tree ensemble
+        prediction_cache_uri: optional url under which to cache the predictions
+        inline_monitor: compute drift against the baseline while scoring
+        drift_sample_size: optional number of scored rows to sample
+        drift_sample_fraction: optional fraction of scored rows to sample
+        drift_confidence_level: optional confidence level of the bounds on the
+            inline drift of a sample
+    Returns:
+        the script arguments
+    """
+    arguments = []
+    if compact_scores:
+        arguments += ["--compact-output"]
+        if score_columns:
+            arguments += ["--output-columns"] + list(score_columns)
+    if compiled_predictor:
+        arguments += ["--predictor", "compiled"]
+    if prediction_cache_uri is not None:
+        arguments += ["--prediction-cache-uri", prediction_cache_uri]
+    if inline_monitor:
+        arguments += ["--baseline-dir", "/opt/ml/processing/baseline"]
+    if drift_sample_size is not None:
+        arguments += ["--sample-size", str(drift_sample_size)]
+    elif drift_sample_fraction is not None:
+        arguments += ["--sample-fraction", str(drift_sample_fraction)]
+    if drift_confidence_level is not None:
+        arguments += ["--confidence-level", str(drift_confidence_level)]
+    return arguments
+
+
+def get_lambda_inputs(
+    processing_job_name, pipeline_name: str, confidence_level: float = None
+) -> dict:
+    """Gets the inputs of the evaluate drift lambda.
+    Args:
+        processing_job_name: the name of the job with the drift violations
+        pipeline_name: the pipeline to publish the drift metrics for
+        confidence_level: optional confidence level of the bounds on the drift of
+            a sampled model monitor input
+    Returns:
+        the lambda inputs
+    """
+    inputs = {
+        "ProcessingJobName": processing_job_name,
+        "PipelineName": pipeline_name,
+    }
+    if confidence_level is not None:
+        inputs["ConfidenceLevel"] = confidence_level
+    return inputs
+
+
 def get_pipeline(
     region: str,
     role: str,
@@ -78,6 +326,16 @@ def get_pipeline(
     model_uri: str,
     transform_uri: str,
     baseline_uri: str = None,
+    manifest_uri: str = None,
+    inline_drift: bool = False,
+    drift_sample_size: int = None,
+    drift_sample_fraction: float = None,
+    drift_confidence_level: float = 0.95,
+    compact_scores: bool = False,
+    score_columns: list = None,
+    compiled_predictor: bool = False,
+    prediction_cache: bool = False,
+    profile_metrics: bool = False,
 ) -> Pipeline:
     """Gets a SageMaker ML Pipeline instance working with on nyc taxi data.
     Args:
@@ -90,9 +348,31 @@ def get_pipeline(
         model_uri: the input model location
         transform_uri: the output transform uri location
         baseline_uri: optional input baseline uri for drift detection
+        manifest_uri: optional manifest of the input data partitions to score
+        inline_drift: compute drift while scoring instead of a model monitor job
+        drift_sample_size: optional number of scored rows to sample as the model
+            monitor input, or to compute inline drift from
+        drift_sample_fraction: optional fraction of scored rows to sample as the
+            model monitor input, or to compute inline drift from
+        drift_confidence_level: the confidence level of the bounds on the drift of
+            a sample
+        compact_scores: write only the row key, prediction and score columns per
+            input file, which requires inline drift when a baseline is given
+        score_columns: optional feature columns to include in the compact scores
+        compiled_predictor: predict with the model flattened into a tree ensemble
+        prediction_cache: cache the predictions of feature rows across batches
+        profile_metrics: publish the stage profile of the score job as CloudWatch
+            metrics
     Returns:
         an instance of a pipeline
     """
+    inline_monitor = baseline_uri is not None and inline_drift
+    if compact_scores and baseline_uri is not None and not inline_monitor:
+        raise ValueError("Compact scores require inline drift with a baseline")
+    sample_drift = drift_sample_size is not None or drift_sample_fraction is not None
+    sample_drift = sample_drift and baseline_uri is not None
+    sample_monitor = sample_drift and not inline_monitor
+
     sagemaker_session = get_session(region, default_bucket)
 
     # parameters for pipeline execution
@@ -125,12 +405,8 @@ def get_pipeline(
     cache_config = CacheConfig(enable_caching=True, expire_after="PT1H")
 
     # Create the Model step
-    image_uri_inference = sagemaker.image_uris.retrieve(
-        framework="xgboost",
-        region=region,
-        version="1.2-2",
-        py_version="py3",
-        instance_type=transform_instance_type,
+    image_uri_inference = image_uris.retrieve(
+        framework="xgboost", region=region, version="1.2-2"
     )
 
     model = Model(
@@ -157,22 +433,44 @@ def get_pipeline(
         role=role,
     )
 
+    input_manifest_uri = None
+    if manifest_uri is not None:
+        # Download only the input data partitions listed in the manifest
+        input_manifest_uri = ParameterString(
+            name="DataManifestUri",
+            default_value=manifest_uri,
+        )
+    prediction_cache_uri = None
+    if prediction_cache:
+        prediction_cache_uri = (
+            f"s3://{default_bucket}/{base_job_prefix}/prediction-cache/"
+        )
+    score_arguments = get_score_arguments(
+        compact_scores=compact_scores,
+        score_columns=score_columns,
+        compiled_predictor=compiled_predictor,
+        prediction_cache_uri=prediction_cache_uri,
+        inline_monitor=inline_monitor,
+        drift_sample_size=drift_sample_size if sample_drift else None,
+        drift_sample_fraction=drift_sample_fraction if sample_drift else None,
+        drift_confidence_level=drift_confidence_level
+        if sample_drift and inline_monitor
+        else None,
+    )
+    # Profile the scoring stages to profile.json, and optionally as metrics
+    score_arguments += get_profile_arguments(pipeline_name, profile_metrics)
+
     step_score = ProcessingStep(
         name="ScoreModel",
         processor=script_eval,
-        inputs=[
-            ProcessingInput(
-                source=input_model_uri,
-                destination="/opt/ml/processing/model",
-            ),
-            ProcessingInput(
-                source=input_data_uri,
-                destination="/opt/ml/processing/input",
-            ),
-        ],
-        outputs=[
-            ProcessingOutput(output_name="scores", source="/opt/ml/processing/output"),
-        ],
+        inputs=get_score_inputs(
+            input_model_uri,
+            get_data_input(input_data_uri, input_manifest_uri),
+            baseline_uri if inline_monitor else None,
+            compiled_predictor,
+        ),
+        outputs=get_score_outputs(inline_monitor, sample_monitor),
+        job_arguments=score_arguments or None,
         code=os.path.join(BASE_DIR, "score.py"),
         cache_config=cache_config,
     )
@@ -180,12 +478,10 @@ def get_pipeline(
 
     steps = [step_create_model, step_score]
 
-    if baseline_uri is not None:
+    if baseline_uri is not None and not inline_monitor:
         # Get the default model monitor container
-        model_monitor_container_uri = sagemaker.image_uris.retrieve(
-            framework="model-monitor",
-            region=region,
-            version="latest",
+        model_monitor_container_uri = image_uris.retrieve(
+            framework="model-monitor", region=region, version="latest"
         )
 
         # Create the baseline job using
@@ -216,22 +512,13 @@ def get_pipeline(
             inputs=[
                 ProcessingInput(
                     source=step_score.properties.ProcessingOutputConfig.Outputs[
-                        "scores"
+                        "monitoring_input" if sample_monitor else "scores"
                     ].S3Output.S3Uri,
                     destination="/opt/ml/processing/input/baseline_dataset_input",
                     input_name="baseline_dataset_input",
                 ),
-                ProcessingInput(
-                    source=os.path.join(baseline_uri, "constraints.json"),
-                    destination="/opt/ml/processing/baseline/constraints",
-                    input_name="constraints",
-                ),
-                ProcessingInput(
-                    source=os.path.join(baseline_uri, "statistics.json"),
-                    destination="/opt/ml/processing/baseline/stats",
-                    input_name="baseline",
-                ),
-            ],
+            ]
+            + get_baseline_inputs(baseline_uri),
             outputs=[
                 ProcessingOutput(
                     source="/opt/ml/processing/output",
@@ -241,6 +528,12 @@ def get_pipeline(
             cache_config=cache_config,
         )
 
+        steps += [step_monitor]
+
+    if baseline_uri is not None:
+        # Evaluate the violations from either the score or model monitor step
+        step_drift = steps[-1]
+
         # Create an inline lambda step that inspects the output of the model monitoring
         step_lambda = LambdaStep(
             name="EvaluateDrift",
@@ -249,11 +542,13 @@ def get_pipeline(
                 execution_role_arn=lambda_role_arn,
                 script=os.path.join(BASE_DIR, "../lambda/lambda_evaluate_drift.py"),
                 handler="lambda_evaluate_drift.lambda_handler",
+                session=sagemaker_session,
+            ),
+            inputs=get_lambda_inputs(
+                step_drift.properties.ProcessingJobName,
+                pipeline_name,
+                drift_confidence_level if sample_monitor else None,
             ),
-            inputs={
-                "ProcessingJobName": step_monitor.properties.ProcessingJobName,
-                "PipelineName": pipeline_name,
-            },
             outputs=[
                 LambdaOutput(
                     output_name="statusCode", output_type=LambdaOutputTypeEnum.Integer
@@ -261,20 +556,24 @@ def get_pipeline(
             ],
         )
 
-        steps += [step_monitor, step_lambda]
+        steps += [step_lambda]
+
+    parameters = [
+        input_data_uri,
+        input_model_uri,
+        output_transform_uri,
+        transform_instance_count,
+        transform_instance_type,
+        monitor_instance_count,
+        monitor_instance_type,
+    ]
+    if input_manifest_uri is not None:
+        parameters += [input_manifest_uri]
 
     # pipeline instance
     pipeline = Pipeline(
         name=pipeline_name,
-        parameters=[
-            input_data_uri,
-            input_model_uri,
-            output_transform_uri,
-            transform_instance_count,
-            transform_instance_type,
-            monitor_instance_count,
-            monitor_instance_type,
-        ],
+        parameters=parameters,
         steps=steps,
         sagemaker_session=sagemaker_session,
     )
@@ -282,12 +581,71 @@ def get_pipeline(
     return pipeline
 
 
+def get_code_version(code_files: list) -> str:
+    """Gets the sha256 of the contents of the code files in the pipelines dir."""
+    code_hash = hashlib.sha256()
+    for code_file in code_files:
+        with open(os.path.join(BASE_DIR, code_file), "rb") as f:
+            code_hash.update(f.read())
+    return code_hash.hexdigest()
+
+
+def get_code_files() -> list:
+    """Gets the scripts in the pipelines dir, which are uploaded with the definition."""
+    return sorted(
+        f
+        for f in os.listdir(BASE_DIR)
+        if f.endswith(".py") and not f.startswith("test_")
+    )
+
+
+def get_definition_hash(pipeline_definition_body: str) -> str:
+    """Gets the sha256 of the canonicalized pipeline definition json and its code.
+
+    The job names generated when rendering a definition end with a timestamp, which
+    the SDK uses in the s3 uris of the uploaded code and of the default outputs.
+    These timestamps are removed, and the code is hashed by content instead.
+    """
+    definition = GENERATED_NAME_PATTERN.sub("", pipeline_definition_body)
+    canonical = json.dumps(
+        json.loads(definition), sort_keys=True, separators=(",", ":")
+    )
+    definition_hash = hashlib.sha256(canonical.encode("utf-8"))
+    definition_hash.update(get_code_version(get_code_files()).encode("utf-8"))
+    return definition_hash.hexdigest()
+
+
 def upload_pipeline(pipeline: Pipeline, default_bucket, base_job_prefix) -> str:
+    """Uploads the pipeline definition to a content addressed key in s3.
+
+    The key is derived from a hash of the definition, so the upload is skipped and
+    the existing key reused when the definition has not changed.
+
+    Args:
+        pipeline: the pipeline to upload the definition for
+        default_bucket: the bucket to upload the definition to
+        base_job_prefix: the prefix for the definition key
+
+    Returns:
+        The s3 key of the pipeline definition
+    """
     # Get the pipeline definition
     pipeline_definition_body = pipeline.definition()
-    # Upload the pipeline to a unique location in s3 based on git commit and timestamp
-    pipeline_key = f"{name_from_base(base_job_prefix)}/pipeline.json"
+    definition_hash = get_definition_hash(pipeline_definition_body)
+    pipeline_key = f"{base_job_prefix}/pipeline-{definition_hash}.json"
+
+    # Check if the definition has already been uploaded
+    s3_client = pipeline.sagemaker_session.boto_session.client("s3")
+    try:
+        s3_client.head_object(Bucket=default_bucket, Key=pipeline_key)
+        return pipeline_key
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchKey", "NotFound"):
+            raise
+
     S3Uploader.upload_string_as_file_body(
-        pipeline_definition_body, f"s3://{default_bucket}/{pipeline_key}"
+        pipeline_definition_body,
+        f"s3://{default_bucket}/{pipeline_key}",
+        sagemaker_session=pipeline.sagemaker_session,
     )
     return pipeline_key
@@ -0,0 +1,260 @@
+"""Records the wall time, CPU time, peak memory and rows of the stages of a job.
+
+Stages are timed with the `Profiler.span` context manager, the `Profiler.stage`
+decorator or `Profiler.iterate` over chunks, which only read the clocks and the
+peak resident memory of the process on entering and leaving a stage, so they are
+cheap enough to leave on for every job.  Spans with the same name are combined,
+so a stage repeated for each chunk or file is reported once with its totals.
+
+The peak memory is reset on entering a stage where Linux allows it, so it is the
+peak of the stage, and otherwise the peak of the process so far.  The peak of the
+process is kept across the resets, for the peak of the job.
+
+Each instance of a processing job with more than one instance writes its own
+profile, named by its host.
+"""
+import functools
+import json
+import logging
+import os
+import resource
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import boto3
+
+logger = logging.getLogger(__name__)
+
+# The largest number of metrics put in one request to CloudWatch
+METRICS_BATCH_SIZE = 20
+
+# The processing job resource configuration, with the hosts of the job
+RESOURCE_CONFIG_PATH = "/opt/ml/config/resourceconfig.json"
+
+
+def reset_peak_rss() -> bool:
+    # Resets the peak resident memory of this process, supported by Linux
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss() -> int:
+    """Gets the peak resident memory of this process in bytes."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # Linux reports the maximum resident set size in kilobytes, macOS in bytes
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def get_hosts():
+    """Gets the current host and all the hosts of the job, or None if not known."""
+    try:
+        with open(RESOURCE_CONFIG_PATH, "r") as f:
+            resource_config = json.load(f)
+    except (OSError, ValueError):
+        return None, []
+    return resource_config["current_host"], resource_config["hosts"]
+
+
+class Span:
+    """The totals of a stage, with rows added by the stage as they are counted."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_rss = 0
+        self.rows = None
+
+    def add_rows(self, rows: int):
+        self.rows = (self.rows or 0) + rows
+
+    def to_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "count": self.count,
+            "seconds": self.seconds,
+            "cpu_seconds": self.cpu_seconds,
+            "peak_rss_mb": self.peak_rss / 2 ** 20,
+            "rows": self.rows,
+            "rows_per_second": self.rows / self.seconds
+            if self.rows is not None and self.seconds > 0
+            else None,
+        }
+
+
+class Profiler:
+    """Profiles the stages of a job.
+
+    Args:
+        job: The name of the job, such as `preprocess`.
+    """
+
+    def __init__(self, job: str):
+        self.job = job
+        self.spans = {}
+        self.open_spans = []
+        self.peak_rss = 0
+        self.start = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    @contextmanager
+    def span(self, name: str, rows: int = None):
+        """Times a stage, which can add the rows it processed to the yielded span.
+
+        Args:
+            name: The stage name.
+            rows: The rows processed, if known before the stage.
+        """
+        span = self.spans.setdefault(name, Span(name))
+        if rows is not None:
+            span.add_rows(rows)
+        # Keep the peak of the job and enclosing stages before resetting it for this one
+        peak_rss = get_peak_rss()
+        self.peak_rss = max(self.peak_rss, peak_rss)
+        for open_span in self.open_spans:
+            open_span.peak_rss = max(open_span.peak_rss, peak_rss)
+        reset_peak_rss()
+        self.open_spans.append(span)
+        start, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield span
+        finally:
+            span.seconds += time.perf_counter() - start
+            span.cpu_seconds += time.process_time() - start_cpu
+            span.peak_rss = max(span.peak_rss, get_peak_rss())
+            span.count += 1
+            self.open_spans.pop()
+
+    def stage(self, name: str, rows=None):
+        """Decorates a function to time each call as a stage.
+
+        Args:
+            name: The stage name.
+            rows: An optional function of the result that counts the rows.
+        """
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name) as span:
+                    result = fn(*args, **kwargs)
+                    if rows is not None:
+                        span.add_rows(rows(result))
+                return result
+
+            return wrapper
+
+        return decorator
+
+    def iterate(self, name: str, iterable, rows=None):
+        """Yields the items of an iterable, timing getting each item as a stage.
+
+        Args:
+            name: The stage name.
+            iterable: The items, such as the chunks of a file.
+            rows: An optional function of an item that counts its rows.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.span(name) as span:
+                item = next(iterator, StopIteration)
+                if item is not StopIteration and rows is not None:
+                    span.add_rows(rows(item))
+            if item is StopIteration:
+                return
+            yield item
+
+    def to_dict(self) -> dict:
+        return {
+            "job": self.job,
+            "host": get_hosts()[0],
+            "seconds": time.perf_counter() - self.start,
+            "cpu_seconds": time.process_time() - self.start_cpu,
+            "peak_rss_mb": max(
+                [self.peak_rss, get_peak_rss()]
+                + [span.peak_rss for span in self.spans.values()]
+            )
+            / 2 ** 20,
+            "stages": [span.to_dict() for span in self.spans.values()],
+        }
+
+    def write(self, profile_dir: str) -> dict:
+        """Writes the profile to `profile.json` in a directory and logs the stages.
+
+        Returns:
+            The profile.
+        """
+        profile = self.to_dict()
+        host, hosts = get_hosts()
+        file_name = f"profile-{host}.json" if len(hosts) > 1 else "profile.json"
+        for stage in profile["stages"]:
+            logger.info(
+                f"Stage {stage['stage']} took {stage['seconds']:.2f}s "
+                f"cpu {stage['cpu_seconds']:.2f}s peak {stage['peak_rss_mb']:.0f}MB "
+                f"rows {stage['rows']}"
+            )
+        os.makedirs(profile_dir, exist_ok=True)
+        with open(os.path.join(profile_dir, file_name), "w") as f:
+            json.dump(profile, f, indent=2)
+        return profile
+
+    def get_metric_data(self, pipeline_name: str) -> list:
+        """Gets the CloudWatch metrics of each stage, by pipeline, job and stage."""
+        timestamp = datetime.now()
+        metric_data = []
+        for stage in self.to_dict()["stages"]:
+            dimensions = [
+                {"Name": "PipelineName", "Value": pipeline_name},
+                {"Name": "Job", "Value": self.job},
+                {"Name": "Stage", "Value": stage["stage"]},
+            ]
+            values = [
+                ("StageSeconds", stage["seconds"], "Seconds"),
+                ("StageCpuSeconds", stage["cpu_seconds"], "Seconds"),
+                ("StagePeakMemory", stage["peak_rss_mb"], "Megabytes"),
+                ("StageRows", stage["rows"], "Count"),
+                ("StageRowsPerSecond", stage["rows_per_second"], "Count/Second"),
+            ]
+            metric_data += [
+                {
+                    "MetricName": metric_name,
+                    "Dimensions": dimensions,
+                    "Timestamp": timestamp,
+                    "Value": value,
+                    "Unit": unit,
+                }
+                for metric_name, value, unit in values
+                if value is not None
+            ]
+        return metric_data
+
+    def put_metrics(self, namespace: str, pipeline_name: str, cloudwatch=None):
+        """Publishes the metrics of each stage to CloudWatch.
+
+        Args:
+            namespace: The CloudWatch namespace of the pipeline metrics.
+            pipeline_name: The pipeline name dimension.
+            cloudwatch: The CloudWatch client, created if not given.
+        """
+        if cloudwatch is None:
+            cloudwatch = boto3.client("cloudwatch")
+        metric_data = self.get_metric_data(pipeline_name)
+        logger.info(f"Putting {len(metric_data)} metrics in namespace {namespace}")
+        for i in range(0, len(metric_data), METRICS_BATCH_SIZE):
+            cloudwatch.put_metric_data(
+                Namespace=namespace, MetricData=metric_data[i : i + METRICS_BATCH_SIZE]
+            )
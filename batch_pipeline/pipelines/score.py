@@ -1,11 +1,20 @@
 """Evaluation script for measuring mean squared error."""
+import argparse
+import hashlib
+import io
+import json
 import logging
+import os
 import pathlib
 import glob
 import pickle
+import sys
 import tarfile
-from math import sqrt
+import time
+from urllib.parse import urlparse
 
+import boto3
+import numpy as np
 import pandas as pd
 import xgboost
 
@@ -13,6 +22,13 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
 
+# The processing container directory, which is relocated to run the job locally
+PROCESSING_DIR = os.environ.get("PROCESSING_DIR", "/opt/ml/processing")
+
+# FNV-1a 64 bit offset basis and prime, for hashing the packed feature rows
+FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+FNV_PRIME = np.uint64(0x100000001B3)
+
 
 def load_data(file_list: list):
     # Load input files with header
@@ -22,33 +38,617 @@ def load_data(file_list: list):
     return pd.concat(dfs, ignore_index=True)
 
 
-if __name__ == "__main__":
-    logger.debug("Starting evaluation.")
-    model_path = "/opt/ml/processing/model/model.tar.gz"
-    with tarfile.open(model_path) as tar:
-        tar.extractall(path=".")
+def read_chunks(file_list: list, chunk_size: int):
+    # Stream input files with header in chunks of rows, with the file of each chunk
+    for file in file_list:
+        for df in pd.read_csv(file, chunksize=chunk_size):
+            yield file, df
 
-    logger.debug("Loading xgboost model.")
-    model = pickle.load(open("xgboost-model", "rb"))
 
-    logger.debug("Reading input data.")
+def get_compact_scores(df: pd.DataFrame, target_col: str, columns: list):
+    """Gets the row key within the input file, the prediction and feature columns.
+
+    Args:
+        df: The chunk of the input file with the predictions in the target column.
+        target_col: The prediction column.
+        columns: The feature columns to include, for example for drift.
+
+    Returns:
+        The compact scores dataframe.
+    """
+    scores = df[[target_col] + list(columns)]
+    scores.insert(0, "row", df.index)
+    return scores
+
+
+class ScoreWriter:
+    """Appends scores to csv files with a header, keeping only the last file open."""
+
+    def __init__(self):
+        self.path = None
+        self.file = None
+
+    def write(self, path: str, df: pd.DataFrame):
+        header = path != self.path
+        if header:
+            self.close()
+            pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self.file = open(path, "w")
+            self.path = path
+        df.to_csv(self.file, index=False, header=header)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RowSampler:
+    """Samples the scored rows uniformly, for the Model Monitor job or inline drift.
+
+    Rows are either kept with a fixed probability (`sample_fraction`), drawing
+    the gaps between kept rows so the random draws scale with the sample and
+    writing them as each chunk is scored, or up to a fixed number of rows
+    (`sample_size`) with a reservoir of the rows with the smallest random
+    priorities, written when scoring is done.
+
+    Args:
+        path: The optional sample file, or None to only return the sampled rows.
+        sample_size: The number of rows to sample.
+        sample_fraction: The fraction of rows to sample.
+        seed: The random seed.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_size: int = None,
+        sample_fraction: float = None,
+        seed: int = 42,
+    ):
+        if (sample_size is None) == (sample_fraction is None):
+            raise ValueError("Specify one of sample_size or sample_fraction")
+        self.path = path
+        self.sample_size = sample_size
+        self.sample_fraction = sample_fraction
+        self.rng = np.random.default_rng(seed)
+        self.writer = ScoreWriter()
+        self.item_count = 0
+        self.sample_count = 0
+        if sample_fraction is not None:
+            # The position of the next kept row from the start of the next chunk
+            self.next_row = int(self.rng.geometric(sample_fraction)) - 1
+        self.reservoir = None
+        self.priorities = np.empty(0)
+
+    def sample_rows(self, num_rows: int) -> np.ndarray:
+        """Gets the positions of the kept rows of a chunk with a sample fraction."""
+        positions = [np.empty(0, dtype=np.int64)]
+        while self.next_row < num_rows:
+            # Draw the gaps to the expected number of rows left in the chunk
+            size = int((num_rows - self.next_row) * self.sample_fraction) + 1
+            gaps = self.rng.geometric(self.sample_fraction, size)
+            rows = self.next_row + np.concatenate([[0], np.cumsum(gaps)])
+            end = min(np.searchsorted(rows, num_rows), len(rows) - 1)
+            positions.append(rows[:end])
+            self.next_row = int(rows[end])
+        self.next_row -= num_rows
+        return np.concatenate(positions)
+
+    def write(self, df: pd.DataFrame):
+        if self.path is not None:
+            self.writer.write(self.path, df)
+
+    def add(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Adds a chunk of scored rows to the sample.
+
+        Returns:
+            The sampled rows of the chunk, or None for a reservoir.
+        """
+        self.item_count += len(df)
+        if self.sample_fraction is not None:
+            sample = df.iloc[self.sample_rows(len(df))]
+            self.sample_count += len(sample)
+            self.write(sample)
+            return sample
+        # Keep the rows with the smallest priorities across the reservoir and chunk
+        priorities = self.rng.random(len(df))
+        if len(self.priorities) == self.sample_size:
+            # Only rows below the largest priority in the reservoir can replace it
+            candidates = priorities < self.priorities.max()
+            df, priorities = df[candidates], priorities[candidates]
+        rows = pd.concat([self.reservoir, df]) if self.reservoir is not None else df
+        priorities = np.concatenate([self.priorities, priorities])
+        if len(rows) > self.sample_size:
+            keep = np.argpartition(priorities, self.sample_size)[: self.sample_size]
+            rows, priorities = rows.iloc[keep], priorities[keep]
+        self.reservoir, self.priorities = rows, priorities
+
+    def close(self) -> pd.DataFrame:
+        """Writes the reservoir, and closes the sample file.
+
+        Returns:
+            The sampled rows of the reservoir, or None for a sample fraction.
+        """
+        if self.reservoir is not None:
+            self.sample_count = len(self.reservoir)
+            self.write(self.reservoir)
+        self.writer.close()
+        logger.info(f"Sampled {self.sample_count} of {self.item_count} rows")
+        return self.reservoir
+
+
+def get_predictor(model, predictor: str, predictor_dir: str):
+    """Gets a function that predicts a feature array with the xgboost booster.
+
+    Args:
+        model: The xgboost booster.
+        predictor: Either `xgboost` for the native predict, or `compiled` to predict
+            small batches with the booster flattened into a tree ensemble, which has
+            the lower latency, and larger batches natively.
+        predictor_dir: The directory of the tree ensemble module.
+
+    Returns:
+        The predict function.
+    """
+
+    def predict_native(X):
+        return model.predict(xgboost.DMatrix(X))
+
+    if predictor == "compiled":
+        # Tree ensemble module is provided as a processing input alongside the script
+        sys.path.insert(0, predictor_dir)
+        from tree_ensemble import MAX_BATCH_SIZE, TreeEnsemble
+
+        ensemble = TreeEnsemble.from_booster(model)
+        return lambda X: (
+            ensemble.predict(X) if len(X) <= MAX_BATCH_SIZE else predict_native(X)
+        )
+    return predict_native
+
+
+def pack_rows(X: np.ndarray) -> np.ndarray:
+    """Packs the feature rows as the uint32 bits of their float32 values.
+
+    Rows that are equal as float32 get the same prediction, as xgboost predicts
+    float32 features.
+    """
+    return np.ascontiguousarray(X, dtype=np.float32).view(np.uint32)
+
+
+def hash_rows(packed: np.ndarray) -> np.ndarray:
+    """Hashes the packed rows column by column with FNV-1a."""
+    hashes = np.full(len(packed), FNV_OFFSET, dtype=np.uint64)
+    for column in packed.T:
+        hashes ^= column
+        hashes *= FNV_PRIME
+    return hashes
+
+
+def deduplicate(packed: np.ndarray):
+    """Finds the unique packed rows.
+
+    Rows are grouped by hash, and verified to equal the first row of their group.
+    On a hash collision the rows are grouped by their packed bytes instead.
+
+    Args:
+        packed: The packed rows.
+
+    Returns:
+        The hash of each row, the index of the first row of each unique row, and
+        the unique row of each row.
+    """
+    hashes = hash_rows(packed)
+    inverse, _ = pd.factorize(hashes)
+    first = np.empty(inverse.max() + 1 if len(inverse) > 0 else 0, dtype=np.int64)
+    # Assign in reverse so the first occurrence of each unique row is kept
+    first[inverse[::-1]] = np.arange(len(inverse) - 1, -1, -1)
+    if not np.array_equal(packed[first[inverse]], packed):
+        logger.warning("Hash collision in feature rows, deduplicating by bytes")
+        rows = packed.view(np.dtype((np.void, packed.dtype.itemsize * packed.shape[1])))
+        _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+    return hashes, first, inverse
+
+
+class PredictionCache:
+    """A least recently used cache of the predictions of packed feature rows.
+
+    Predictions are keyed by row hash and verified against the cached row.  The
+    cache is saved to and loaded from S3 per model version, so a new model starts
+    with an empty cache.
+
+    Args:
+        model_version: The version of the model that made the predictions.
+        max_size: The maximum number of cached predictions.
+    """
+
+    def __init__(self, model_version: str, max_size: int = 1000000):
+        self.model_version = model_version
+        self.max_size = max_size
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.rows = None
+        self.values = np.empty(0, dtype=np.float32)
+        self.last_used = np.empty(0, dtype=np.int64)
+        self.clock = 0
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def lookup(self, hashes: np.ndarray, rows: np.ndarray):
+        """Gets whether each row is cached, and the cached predictions."""
+        self.clock += 1
+        if len(self) == 0:
+            return np.zeros(len(hashes), dtype=bool), np.empty(0, dtype=np.float32)
+        index = pd.Index(self.hashes).get_indexer(hashes)
+        found = index >= 0
+        found[found] = (self.rows[index[found]] == rows[found]).all(axis=1)
+        self.last_used[index[found]] = self.clock
+        return found, self.values[index[found]]
 
-    # Get input file list
-    input_file_list = glob.glob("/opt/ml/processing/input/*.csv")
+    def insert(self, hashes: np.ndarray, rows: np.ndarray, values: np.ndarray):
+        """Adds predictions, evicting the least recently used over the max size."""
+        # Skip hashes that are already cached or repeated in the batch, which are
+        # hash collisions, so each cached hash is unique
+        new = np.zeros(len(hashes), dtype=bool)
+        new[np.unique(hashes, return_index=True)[1]] = True
+        new &= ~np.isin(hashes, self.hashes)
+        if self.rows is None:
+            self.rows = np.empty((0, rows.shape[1]), dtype=rows.dtype)
+        self.hashes = np.concatenate([self.hashes, hashes[new]])
+        self.rows = np.concatenate([self.rows, rows[new]])
+        self.values = np.concatenate([self.values, values[new]])
+        self.last_used = np.concatenate(
+            [self.last_used, np.full(new.sum(), self.clock, dtype=np.int64)]
+        )
+        if len(self) > self.max_size:
+            keep = np.argpartition(-self.last_used, self.max_size)[: self.max_size]
+            keep.sort()
+            self.hashes = self.hashes[keep]
+            self.rows = self.rows[keep]
+            self.values = self.values[keep]
+            self.last_used = self.last_used[keep]
 
-    # Drop the first target column
-    df = load_data(input_file_list)
+    def get_key(self, cache_uri: str):
+        bucket, prefix = split_s3_uri(cache_uri)
+        return bucket, os.path.join(prefix, f"{self.model_version}.npz")
+
+    def load(self, cache_uri: str):
+        """Loads the cache for the model version, if it exists."""
+        bucket, key = self.get_key(cache_uri)
+        s3 = boto3.client("s3")
+        try:
+            response = s3.get_object(Bucket=bucket, Key=key)
+        except s3.exceptions.NoSuchKey:
+            logger.info(f"No prediction cache found for model {self.model_version}")
+            return self
+        with np.load(io.BytesIO(response["Body"].read())) as arrays:
+            self.hashes = arrays["hashes"]
+            self.rows = arrays["rows"]
+            self.values = arrays["values"]
+            self.last_used = arrays["last_used"]
+        self.clock = int(self.last_used.max()) if len(self) > 0 else 0
+        logger.info(f"Loaded {len(self)} cached predictions from s3://{bucket}/{key}")
+        return self
+
+    def save(self, cache_uri: str):
+        bucket, key = self.get_key(cache_uri)
+        body = io.BytesIO()
+        np.savez(
+            body,
+            hashes=self.hashes,
+            rows=self.rows,
+            values=self.values,
+            last_used=self.last_used,
+        )
+        boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=body.getvalue())
+        logger.info(f"Saved {len(self)} cached predictions to s3://{bucket}/{key}")
+
+
+class DedupPredictor:
+    """Predicts only the unique feature rows of each batch, and scatters them back.
+
+    Args:
+        predict: The function to predict a feature array.
+        cache: The optional prediction cache shared across batches.
+    """
+
+    def __init__(self, predict, cache: PredictionCache = None):
+        self.predict = predict
+        self.cache = cache
+        self.item_count = 0
+        self.unique_count = 0
+        self.cache_hits = 0
+        self.dedup_seconds = 0.0
+        self.predict_seconds = 0.0
+
+    def __call__(self, X: np.ndarray) -> np.ndarray:
+        start = time.perf_counter()
+        packed = pack_rows(X)
+        hashes, first, inverse = deduplicate(packed)
+        values = np.empty(len(first), dtype=np.float32)
+        missing = np.ones(len(first), dtype=bool)
+        if self.cache is not None:
+            found, cached = self.cache.lookup(hashes[first], packed[first])
+            values[found] = cached
+            missing = ~found
+            self.cache_hits += int(found.sum())
+
+        predict_start = time.perf_counter()
+        if missing.any():
+            rows = first[missing]
+            values[missing] = self.predict(packed[rows].view(np.float32))
+        self.predict_seconds += time.perf_counter() - predict_start
+        if self.cache is not None and missing.any():
+            self.cache.insert(hashes[rows], packed[rows], values[missing])
+
+        self.item_count += len(X)
+        self.unique_count += len(first)
+        self.dedup_seconds += time.perf_counter() - start
+        return values[inverse]
+
+    def summary(self) -> str:
+        predicted = self.unique_count - self.cache_hits
+        if self.item_count == 0 or predicted == 0:
+            return f"Predicted 0 of {self.item_count} rows"
+        # Estimate the time to predict every row from the time per predicted row
+        overhead = self.dedup_seconds - self.predict_seconds
+        estimated = self.predict_seconds / predicted * self.item_count
+        return (
+            f"Predicted {predicted} of {self.item_count} rows, with "
+            f"{1 - self.unique_count / self.item_count:.1%} duplicates and "
+            f"{self.cache_hits} cache hits, in {self.dedup_seconds:.2f}s "
+            f"({overhead:.2f}s dedup) for an estimated "
+            f"{estimated / self.dedup_seconds:.1f}x speedup"
+        )
+
+
+def split_s3_uri(uri: str):
+    url_parsed = urlparse(uri)
+    return url_parsed.netloc, url_parsed.path.lstrip("/")
+
+
+def get_model_version(path: str) -> str:
+    """Gets the sha256 of the model file."""
+    file_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+
+def load_json(path: str):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunk-size", type=int, default=100000)
+    # Optional baseline to compute drift inline while scoring
+    parser.add_argument("--baseline-dir", type=str, default=None)
+    parser.add_argument("--lib-dir", type=str, default=f"{PROCESSING_DIR}/lib")
+    parser.add_argument(
+        "--monitoring-dir", type=str, default=f"{PROCESSING_DIR}/monitoring"
+    )
+    parser.add_argument("--drift-metric", type=str, default="ks")
+    # Optionally sample the scored rows as the Model Monitor input, or for inline
+    # drift with confidence bounds on the sampling error
+    parser.add_argument("--sample-dir", type=str, default=f"{PROCESSING_DIR}/sample")
+    parser.add_argument("--sample-size", type=int, default=None)
+    parser.add_argument("--sample-fraction", type=float, default=None)
+    parser.add_argument("--confidence-level", type=float, default=0.95)
+    parser.add_argument(
+        "--predictor", type=str, default="xgboost", choices=["xgboost", "compiled"]
+    )
+    parser.add_argument(
+        "--predictor-dir", type=str, default=f"{PROCESSING_DIR}/predictor"
+    )
+    # Predict unique feature rows, optionally with predictions cached across batches
+    parser.add_argument("--no-dedup", action="store_false", dest="dedup")
+    parser.add_argument("--prediction-cache-uri", type=str, default=None)
+    parser.add_argument("--prediction-cache-size", type=int, default=1000000)
+    # Optionally write only the row key, prediction and a subset of the features
+    parser.add_argument("--compact-output", action="store_true")
+    parser.add_argument("--output-columns", nargs="*", default=[])
+    # Profile the stages, optionally publishing them as CloudWatch metrics
+    parser.add_argument(
+        "--profiler-dir", type=str, default=f"{PROCESSING_DIR}/profiler"
+    )
+    parser.add_argument("--profile-dir", type=str, default=f"{PROCESSING_DIR}/profile")
+    parser.add_argument("--metrics-namespace", type=str, default=None)
+    parser.add_argument("--pipeline-name", type=str, default=None)
+    args, _ = parser.parse_known_args()
+    return args
+
+
+def load_predictor(args, profiler):
+    """Loads the model and its predictor, deduplicating rows unless disabled.
+
+    Returns:
+        The predict function and the optional prediction cache.
+    """
+    with profiler.span("load_model"):
+        model_path = f"{PROCESSING_DIR}/model/model.tar.gz"
+        with tarfile.open(model_path) as tar:
+            tar.extractall(path=".")
+
+        logger.debug("Loading xgboost model.")
+        model = pickle.load(open("xgboost-model", "rb"))
+        logger.info(f"Predicting with the {args.predictor} predictor")
+        predict = get_predictor(model, args.predictor, args.predictor_dir)
+        cache = None
+        if args.dedup:
+            if args.prediction_cache_uri is not None:
+                cache = PredictionCache(
+                    get_model_version("xgboost-model"), args.prediction_cache_size
+                ).load(args.prediction_cache_uri)
+            predict = DedupPredictor(predict, cache)
+    return predict, cache
+
+
+def load_accumulator(baseline_dir: str, lib_dir: str, confidence_level: float = None):
+    """Loads the baseline to compute drift against while scoring.
+
+    Args:
+        baseline_dir: The directory of the baseline statistics and constraints.
+        lib_dir: The directory of the drift module.
+        confidence_level: The optional confidence level of the bounds on the drift
+            of a sample.
+
+    Returns:
+        The drift accumulator and the baseline constraints.
+    """
+    # Drift library is provided as a processing input alongside the script
+    sys.path.insert(0, lib_dir)
+    from drift import DriftAccumulator
+
+    logger.info(f"Loading baseline from {baseline_dir}")
+    statistics = load_json(f"{baseline_dir}/stats/statistics.json")
+    constraints = load_json(f"{baseline_dir}/constraints/constraints.json")
+    return DriftAccumulator(statistics, confidence_level), constraints
+
+
+def score_files(
+    file_list: list,
+    input_dir: str,
+    output_dir: str,
+    predict,
+    args,
+    profiler,
+    sampler: RowSampler = None,
+    accumulator=None,
+):
+    """Scores the input files in chunks, writing the scores of each chunk.
+
+    Each chunk is also added to the optional sampler and drift accumulator, which
+    only counts the sampled rows when sampling.
+    """
     target_col = "fare_amount"
-    X_test = xgboost.DMatrix(df.drop(target_col, axis=1).values)
+    chunks = profiler.iterate(
+        "load",
+        read_chunks(file_list, args.chunk_size),
+        rows=lambda chunk: len(chunk[1]),
+    )
+    with ScoreWriter() as writer:
+        for file, df in chunks:
+            # Drop the first target column
+            with profiler.span("predict", rows=len(df)):
+                predictions = predict(df.drop(target_col, axis=1).values)
+
+            # Replace the target column with predictions, to allow comparing in model monitor
+            df[target_col] = predictions
+
+            with profiler.span("write", rows=len(df)):
+                if args.compact_output:
+                    # Write the scores of each input file to its relative path, keyed
+                    # by row so they can be read side by side with the input file
+                    path = os.path.join(output_dir, os.path.relpath(file, input_dir))
+                    writer.write(
+                        path, get_compact_scores(df, target_col, args.output_columns)
+                    )
+                else:
+                    writer.write(f"{output_dir}/scores.csv", df)
 
-    logger.info("Performing predictions against test data.")
-    predictions = model.predict(X_test)
+            if sampler is not None:
+                with profiler.span("sample", rows=len(df)):
+                    df = sampler.add(df)
+
+            if accumulator is not None and df is not None:
+                with profiler.span("drift", rows=len(df)):
+                    accumulator.update(df)
+
+
+def write_drift(accumulator, constraints: dict, args, profiler):
+    """Writes the statistics of the scored rows, and the violations if found."""
+    logger.info(f"Computing drift for {accumulator.item_count} rows")
+    with profiler.span("drift"):
+        violations = accumulator.violations(constraints, args.drift_metric)
+    pathlib.Path(args.monitoring_dir).mkdir(parents=True, exist_ok=True)
+    with open(f"{args.monitoring_dir}/statistics.json", "w") as f:
+        json.dump(accumulator.statistics(), f)
+    # Only write violations when found, which the evaluate drift lambda checks for
+    logger.info(f"Found {len(violations['violations'])} violations")
+    if len(violations["violations"]) > 0:
+        with open(f"{args.monitoring_dir}/constraint_violations.json", "w") as f:
+            json.dump(violations, f)
+
+
+def main(args, profiler):
+    logger.debug("Starting evaluation.")
+    predict, cache = load_predictor(args, profiler)
 
-    # Replace the target column with predictions, to allow comparing in model monitor
-    df[target_col] = predictions
+    sample = args.sample_size is not None or args.sample_fraction is not None
+    accumulator, constraints = None, None
+    if args.baseline_dir is not None:
+        accumulator, constraints = load_accumulator(
+            args.baseline_dir, args.lib_dir, args.confidence_level if sample else None
+        )
 
-    output_dir = "/opt/ml/processing/output"
+    sampler = None
+    if sample:
+        logger.info(
+            f"Sampling scores with size: {args.sample_size} fraction: {args.sample_fraction}"
+        )
+        # Inline drift counts the sampled rows, which are not written for a Model Monitor job
+        sampler = RowSampler(
+            f"{args.sample_dir}/scores.csv" if accumulator is None else None,
+            args.sample_size,
+            args.sample_fraction,
+        )
+
+    logger.debug("Reading input data.")
+
+    # Get input file list, including the partition sub directories of a manifest
+    input_dir = f"{PROCESSING_DIR}/input"
+    input_file_list = sorted(glob.glob(f"{input_dir}/**/*.csv", recursive=True))
+
+    output_dir = f"{PROCESSING_DIR}/output"
     pathlib.Path(output_dir).mkdir(parents=True, exist_ok=True)
 
-    logger.info("Writing out scores with header")
-    df.to_csv(f"{output_dir}/scores.csv", index=False, header=True)
+    logger.info("Performing predictions and writing out scores with header")
+    score_files(
+        input_file_list,
+        input_dir,
+        output_dir,
+        predict,
+        args,
+        profiler,
+        sampler,
+        accumulator,
+    )
+
+    if sampler is not None:
+        with profiler.span("sample"):
+            reservoir = sampler.close()
+        if accumulator is not None and reservoir is not None:
+            with profiler.span("drift", rows=len(reservoir)):
+                accumulator.update(reservoir)
+
+    if args.dedup:
+        logger.info(predict.summary())
+    if cache is not None:
+        with profiler.span("save_cache"):
+            cache.save(args.prediction_cache_uri)
+
+    if accumulator is not None:
+        write_drift(accumulator, constraints, args, profiler)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+
+    # Profiler module is provided as a processing input alongside the script
+    sys.path.insert(0, args.profiler_dir)
+    from profiler import Profiler
+
+    profiler = Profiler("score")
+    main(args, profiler)
+    profiler.write(args.profile_dir)
+    if args.metrics_namespace is not None:
+        profiler.put_metrics(args.metrics_namespace, args.pipeline_name)
@@ -0,0 +1,173 @@
+import numpy as np
+import pandas as pd
+
+from pipelines.drift import (
+    baseline_histograms,
+    bin_counts,
+    compare_to_baseline,
+    confidence_intervals,
+    drift_metrics,
+    DriftAccumulator,
+)
+
+
+def get_feature(name: str, buckets: list):
+    return {
+        "name": name,
+        "inferred_type": "Fractional",
+        "numerical_statistics": {
+            "common": {"num_present": sum(b[2] for b in buckets), "num_missing": 0},
+            "distribution": {
+                "kll": {
+                    "buckets": [
+                        {"lower_bound": lb, "upper_bound": ub, "count": c}
+                        for lb, ub, c in buckets
+                    ],
+                }
+            },
+        },
+    }
+
+
+def get_statistics():
+    return {
+        "version": 0.0,
+        "features": [
+            get_feature("fare_amount", [(0, 10, 50), (10, 20, 50)]),
+            get_feature("hour", [(0, 8, 25), (8, 16, 25), (16, 24, 50)]),
+        ],
+    }
+
+
+def get_constraints(threshold: float = 0.1):
+    return {
+        "version": 0.0,
+        "monitoring_config": {
+            "distribution_constraints": {
+                "perform_comparison": "Enabled",
+                "comparison_threshold": threshold,
+                "comparison_method": "Robust",
+            }
+        },
+    }
+
+
+def test_baseline_histograms():
+    names, edges, counts = baseline_histograms(get_statistics())
+    assert names == ["fare_amount", "hour"]
+    # Edges are padded with nan to the largest number of buckets
+    assert np.array_equal(edges[0], [0, 10, 20, np.nan], equal_nan=True)
+    assert np.array_equal(edges[1], [0, 8, 16, 24])
+    # Counts include an underflow and overflow bin
+    assert np.array_equal(counts[0], [0, 50, 50, 0, 0])
+    assert np.array_equal(counts[1], [0, 25, 25, 50, 0])
+
+
+def test_bin_counts():
+    _, edges, _ = baseline_histograms(get_statistics())
+    values = np.array(
+        [
+            [-1, 0],
+            [0, 8],
+            [10, 9],
+            [15, 24],
+            [25, np.nan],
+        ]
+    )
+    counts = bin_counts(values, edges)
+    assert np.array_equal(counts[0], [1, 2, 1, 1, 0])
+    assert np.array_equal(counts[1], [0, 2, 1, 1, 0])
+
+
+def test_identical_distribution_has_no_drift():
+    _, edges, counts = baseline_histograms(get_statistics())
+    metrics = drift_metrics(counts, counts * 3, edges)
+    for name in ["psi", "ks", "js", "wasserstein"]:
+        assert np.allclose(metrics[name], 0)
+
+
+def test_shifted_distribution_has_drift():
+    _, edges, counts = baseline_histograms(get_statistics())
+    # Move all mass for the fare into the overflow bin
+    shifted = counts.copy()
+    shifted[0] = [0, 0, 0, 100, 0]
+    metrics = drift_metrics(counts, shifted, edges)
+    assert np.isclose(metrics["ks"][0], 1.0)
+    assert np.isclose(metrics["js"][0], 1.0, atol=1e-3)
+    assert np.isclose(metrics["wasserstein"][0], 10.0)
+    assert metrics["psi"][0] > 1
+    assert np.allclose(metrics["ks"][1], 0)
+
+
+def test_compare_to_baseline():
+    df = pd.DataFrame(
+        {
+            "fare_amount": np.linspace(0.5, 9.5, 100),
+            "passenger_count": np.ones(100),
+            "hour": np.concatenate([np.full(25, 4), np.full(25, 12), np.full(50, 20)]),
+        }
+    )
+    report = compare_to_baseline(get_statistics(), get_constraints(0.1), df)
+    violations = report["violations"]
+    assert [v["feature_name"] for v in violations] == ["fare_amount"]
+    assert violations[0]["constraint_check_type"] == "baseline_drift_check"
+    assert "exceeds threshold: 0.1" in violations[0]["description"]
+
+
+def test_drift_accumulator():
+    df = pd.DataFrame(
+        {
+            "fare_amount": np.linspace(0.5, 9.5, 100),
+            "hour": np.concatenate([np.full(25, 4), np.full(25, 12), np.full(50, 20)]),
+        }
+    )
+    accumulator = DriftAccumulator(get_statistics())
+    # Accumulate in chunks, which should match comparing the whole batch
+    for i in range(0, len(df), 30):
+        accumulator.update(df[i : i + 30])
+    assert accumulator.violations(get_constraints(0.1)) == compare_to_baseline(
+        get_statistics(), get_constraints(0.1), df
+    )
+
+    statistics = accumulator.statistics()
+    assert statistics["dataset"]["item_count"] == 100
+    fare = statistics["features"][0]["numerical_statistics"]
+    assert fare["common"]["num_present"] == 100
+    assert np.isclose(fare["mean"], 5.0)
+    assert fare["min"] == 0.5 and fare["max"] == 9.5
+    assert [b["count"] for b in fare["distribution"]["kll"]["buckets"]] == [100, 0]
+
+
+def test_sampled_drift_has_confidence_intervals():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "fare_amount": rng.uniform(5, 25, 100000),
+            "hour": rng.uniform(0, 24, 100000),
+        }
+    )
+    exact = DriftAccumulator(get_statistics())
+    exact.update(df)
+    sampled = DriftAccumulator(get_statistics(), confidence_level=0.95)
+    sampled.update(df.sample(2000, random_state=1))
+
+    violation = sampled.violations(get_constraints(0.1))["violations"][0]
+    assert violation["feature_name"] == "fare_amount"
+    # Exact distances should be within the bounds estimated from the sample
+    for name in ["ks", "wasserstein"]:
+        lower, upper = violation["confidence_intervals"][name]
+        assert lower <= violation["metrics"][name] <= upper
+        assert lower <= exact.metrics()[name][0] <= upper
+    assert "confidence_intervals" not in exact.violations(get_constraints(0.1))
+
+
+def test_confidence_intervals_shrink_with_sample_size():
+    names, edges, counts = baseline_histograms(get_statistics())
+    metrics = drift_metrics(counts, counts, edges)
+    lower, upper = confidence_intervals(metrics, edges, [100, 0])["ks"]
+    assert np.all(lower == 0)
+    assert np.isclose(upper[0], np.sqrt(np.log(2 / 0.05) / 200))
+    # Features without sampled values are unbounded within the cdf range
+    assert upper[1] == 1.0
+    _, larger = confidence_intervals(metrics, edges, [10000, 10000])["ks"]
+    assert np.all(larger < upper)
@@ -0,0 +1,65 @@
+import argparse
+from datetime import datetime
+
+import pytest
+
+from pipelines.manifest import (
+    get_manifest,
+    parse_date,
+    parse_date_argument,
+    select_keys,
+)
+
+
+def test_parse_date():
+    assert parse_date("green_tripdata_2018-02.csv") == datetime(2018, 2, 1)
+    assert parse_date("2021-06-01-10.csv") == datetime(2021, 6, 1, 10)
+    assert parse_date("2021/06/01/10/scores.csv") == datetime(2021, 6, 1, 10)
+    assert parse_date("2021-06-01T10") == datetime(2021, 6, 1, 10)
+    assert parse_date("test.csv") is None
+    assert parse_date("part-120180-2.csv") is None
+    # Fields out of range are not dates
+    assert parse_date("2021-13-01.csv") is None
+    assert parse_date("2021-02-30.csv") is None
+    assert parse_date("2021-06-01T24") is None
+
+
+def test_parse_date_argument():
+    assert parse_date_argument("2021-06-01T10") == datetime(2021, 6, 1, 10)
+    for value in ["test", "2021-02-30"]:
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_date_argument(value)
+
+
+def test_select_keys():
+    keys = [
+        "green_tripdata_2018-03.csv",
+        "green_tripdata_2018-01.csv",
+        "green_tripdata_2018-02.csv",
+        "green_tripdata_2018-13.csv",
+        "test.csv",
+    ]
+    assert select_keys(keys, datetime(2018, 2, 1), datetime(2018, 3, 1)) == [
+        "green_tripdata_2018-02.csv"
+    ]
+    assert select_keys(keys, start=datetime(2018, 2, 1)) == [
+        "green_tripdata_2018-02.csv",
+        "green_tripdata_2018-03.csv",
+    ]
+    assert len(select_keys(keys)) == 3
+
+
+def test_select_hourly_keys():
+    keys = [f"2021/06/01/{hour:02d}/batch.csv" for hour in range(24)]
+    selected = select_keys(
+        keys, parse_date("2021-06-01T10"), parse_date("2021-06-01T12")
+    )
+    assert selected == ["2021/06/01/10/batch.csv", "2021/06/01/11/batch.csv"]
+
+
+def test_get_manifest():
+    assert get_manifest("s3://bucket/batch/prod", ["a.csv", "b/c.csv"]) == [
+        {"prefix": "s3://bucket/batch/prod/"},
+        "a.csv",
+        "b/c.csv",
+    ]
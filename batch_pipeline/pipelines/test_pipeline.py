@@ -0,0 +1,56 @@
+import contextlib
+from unittest import mock
+
+from pipelines.pipeline import get_definition_hash, get_pipeline
+
+BUCKET = "test-bucket"
+ROLE_ARN = "arn:aws:iam::123456789012:role/test"
+
+
+@contextlib.contextmanager
+def offline_render(timestamp: float):
+    """Renders definitions at a fixed time without uploading or calling AWS."""
+    patches = [
+        mock.patch("time.time", return_value=timestamp),
+        mock.patch("sagemaker.session.Session.default_bucket", return_value=BUCKET),
+        mock.patch(
+            "sagemaker.s3.S3Uploader.upload",
+            side_effect=lambda local_path, desired_s3_uri, **kwargs: desired_s3_uri,
+        ),
+        mock.patch(
+            "sagemaker.workflow.lambda_step.LambdaStep._get_function_arn",
+            return_value="arn:aws:lambda:us-east-1:123456789012:function:test",
+        ),
+    ]
+    with contextlib.ExitStack() as stack:
+        for patch in patches:
+            stack.enter_context(patch)
+        yield
+
+
+def render(timestamp: float, **kwargs) -> str:
+    with offline_render(timestamp):
+        pipeline = get_pipeline(
+            region="us-east-1",
+            role=ROLE_ARN,
+            pipeline_name="drift-batch-prod",
+            default_bucket=BUCKET,
+            base_job_prefix="drift",
+            lambda_role_arn=ROLE_ARN,
+            data_uri=f"s3://{BUCKET}/batch/prod",
+            model_uri=f"s3://{BUCKET}/model.tar.gz",
+            transform_uri=f"s3://{BUCKET}/transform/prod",
+            baseline_uri=f"s3://{BUCKET}/baseline",
+            **kwargs,
+        )
+        return pipeline.definition()
+
+
+def test_definition_hash_ignores_render_time():
+    first, second = render(1600000000.0), render(1600003600.5)
+    # Uploaded code and default outputs are under job names with the render time
+    assert first != second
+    assert get_definition_hash(first) == get_definition_hash(second)
+    assert get_definition_hash(first) != get_definition_hash(
+        render(1600000000.0, inline_drift=True)
+    )
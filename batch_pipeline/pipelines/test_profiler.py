@@ -0,0 +1,80 @@
+import json
+
+import numpy as np
+
+from pipelines.profiler import Profiler
+
+
+class CloudWatch:
+    def __init__(self):
+        self.requests = []
+
+    def put_metric_data(self, Namespace: str, MetricData: list):
+        self.requests.append((Namespace, MetricData))
+
+
+def test_profiler_stages(tmp_path):
+    profiler = Profiler("score")
+
+    @profiler.stage("predict", rows=len)
+    def predict(X):
+        return X.sum(axis=1)
+
+    chunks = [np.ones((100, 3)), np.ones((50, 3))]
+    for chunk in profiler.iterate("load", chunks, rows=len):
+        with profiler.span("chunk"):
+            predict(chunk)
+    # The peak memory of a stage includes the stages nested in it
+    with profiler.span("allocate", rows=10) as outer:
+        with profiler.span("inner"):
+            values = np.ones(2 ** 24)
+        del values
+    assert outer.peak_rss >= 2 ** 27
+
+    profile = profiler.write(str(tmp_path))
+    with open(tmp_path / "profile.json") as f:
+        assert json.load(f)["job"] == "score"
+    stages = {stage["stage"]: stage for stage in profile["stages"]}
+    assert list(stages) == ["load", "chunk", "predict", "allocate", "inner"]
+    # Getting each chunk and the end of the chunks are timed as load
+    assert stages["load"]["count"] == 3
+    assert stages["load"]["rows"] == 150
+    assert stages["predict"]["count"] == 2
+    assert stages["predict"]["rows"] == 150
+    assert stages["chunk"]["rows"] is None
+    assert stages["allocate"]["rows"] == 10
+    assert stages["inner"]["peak_rss_mb"] >= 128
+
+
+def test_profiler_job_peak_across_resets():
+    profiler = Profiler("score")
+    # Memory allocated outside of any stage is still in the peak of the job
+    values = np.ones(2 ** 25)
+    del values
+    with profiler.span("small"):
+        pass
+    assert profiler.to_dict()["peak_rss_mb"] >= 256
+
+
+def test_profiler_put_metrics():
+    profiler = Profiler("score")
+    for i in range(5):
+        with profiler.span(f"stage{i}", rows=1):
+            pass
+    cloudwatch = CloudWatch()
+    profiler.put_metrics("namespace", "pipeline", cloudwatch)
+
+    metric_data = [m for _, request in cloudwatch.requests for m in request]
+    assert [len(request) for _, request in cloudwatch.requests] == [20, 5]
+    assert {m["MetricName"] for m in metric_data} == {
+        "StageSeconds",
+        "StageCpuSeconds",
+        "StagePeakMemory",
+        "StageRows",
+        "StageRowsPerSecond",
+    }
+    assert metric_data[0]["Dimensions"] == [
+        {"Name": "PipelineName", "Value": "pipeline"},
+        {"Name": "Job", "Value": "score"},
+        {"Name": "Stage", "Value": "stage0"},
+    ]
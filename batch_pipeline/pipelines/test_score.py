@@ -0,0 +1,137 @@
+import numpy as np
+import pandas as pd
+
+from pipelines import score
+from pipelines.score import (
+    deduplicate,
+    DedupPredictor,
+    get_compact_scores,
+    pack_rows,
+    PredictionCache,
+    read_chunks,
+    RowSampler,
+    ScoreWriter,
+)
+
+
+def write_input(path, num_rows: int):
+    pd.DataFrame(
+        {
+            "fare_amount": [0.0] * num_rows,
+            "passenger_count": range(num_rows),
+            "geo_distance": [1.5] * num_rows,
+        }
+    ).to_csv(path, index=False)
+
+
+def test_compact_scores_keyed_by_row(tmp_path):
+    write_input(tmp_path / "input.csv", 5)
+    with ScoreWriter() as writer:
+        for file, df in read_chunks([tmp_path / "input.csv"], chunk_size=2):
+            df["fare_amount"] = df["passenger_count"] * 2.0
+            scores = get_compact_scores(df, "fare_amount", ["geo_distance"])
+            writer.write(tmp_path / "output" / "input.csv", scores)
+
+    scores = pd.read_csv(tmp_path / "output" / "input.csv")
+    assert list(scores.columns) == ["row", "fare_amount", "geo_distance"]
+    assert scores["row"].tolist() == [0, 1, 2, 3, 4]
+    assert scores["fare_amount"].tolist() == [0.0, 2.0, 4.0, 6.0, 8.0]
+
+
+def test_score_writer_header_per_file(tmp_path):
+    df = pd.DataFrame({"row": [0], "fare_amount": [1.0]})
+    with ScoreWriter() as writer:
+        writer.write(tmp_path / "a" / "scores.csv", df)
+        writer.write(tmp_path / "a" / "scores.csv", df)
+        writer.write(tmp_path / "b" / "scores.csv", df)
+
+    assert len(pd.read_csv(tmp_path / "a" / "scores.csv")) == 2
+    assert len(pd.read_csv(tmp_path / "b" / "scores.csv")) == 1
+
+
+def get_features(num_rows: int, num_unique: int, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    unique = rng.normal(size=(num_unique, 4))
+    unique[0, 1] = np.nan
+    return unique[rng.integers(0, num_unique, num_rows)]
+
+
+def predict_sum(X):
+    return np.nansum(X, axis=1).astype(np.float32)
+
+
+def test_deduplicate():
+    packed = pack_rows(get_features(1000, 20))
+    _, first, inverse = deduplicate(packed)
+    assert len(first) == len(np.unique(packed, axis=0))
+    np.testing.assert_array_equal(packed[first[inverse]], packed)
+
+
+def test_deduplicate_hash_collision(monkeypatch):
+    monkeypatch.setattr(score, "hash_rows", lambda p: np.zeros(len(p), np.uint64))
+    packed = pack_rows(get_features(1000, 20))
+    _, first, inverse = deduplicate(packed)
+    assert len(first) == len(np.unique(packed, axis=0))
+    np.testing.assert_array_equal(packed[first[inverse]], packed)
+
+
+def test_dedup_predictor_with_cache():
+    X = get_features(1000, 20)
+    calls = []
+
+    def predict(X):
+        calls.append(len(X))
+        return predict_sum(X)
+
+    predictor = DedupPredictor(predict, PredictionCache("model", max_size=15))
+    np.testing.assert_allclose(predictor(X[:500]), predict_sum(X[:500]), rtol=1e-6)
+    np.testing.assert_allclose(predictor(X[500:]), predict_sum(X[500:]), rtol=1e-6)
+    assert calls[0] == 20
+    # The least recently used predictions are evicted over the max size
+    assert len(predictor.cache) == 15
+    assert calls[1] == 5
+    assert predictor.cache_hits == 15
+    assert "1000 rows" in predictor.summary()
+
+
+def test_dedup_predictor_with_cache_hash_collision(monkeypatch):
+    # Distinct rows with the same hash are predicted, but only the first is cached
+    monkeypatch.setattr(score, "hash_rows", lambda p: np.zeros(len(p), np.uint64))
+    X = get_features(1000, 20)
+    predictor = DedupPredictor(predict_sum, PredictionCache("model"))
+    np.testing.assert_allclose(predictor(X), predict_sum(X), rtol=1e-6)
+    assert len(predictor.cache) == 1
+    np.testing.assert_allclose(predictor(X), predict_sum(X), rtol=1e-6)
+    assert predictor.cache_hits == 1
+
+
+def test_row_sampler(tmp_path):
+    df = pd.DataFrame({"fare_amount": np.arange(10000.0), "passenger_count": 1})
+    sampler = RowSampler(tmp_path / "size" / "scores.csv", sample_size=100)
+    for i in range(0, len(df), 1000):
+        sampler.add(df[i : i + 1000])
+    sampler.close()
+    sample = pd.read_csv(tmp_path / "size" / "scores.csv")
+    assert len(sample) == 100
+    assert sample["fare_amount"].is_unique
+    # Sample should be spread across the chunks
+    assert sample["fare_amount"].min() < 2000 and sample["fare_amount"].max() > 8000
+
+    sampler = RowSampler(tmp_path / "fraction" / "scores.csv", sample_fraction=0.1)
+    for i in range(0, len(df), 1000):
+        sampler.add(df[i : i + 1000])
+    sampler.close()
+    sample = pd.read_csv(tmp_path / "fraction" / "scores.csv")
+    assert 800 < len(sample) < 1200
+    assert sample["fare_amount"].is_unique
+    assert sample["fare_amount"].is_monotonic_increasing
+
+    # Without a path the sampled rows are only returned, for inline drift
+    sampler = RowSampler(None, sample_fraction=0.1)
+    sample = pd.concat([sampler.add(df[i : i + 1000]) for i in range(0, len(df), 1000)])
+    assert sampler.close() is None
+    assert len(sample) == sampler.sample_count
+    sampler = RowSampler(None, sample_size=100)
+    assert sampler.add(df) is None
+    assert len(sampler.close()) == 100
+    assert not (tmp_path / "scores.csv").exists()
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+import xgboost
+
+from pipelines.tree_ensemble import TreeEnsemble
+
+
+def get_data(num_rows: int = 2000, missing: float = 0.05, seed: int = 42):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(num_rows, 6)).astype(np.float32)
+    y = 3 * X[:, 0] + X[:, 1] ** 2 + rng.normal(size=num_rows)
+    X[rng.random(X.shape) < missing] = np.nan
+    return X, y
+
+
+def train(X, y, **params):
+    params = {"objective": "reg:squarederror", "max_depth": 6, **params}
+    return xgboost.train(params, xgboost.DMatrix(X, label=y), num_boost_round=20)
+
+
+def test_predict_matches_xgboost():
+    X, y = get_data()
+    booster = train(X, y)
+    ensemble = TreeEnsemble.from_booster(booster)
+    expected = booster.predict(xgboost.DMatrix(X))
+    np.testing.assert_allclose(ensemble.predict(X), expected, rtol=1e-5, atol=1e-5)
+    # Predicting in several blocks gives the same predictions
+    np.testing.assert_allclose(
+        ensemble.predict(X, block_size=300), expected, rtol=1e-5, atol=1e-5
+    )
+
+
+def test_predict_without_missing_values():
+    X, y = get_data(missing=0)
+    booster = train(X, y, max_depth=3)
+    ensemble = TreeEnsemble.from_booster(booster)
+    assert ensemble.max_depth <= 3
+    np.testing.assert_allclose(
+        ensemble.predict(X[:1]), booster.predict(xgboost.DMatrix(X[:1])), rtol=1e-5
+    )
+
+
+def test_unsupported_objective():
+    X, y = get_data()
+    booster = train(X, (y > 0).astype(int), objective="binary:logistic")
+    with pytest.raises(ValueError):
+        TreeEnsemble.from_booster(booster)
+
+
+def test_predict_infinite_values():
+    X, y = get_data()
+    booster = train(X, y)
+    ensemble = TreeEnsemble.from_booster(booster)
+    X[:50, 0], X[50:100, 1] = np.inf, -np.inf
+    # Xgboost rejects infinite values, which route like the largest finite values
+    finite = np.nan_to_num(X[:100], nan=np.nan)
+    expected = booster.predict(xgboost.DMatrix(finite))
+    np.testing.assert_allclose(
+        ensemble.predict(X[:100]), expected, rtol=1e-5, atol=1e-5
+    )
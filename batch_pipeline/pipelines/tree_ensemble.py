@@ -0,0 +1,189 @@
+"""Vectorized prediction for xgboost tree ensembles over flattened node arrays.
+
+The trees of a booster are flattened into arrays of the split feature, threshold,
+default direction, children and value of every node, in a layout like treelite.
+Prediction traverses all trees for a block of rows at once, one level per step, so
+there is no DMatrix construction or per tree python overhead.  That gives the lower
+latency for small batches, but native xgboost has about twice the throughput for
+large batches, so callers only use the tree ensemble for up to `MAX_BATCH_SIZE` rows.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+
+# Objectives with an identity link, which is the only output transform supported
+SUPPORTED_OBJECTIVES = ["reg:squarederror", "reg:linear"]
+
+# The number of rows traversed at once, to bound the memory of the node indices
+BLOCK_SIZE = 256
+
+# The largest batch predicted faster than xgboost, see benchmarks/tree_predictor.py
+MAX_BATCH_SIZE = 100
+
+
+def load_booster_json(booster) -> dict:
+    """Gets the json model of an xgboost booster, with exact split conditions."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "model.json")
+        booster.save_model(path)
+        with open(path, "r") as f:
+            return json.load(f)
+
+
+def get_bfs_order(left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """Gets the nodes of a tree in breadth first order, with sibling pairs adjacent."""
+    order, level = [], np.array([0])
+    while len(level) > 0:
+        order.append(level)
+        level = level[left[level] != -1]
+        level = np.stack([left[level], right[level]], axis=1).ravel()
+    return np.concatenate(order)
+
+
+def get_depth(
+    left: np.ndarray, nodes: np.ndarray, is_leaf: np.ndarray, renumber: np.ndarray
+) -> int:
+    """Gets the maximum number of splits from the root to a leaf of a renumbered tree."""
+    depth = np.zeros(len(nodes), dtype=np.int64)
+    for node in nodes[~is_leaf]:
+        child = renumber[left[node]]
+        depth[child] = depth[child + 1] = depth[node] + 1
+    return int(depth.max())
+
+
+class TreeEnsemble:
+    """An xgboost gbtree regression model flattened for vectorized prediction.
+
+    Nodes are numbered so that the right child of a split directly follows its left
+    child.  Leaves have a left child of themselves and a NaN threshold with missing
+    values going left, so no value, including infinity, compares greater or equal
+    and traversal stays at a leaf once it is reached.
+
+    Args:
+        feature: The split feature index of each node.
+        threshold: The split threshold of each node, rows less than go left.
+        default_left: Whether missing values go left at each node.
+        left: The left child of each node, with the right child at left + 1.
+        value: The leaf value of each node.
+        roots: The root node of each tree.
+        max_depth: The maximum depth of the trees.
+        base_score: The score added to the sum of the leaf values.
+    """
+
+    def __init__(
+        self,
+        feature: np.ndarray,
+        threshold: np.ndarray,
+        default_left: np.ndarray,
+        left: np.ndarray,
+        value: np.ndarray,
+        roots: np.ndarray,
+        max_depth: int,
+        base_score: float,
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.default_left = default_left
+        self.left = left
+        self.value = value
+        self.roots = roots
+        self.max_depth = max_depth
+        self.base_score = np.float32(base_score)
+
+    @classmethod
+    def from_booster(cls, booster):
+        """Flattens the trees of an xgboost booster.
+
+        Args:
+            booster: The xgboost booster.
+
+        Returns:
+            The tree ensemble.
+        """
+        learner = load_booster_json(booster)["learner"]
+        objective = learner["objective"]["name"]
+        if objective not in SUPPORTED_OBJECTIVES:
+            raise ValueError(f"Unsupported objective: {objective}")
+        if learner["gradient_booster"]["name"] != "gbtree":
+            raise ValueError(
+                f"Unsupported booster: {learner['gradient_booster']['name']}"
+            )
+        # Newer versions of xgboost write the base score as a vector
+        base_score = float(learner["learner_model_param"]["base_score"].strip("[]"))
+
+        arrays = {k: [] for k in ["feature", "threshold", "default_left", "left"]}
+        arrays.update({"value": [], "roots": []})
+        offset, max_depth = 0, 0
+        for tree in learner["gradient_booster"]["model"]["trees"]:
+            left = np.asarray(tree["left_children"], dtype=np.int64)
+            right = np.asarray(tree["right_children"], dtype=np.int64)
+            order = get_bfs_order(left, right)
+            renumber = np.empty(len(left), dtype=np.int64)
+            renumber[order] = np.arange(len(order))
+
+            left, right = left[order], right[order]
+            conditions = np.asarray(tree["split_conditions"], dtype=np.float32)[order]
+            is_leaf = left == -1
+            features = np.asarray(tree["split_indices"], dtype=np.int64)[order]
+            default_left = np.asarray(tree["default_left"], dtype=bool)[order]
+            arrays["feature"].append(np.where(is_leaf, 0, features))
+            arrays["threshold"].append(np.where(is_leaf, np.nan, conditions))
+            arrays["default_left"].append(default_left | is_leaf)
+            nodes = np.arange(len(order))
+            arrays["left"].append(
+                np.where(is_leaf, nodes, renumber[np.maximum(left, 0)]) + offset
+            )
+            # The split condition of a leaf holds its value
+            arrays["value"].append(np.where(is_leaf, conditions, 0))
+            arrays["roots"].append(offset)
+            max_depth = max(max_depth, get_depth(left, nodes, is_leaf, renumber))
+            offset += len(order)
+
+        # Index with the native index type, which take would otherwise convert to
+        return cls(
+            feature=np.concatenate(arrays["feature"]).astype(np.intp),
+            threshold=np.concatenate(arrays["threshold"]).astype(np.float32),
+            default_left=np.concatenate(arrays["default_left"]),
+            left=np.concatenate(arrays["left"]).astype(np.intp),
+            value=np.concatenate(arrays["value"]).astype(np.float32),
+            roots=np.asarray(arrays["roots"], dtype=np.intp),
+            max_depth=max_depth,
+            base_score=base_score,
+        )
+
+    def predict_block(self, X: np.ndarray) -> np.ndarray:
+        num_rows, num_features = X.shape
+        # Index the flattened rows by the row offset plus the split feature
+        row_offsets = (np.arange(num_rows, dtype=np.intp) * num_features)[:, None]
+        flat = X.ravel()
+        has_missing = np.isnan(flat).any()
+        nodes = np.broadcast_to(self.roots, (num_rows, len(self.roots)))
+        for _ in range(self.max_depth):
+            x = flat.take(self.feature.take(nodes) + row_offsets)
+            go_right = x >= self.threshold.take(nodes)
+            if has_missing:
+                go_right |= np.isnan(x) & ~self.default_left.take(nodes)
+            nodes = self.left.take(nodes) + go_right
+        return self.value.take(nodes).sum(axis=1, dtype=np.float32) + self.base_score
+
+    def predict(self, X: np.ndarray, block_size: int = BLOCK_SIZE) -> np.ndarray:
+        """Predicts the rows in blocks, traversing all trees for a block at once.
+
+        Args:
+            X: The features of each row, with missing values as NaN.
+            block_size: The number of rows traversed at once.
+
+        Returns:
+            The float32 predictions.
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if len(X) <= block_size:
+            return self.predict_block(X)
+        return np.concatenate(
+            [
+                self.predict_block(X[i : i + block_size])
+                for i in range(0, len(X), block_size)
+            ]
+        )
@@ -0,0 +1,69 @@
+import os
+import re
+import subprocess
+import sys
+
+import pytest
+
+APP_DIR = os.path.dirname(os.path.realpath(__file__))
+
+# Cumulative import time budget for the app module, in milliseconds
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 200))
+
+# Modules that must only be imported on the code paths that use them
+HEAVY_MODULES = ["aws_cdk", "sagemaker", "boto3", "botocore", "pandas", "numpy"]
+
+IMPORT_TIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def get_import_times(module: str) -> list:
+    """Imports a module in a fresh interpreter with `-X importtime`.
+
+    Returns:
+        A list of (name, self_us, cumulative_us, depth) for each imported module.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    import_times = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            import_times.append(
+                (name, int(self_us), int(cumulative_us), len(indent) // 2)
+            )
+    return import_times
+
+
+def format_report(import_times: list, top: int = 15) -> str:
+    slowest = sorted(import_times, key=lambda t: t[1], reverse=True)[:top]
+    lines = [f"{'self ms':>8} {'cumulative ms':>14}  module"]
+    for name, self_us, cumulative_us, depth in slowest:
+        lines.append(f"{self_us / 1000:>8.1f} {cumulative_us / 1000:>14.1f}  {name}")
+    return "\n".join(lines)
+
+
+@pytest.fixture(scope="module")
+def import_times():
+    return get_import_times("app")
+
+
+def test_app_imports_no_heavy_modules(import_times):
+    imported = {name.split(".")[0] for name, _, _, _ in import_times}
+    heavy = sorted(imported.intersection(HEAVY_MODULES))
+    assert heavy == [], f"Heavy modules imported at startup: {heavy}\n" + format_report(
+        import_times
+    )
+
+
+def test_app_import_time_budget(import_times):
+    cumulative_ms = next(t[2] for t in import_times if t[0] == "app") / 1000
+    assert cumulative_ms < IMPORT_TIME_BUDGET_MS, (
+        f"Importing app took {cumulative_ms:.1f}ms, over the budget of "
+        f"{IMPORT_TIME_BUDGET_MS}ms\n" + format_report(import_times)
+    )
@@ -0,0 +1,160 @@
+"""Benchmarks generating the build and batch pipeline definitions offline.
+
+Times `get_pipeline` and `definition()` for each pipeline with the SageMaker
+session stubbed, so no AWS credentials or network access are required, and
+reports the number of boto clients created along the way.
+
+Usage:
+    python benchmarks/pipeline_definition.py --repeat 20
+"""
+import argparse
+import contextlib
+import importlib
+import os
+import statistics
+import sys
+import time
+from unittest import mock
+
+import botocore.session
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+ROLE_ARN = "arn:aws:iam::123456789012:role/benchmark"
+BUCKET = "benchmark-bucket"
+
+CASES = {
+    "build": {
+        "project": "build_pipeline",
+        "kwargs": {
+            "role": ROLE_ARN,
+            "pipeline_name": "drift-build",
+            "model_package_group_name": "drift",
+            "default_bucket": BUCKET,
+            "base_job_prefix": "drift",
+        },
+    },
+    "build-incremental": {
+        "project": "build_pipeline",
+        "kwargs": {
+            "role": ROLE_ARN,
+            "pipeline_name": "drift-build",
+            "model_package_group_name": "drift",
+            "default_bucket": BUCKET,
+            "base_job_prefix": "drift",
+            "incremental_baseline": True,
+            "feature_cache": True,
+        },
+    },
+    "batch-monitor": {
+        "project": "batch_pipeline",
+        "kwargs": {
+            "role": ROLE_ARN,
+            "pipeline_name": "drift-batch-prod",
+            "default_bucket": BUCKET,
+            "base_job_prefix": "drift",
+            "lambda_role_arn": ROLE_ARN,
+            "data_uri": f"s3://{BUCKET}/batch/prod",
+            "model_uri": f"s3://{BUCKET}/model.tar.gz",
+            "transform_uri": f"s3://{BUCKET}/transform/prod",
+            "baseline_uri": f"s3://{BUCKET}/baseline",
+            "drift_sample_fraction": 0.1,
+        },
+    },
+    "batch-inline": {
+        "project": "batch_pipeline",
+        "kwargs": {
+            "role": ROLE_ARN,
+            "pipeline_name": "drift-batch-prod",
+            "default_bucket": BUCKET,
+            "base_job_prefix": "drift",
+            "lambda_role_arn": ROLE_ARN,
+            "data_uri": f"s3://{BUCKET}/batch/prod",
+            "model_uri": f"s3://{BUCKET}/model.tar.gz",
+            "transform_uri": f"s3://{BUCKET}/transform/prod",
+            "baseline_uri": f"s3://{BUCKET}/baseline",
+            "inline_drift": True,
+        },
+    },
+}
+
+
+def stub_upload(local_path, desired_s3_uri, *args, **kwargs):
+    return f"{desired_s3_uri}/{os.path.basename(local_path)}"
+
+
+@contextlib.contextmanager
+def offline_session(client_counter: list):
+    """Stubs the session calls that would reach AWS while rendering definitions."""
+    create_client = botocore.session.Session.create_client
+
+    def counting_create_client(self, *args, **kwargs):
+        client_counter.append(args[0] if args else kwargs.get("service_name"))
+        return create_client(self, *args, **kwargs)
+
+    patches = [
+        mock.patch("sagemaker.session.Session.default_bucket", return_value=BUCKET),
+        mock.patch("sagemaker.session.Session.account_id", return_value="123456789012"),
+        mock.patch("sagemaker.s3.S3Uploader.upload", side_effect=stub_upload),
+        mock.patch(
+            "sagemaker.workflow.lambda_step.LambdaStep._get_function_arn",
+            return_value="arn:aws:lambda:us-east-1:123456789012:function:benchmark",
+        ),
+        mock.patch.object(
+            botocore.session.Session, "create_client", counting_create_client
+        ),
+    ]
+    with contextlib.ExitStack() as stack:
+        for patch in patches:
+            stack.enter_context(patch)
+        yield
+
+
+def load_pipeline_module(project: str):
+    """Imports `pipelines.pipeline` from a project, which share module names."""
+    for name in list(sys.modules):
+        if name.split(".")[0] in ("pipelines", "infra"):
+            del sys.modules[name]
+    project_dir = os.path.join(ROOT_DIR, project)
+    sys.path.insert(0, project_dir)
+    try:
+        return importlib.import_module("pipelines.pipeline")
+    finally:
+        sys.path.remove(project_dir)
+
+
+def run_case(case: dict, region: str, repeat: int) -> dict:
+    module = load_pipeline_module(case["project"])
+    get_times, definition_times, clients = [], [], []
+    with offline_session(clients):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            pipeline = module.get_pipeline(region=region, **case["kwargs"])
+            built = time.perf_counter()
+            pipeline.definition()
+            get_times.append(built - start)
+            definition_times.append(time.perf_counter() - built)
+    return {
+        "get_pipeline_ms": statistics.median(get_times) * 1000,
+        "definition_ms": statistics.median(definition_times) * 1000,
+        "clients": len(clients) / repeat,
+    }
+
+
+def main(region: str, repeat: int, cases: list):
+    print(f"{'case':<20} {'get_pipeline ms':>16} {'definition ms':>14} {'clients':>8}")
+    for name in cases:
+        result = run_case(CASES[name], region, repeat)
+        print(
+            f"{name:<20} {result['get_pipeline_ms']:>16.2f} "
+            f"{result['definition_ms']:>14.2f} {result['clients']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--region", default="us-east-1")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    args = parser.parse_args()
+    main(args.region, args.repeat, args.cases)
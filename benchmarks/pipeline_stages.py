@@ -0,0 +1,370 @@
+"""Benchmarks the stages of the build and batch pipelines on synthetic taxi data.
+
+Generates trips and zones with `synthetic_taxi.py`, then runs each stage and
+records its wall time, peak resident memory and rows per second:
+
+* `load_data`, `enrich_data`, `clean_data` and `save_files` from `preprocess.py`
+  over the generated trip files.
+* `baseline`, the statistics of `baseline.py` over the baseline split.
+* `train`, training xgboost with the build pipeline hyperparameters.
+* `evaluate` and `score`, running `evaluate.py` on the test split and `score.py` on
+  a batch of trips generated with drift, as processing jobs in a job directory.
+* `drift`, the drift of the scores against the baseline with `drift.py`.
+
+The scripts run as processes, whose peak memory is read from the profile they
+write.  The other stages run in this process, with the peak memory reset before
+each stage where Linux allows it, and otherwise reported as the peak of the process
+so far.  Results are written as json, and compared against a previous run with
+`--compare` to fail on regressions.  The preprocessing stages require geopandas.
+
+Usage:
+    python benchmarks/pipeline_stages.py --rows 1000000 --output results.json
+    python benchmarks/pipeline_stages.py --rows 1000000 --compare results.json
+"""
+import argparse
+import functools
+import glob
+import importlib.util
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+
+import pandas as pd
+import xgboost
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+BUILD_DIR = os.path.join(ROOT_DIR, "build_pipeline", "pipelines")
+BATCH_DIR = os.path.join(ROOT_DIR, "batch_pipeline", "pipelines")
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, BATCH_DIR)
+sys.path.insert(0, BUILD_DIR)
+
+from baseline import compute_partial, get_constraints, get_statistics  # noqa: E402
+from baseline import merge_partials  # noqa: E402
+from drift import DriftAccumulator  # noqa: E402
+from profiler import get_peak_rss, reset_peak_rss  # noqa: E402
+from synthetic_taxi import generate_zones, write_trips, write_zones  # noqa: E402
+from tree_predictor import HYPERPARAMETERS  # noqa: E402
+
+# The chunk of rows read at once when computing drift, as in the model monitor
+CHUNK_SIZE = 100000
+
+
+class StageTimer:
+    """Records the wall time, peak memory and throughput of each stage.
+
+    Args:
+        verbose: Print each stage as it completes.
+    """
+
+    def __init__(self, verbose: bool = True):
+        self.stages = []
+        self.verbose = verbose
+
+    def record(self, stage: str, rows: int, seconds: float, peak_rss: int):
+        result = {
+            "stage": stage,
+            "rows": rows,
+            "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds > 0 else None,
+            "peak_rss_mb": peak_rss / 2 ** 20,
+        }
+        self.stages.append(result)
+        if self.verbose:
+            print(format_stage(result), flush=True)
+
+    def run(self, stage: str, fn, rows=None):
+        """Runs a stage in this process.
+
+        Args:
+            stage: The stage name.
+            fn: The stage function.
+            rows: The rows processed, or a function of the result to count them,
+                by default the length of the result.
+
+        Returns:
+            The result of the stage function.
+        """
+        reset_peak_rss()
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        if rows is None:
+            rows = len(result)
+        elif callable(rows):
+            rows = rows(result)
+        self.record(stage, rows, seconds, get_peak_rss())
+        return result
+
+    def run_script(self, stage: str, script: str, job_dir: str, rows: int, args=()):
+        """Runs a processing script as a job with its own process.
+
+        Args:
+            stage: The stage name.
+            script: The path of the script.
+            job_dir: The processing directory of the job, in place of
+                `/opt/ml/processing`, which is also the working directory.
+            rows: The rows processed by the job.
+            args: The script arguments.
+        """
+        env = dict(os.environ, PROCESSING_DIR=job_dir)
+        with open(os.path.join(job_dir, "output.log"), "w") as log:
+            start = time.perf_counter()
+            process = subprocess.Popen(
+                [sys.executable, script, *args],
+                cwd=job_dir,
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+            process.wait()
+            seconds = time.perf_counter() - start
+        if process.returncode != 0:
+            raise RuntimeError(f"Stage {stage} failed, see {job_dir}/output.log")
+        # The resource usage of the child includes the memory it was forked with, so
+        # take the peak the job measured after exec from its profile
+        with open(os.path.join(job_dir, "profile", "profile.json"), "r") as f:
+            peak_rss = json.load(f)["peak_rss_mb"] * 2 ** 20
+        self.record(stage, rows, seconds, peak_rss)
+
+
+def format_stage(result: dict) -> str:
+    rows_per_second = result["rows_per_second"] or 0
+    return (
+        f"{result['stage']:<12} {result['rows']:>12,} {result['seconds']:>10.2f} "
+        f"{rows_per_second:>14,.0f} {result['peak_rss_mb']:>12.0f}"
+    )
+
+
+def write_features(path: str, df: pd.DataFrame):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_csv(path, header=True, index=False)
+
+
+def get_baseline_statistics(train_df: pd.DataFrame) -> dict:
+    return get_statistics(merge_partials([compute_partial(train_df)]))
+
+
+def train_model(train_df: pd.DataFrame, val_df: pd.DataFrame, num_round: int):
+    # Train on the label in the first column, as in the built-in xgboost container
+    dtrain = xgboost.DMatrix(train_df.iloc[:, 1:].values, label=train_df.iloc[:, 0])
+    dval = xgboost.DMatrix(val_df.iloc[:, 1:].values, label=val_df.iloc[:, 0])
+    return xgboost.train(
+        HYPERPARAMETERS,
+        dtrain,
+        num_round,
+        evals=[(dval, "validation")],
+        early_stopping_rounds=10,
+        verbose_eval=False,
+    )
+
+
+def write_model(booster, path: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    model_file = os.path.join(os.path.dirname(path), "xgboost-model")
+    with open(model_file, "wb") as f:
+        pickle.dump(booster, f)
+    with tarfile.open(path, "w:gz") as tar:
+        tar.add(model_file, arcname="xgboost-model")
+
+
+def compute_drift(file_list: list, statistics: dict, constraints: dict) -> int:
+    accumulator = DriftAccumulator(statistics)
+    for file in file_list:
+        for df in pd.read_csv(file, chunksize=CHUNK_SIZE):
+            accumulator.update(df)
+    accumulator.violations(constraints)
+    return accumulator.item_count
+
+
+def main(
+    work_dir: str,
+    num_rows: int,
+    months: int,
+    batch_rows: int,
+    drift: float,
+    num_round: int,
+    predictor: str,
+) -> dict:
+    # Preprocess is imported when run, as it installs geopandas if it is missing
+    import preprocess
+
+    print(f"Generating {num_rows:,} trips and {batch_rows:,} batch trips in {work_dir}")
+    zones = generate_zones()
+    zones_file = os.path.join(work_dir, "zones", "taxi_zones.zip")
+    os.makedirs(os.path.dirname(zones_file), exist_ok=True)
+    write_zones(zones, zones_file)
+    file_list = write_trips(zones, os.path.join(work_dir, "data"), num_rows, months)
+    batch_list = write_trips(
+        zones,
+        os.path.join(work_dir, "batch"),
+        batch_rows,
+        start_month="2021-12",
+        drift=drift,
+        seed=43,
+    )
+    preprocess.extract_zones(zones_file, os.path.dirname(zones_file))
+    zone_df = preprocess.load_zones(os.path.dirname(zones_file))
+
+    print(
+        f"\n{'stage':<12} {'rows':>12} {'seconds':>10} {'rows/s':>14} {'peak MB':>12}"
+    )
+    timer = StageTimer()
+    trip_df = timer.run("load_data", lambda: preprocess.load_data(file_list))
+    rows = len(trip_df)
+    # Stage functions take their frames with partial, so deleting the frames after
+    # a stage frees them
+    enriched_df = timer.run(
+        "enrich_data", functools.partial(preprocess.enrich_data, trip_df, zone_df)
+    )
+    del trip_df
+    data_df = timer.run(
+        "clean_data", functools.partial(preprocess.clean_data, enriched_df), rows=rows
+    )
+    del enriched_df
+    build_dir = os.path.join(work_dir, "build")
+    for name in ["train", "validation", "test", "baseline"]:
+        os.makedirs(os.path.join(build_dir, name), exist_ok=True)
+    train_df, val_df, test_df = timer.run(
+        "save_files",
+        functools.partial(preprocess.save_files, build_dir, data_df),
+        rows=len(data_df),
+    )
+    del data_df
+
+    statistics = timer.run(
+        "baseline",
+        functools.partial(get_baseline_statistics, train_df),
+        rows=len(train_df),
+    )
+    constraints = get_constraints(statistics)
+    booster = timer.run(
+        "train",
+        functools.partial(train_model, train_df, val_df, num_round),
+        rows=len(train_df) + len(val_df),
+    )
+    del train_df, val_df
+
+    predictor_args = ["--predictor", predictor, "--predictor-dir", BATCH_DIR]
+    evaluate_dir = os.path.join(work_dir, "evaluate")
+    write_model(booster, os.path.join(evaluate_dir, "model", "model.tar.gz"))
+    write_features(os.path.join(evaluate_dir, "test", "test.csv"), test_df)
+    timer.run_script(
+        "evaluate",
+        os.path.join(BUILD_DIR, "evaluate.py"),
+        evaluate_dir,
+        len(test_df),
+        predictor_args,
+    )
+
+    # Score the batch trips, preprocessed as by the batch input
+    score_dir = os.path.join(work_dir, "score")
+    write_model(booster, os.path.join(score_dir, "model", "model.tar.gz"))
+    score_rows = 0
+    for file in batch_list:
+        batch_df = preprocess.clean_data(
+            preprocess.enrich_data(preprocess.load_data([file]), zone_df)
+        )
+        input_file = os.path.join(score_dir, "input", os.path.basename(file))
+        write_features(input_file, batch_df)
+        score_rows += len(batch_df)
+    timer.run_script(
+        "score",
+        os.path.join(BATCH_DIR, "score.py"),
+        score_dir,
+        score_rows,
+        predictor_args,
+    )
+    score_list = sorted(glob.glob(f"{score_dir}/output/*.csv"))
+    timer.run(
+        "drift",
+        lambda: compute_drift(score_list, statistics, constraints),
+        rows=lambda item_count: item_count,
+    )
+    return {
+        "rows": num_rows,
+        "batch_rows": score_rows,
+        "drift": drift,
+        "num_round": num_round,
+        "predictor": predictor,
+        "stages": timer.stages,
+    }
+
+
+def compare(results: dict, previous: dict, max_regression: float) -> list:
+    """Compares the stages with a previous run, and gets the regressed stages.
+
+    Args:
+        results: The results of this run.
+        previous: The results of the previous run.
+        max_regression: The largest allowed relative increase in the wall time or
+            peak memory of a stage.
+
+    Returns:
+        The names of the stages that regressed.
+    """
+    previous_stages = {s["stage"]: s for s in previous["stages"]}
+    regressions = []
+    print(
+        f"\n{'stage':<12} {'seconds':>10} {'change':>8} {'peak MB':>10} {'change':>8}"
+    )
+    for stage in results["stages"]:
+        before = previous_stages.get(stage["stage"])
+        if before is None:
+            continue
+        time_change = stage["seconds"] / before["seconds"] - 1
+        rss_change = stage["peak_rss_mb"] / before["peak_rss_mb"] - 1
+        regressed = max(time_change, rss_change) > max_regression
+        print(
+            f"{stage['stage']:<12} {stage['seconds']:>10.2f} {time_change:>+8.0%} "
+            f"{stage['peak_rss_mb']:>10.0f} {rss_change:>+8.0%}"
+            + ("  regressed" if regressed else "")
+        )
+        if regressed:
+            regressions.append(stage["stage"])
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--months", type=int, default=1)
+    parser.add_argument("--batch-rows", type=int, default=None)
+    parser.add_argument("--drift", type=float, default=0.2)
+    parser.add_argument("--num-round", type=int, default=100)
+    parser.add_argument(
+        "--predictor", type=str, default="xgboost", choices=["xgboost", "compiled"]
+    )
+    parser.add_argument("--work-dir", type=str, default=None)
+    parser.add_argument("--output", type=str, default=None)
+    parser.add_argument("--compare", type=str, default=None)
+    parser.add_argument("--max-regression", type=float, default=0.1)
+    args = parser.parse_args()
+    if importlib.util.find_spec("geopandas") is None:
+        parser.error("the preprocessing stages require geopandas")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        results = main(
+            args.work_dir or temp_dir,
+            args.rows,
+            args.months,
+            args.batch_rows or max(1, args.rows // 10),
+            args.drift,
+            args.num_round,
+            args.predictor,
+        )
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            sys.exit(
+                f"Stages regressed by more than {args.max_regression:.0%}: {regressions}"
+            )
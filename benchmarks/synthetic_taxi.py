@@ -0,0 +1,296 @@
+"""Generates synthetic NYC green taxi trip records and taxi zones.
+
+Writes monthly trip files with the columns of the TLC green taxi trip records, and
+a `taxi_zones.zip` shapefile of square zones laid out on a grid over New York City
+in the EPSG:2263 projection of the TLC zone file, to run the preprocessing and
+batch scripts at any scale without downloading the TLC data.  The output is
+deterministic for a seed, and is generated in chunks so the file size is not
+limited by memory.
+
+Trips are drawn between nearby zones, with the distance, duration and fare derived
+from the zone centres.  A fraction of dirty rows, such as negative fares and trips
+that end before they start, is mixed in as in the TLC data.  The drift setting
+lengthens trips, raises fares and shifts the passenger counts, to test the drift
+checks against a baseline generated without drift.
+
+Writing the zones requires geopandas.
+
+Usage:
+    python benchmarks/synthetic_taxi.py --rows 1000000 --output-dir /tmp/taxi
+    python benchmarks/synthetic_taxi.py --rows 1000000 --drift 0.5 --months 1 \
+        --start-month 2021-07 --output-dir /tmp/taxi-drift
+"""
+import argparse
+import os
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+# The number of zones, including the two unknown zones at the end of the TLC table
+NUM_ZONES = 265
+GRID_COLUMNS = 17
+# The south west corner and cell size of the zone grid in EPSG:2263 feet
+GRID_ORIGIN = (913000.0, 120000.0)
+CELL_SIZE = 9000.0
+FEET_PER_MILE = 5280.0
+BOROUGHS = ["Bronx", "Brooklyn", "Manhattan", "Queens", "Staten Island", "EWR"]
+
+# The columns of the TLC green taxi trip records
+TRIP_COLUMNS = [
+    "VendorID",
+    "lpep_pickup_datetime",
+    "lpep_dropoff_datetime",
+    "store_and_fwd_flag",
+    "RatecodeID",
+    "PULocationID",
+    "DOLocationID",
+    "passenger_count",
+    "trip_distance",
+    "fare_amount",
+    "extra",
+    "mta_tax",
+    "tip_amount",
+    "tolls_amount",
+    "ehail_fee",
+    "improvement_surcharge",
+    "total_amount",
+    "payment_type",
+    "trip_type",
+    "congestion_surcharge",
+]
+PASSENGER_PROBABILITIES = [0.7, 0.15, 0.05, 0.03, 0.04, 0.03]
+CHUNK_SIZE = 1000000
+
+
+def generate_zones(seed: int = 42) -> pd.DataFrame:
+    """Generates the zone table, with the centre and size of each square zone.
+
+    Args:
+        seed: The random seed.
+
+    Returns:
+        The zones with the columns of the TLC zone table, and the centre `x`, `y`
+        and `size` in feet.
+    """
+    rng = np.random.default_rng(seed)
+    index = np.arange(NUM_ZONES)
+    row, column = np.divmod(index, GRID_COLUMNS)
+    # Jitter the zone centres and sizes, so the zone distances are not all equal
+    size = CELL_SIZE * rng.uniform(0.6, 0.9, NUM_ZONES)
+    x = (
+        GRID_ORIGIN[0]
+        + (column + 0.5 + rng.uniform(-0.05, 0.05, NUM_ZONES)) * CELL_SIZE
+    )
+    y = GRID_ORIGIN[1] + (row + 0.5 + rng.uniform(-0.05, 0.05, NUM_ZONES)) * CELL_SIZE
+    return pd.DataFrame(
+        {
+            "OBJECTID": index + 1,
+            "Shape_Leng": 4 * size,
+            "Shape_Area": size ** 2,
+            "zone": [f"Zone {i + 1}" for i in index],
+            "LocationID": index + 1,
+            "borough": [BOROUGHS[i] for i in rng.integers(0, 5, NUM_ZONES)],
+            "x": x,
+            "y": y,
+            "size": size,
+        }
+    )
+
+
+def write_zones(zones: pd.DataFrame, path: str):
+    """Writes the zones as a zipped `taxi_zones.shp` shapefile, like the TLC file."""
+    import geopandas as gpd
+    from shapely.geometry import box
+
+    half = zones["size"] / 2
+    geometry = [
+        box(x0, y0, x1, y1)
+        for x0, y0, x1, y1 in zip(
+            zones["x"] - half, zones["y"] - half, zones["x"] + half, zones["y"] + half
+        )
+    ]
+    zone_df = gpd.GeoDataFrame(
+        zones.drop(columns=["x", "y", "size"]), geometry=geometry, crs="EPSG:2263"
+    )
+    with tempfile.TemporaryDirectory() as shape_dir:
+        zone_df.to_file(os.path.join(shape_dir, "taxi_zones.shp"))
+        with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zip_file:
+            for file in sorted(os.listdir(shape_dir)):
+                zip_file.write(os.path.join(shape_dir, file), arcname=file)
+
+
+def format_timestamps(seconds: np.ndarray) -> np.ndarray:
+    # Formats epoch seconds with the YYYY-MM-DD HH:MM:SS layout of the TLC data
+    chars = np.datetime_as_string(seconds.astype("datetime64[s]"), unit="s")
+    chars = chars.astype("S19").view(np.uint8).reshape(len(seconds), 19)
+    chars[:, 10] = ord(" ")
+    return chars.view("S19").ravel().astype(str)
+
+
+def generate_trips(
+    zones: pd.DataFrame,
+    num_rows: int,
+    month: str,
+    drift: float = 0.0,
+    dirty_fraction: float = 0.02,
+    seed: int = 42,
+) -> pd.DataFrame:
+    """Generates the trip records of a month.
+
+    Args:
+        zones: The zone table from `generate_zones`.
+        num_rows: The number of trips.
+        month: The month of the pickups, as YYYY-MM.
+        drift: How far to shift the trips from the baseline distribution, where 0
+            is no drift and 1 roughly doubles the trip lengths and fares.
+        dirty_fraction: The fraction of rows with invalid values.
+        seed: The random seed.
+
+    Returns:
+        The trips with the TLC green taxi columns.
+    """
+    rng = np.random.default_rng(seed)
+    pickup = rng.integers(0, NUM_ZONES, num_rows)
+    # Draw the dropoff zone from the grid cells around the pickup zone
+    spread = 2.0 * (1 + drift)
+    row, column = np.divmod(pickup, GRID_COLUMNS)
+    row = row + np.rint(rng.normal(0, spread, num_rows)).astype(np.int64)
+    column = column + np.rint(rng.normal(0, spread, num_rows)).astype(np.int64)
+    column = np.clip(column, 0, GRID_COLUMNS - 1)
+    row = np.clip(row, 0, (NUM_ZONES - 1) // GRID_COLUMNS)
+    dropoff = np.minimum(row * GRID_COLUMNS + column, NUM_ZONES - 1)
+
+    x, y = zones["x"].to_numpy(), zones["y"].to_numpy()
+    straight = np.hypot(x[pickup] - x[dropoff], y[pickup] - y[dropoff])
+    # Trips within a zone still travel some distance
+    trip_distance = (
+        np.maximum(straight, zones["size"].to_numpy()[pickup] / 4)
+        * rng.uniform(1.1, 1.5, num_rows)
+        / FEET_PER_MILE
+    )
+
+    start = pd.Timestamp(f"{month}-01")
+    month_seconds = int(((start + pd.offsets.MonthBegin()) - start).total_seconds())
+    pickup_seconds = int(start.timestamp()) + rng.integers(0, month_seconds, num_rows)
+    speed = rng.gamma(9, 12 / 9, num_rows) / (1 + drift / 2)
+    duration = trip_distance / speed * 3600 + rng.integers(60, 300, num_rows)
+    dropoff_seconds = pickup_seconds + duration.astype(np.int64)
+
+    # Move the passenger counts towards larger groups with drift
+    probabilities = np.array(PASSENGER_PROBABILITIES) * np.linspace(
+        1, 1 + 2 * drift, len(PASSENGER_PROBABILITIES)
+    )
+    passenger_count = rng.choice(
+        np.arange(1, 7), num_rows, p=probabilities / probabilities.sum()
+    ).astype(np.float64)
+    fare_amount = (
+        2.5 + 2.5 * trip_distance + 0.35 * duration / 60 + rng.normal(0, 1, num_rows)
+    ) * (1 + drift / 2)
+    fare_amount = np.round(np.maximum(fare_amount, 2.5), 2)
+
+    # Mix in the invalid values that the preprocessing removes
+    dirty = np.flatnonzero(rng.random(num_rows) < dirty_fraction)
+    kind = rng.integers(0, 4, len(dirty))
+    fare_amount[dirty[kind == 0]] *= -1
+    passenger_count[dirty[kind == 1]] = 0
+    passenger_count[dirty[kind == 2]] = np.nan
+    dropoff_seconds[dirty[kind == 3]] = pickup_seconds[dirty[kind == 3]] - 60
+
+    extra = rng.choice([0.0, 0.5, 1.0], num_rows)
+    tip_amount = np.round(fare_amount * rng.choice([0, 0.15, 0.2], num_rows), 2)
+    total_amount = np.round(fare_amount + extra + 0.5 + tip_amount + 0.3, 2)
+    return pd.DataFrame(
+        {
+            "VendorID": rng.integers(1, 3, num_rows),
+            "lpep_pickup_datetime": format_timestamps(pickup_seconds),
+            "lpep_dropoff_datetime": format_timestamps(dropoff_seconds),
+            "store_and_fwd_flag": "N",
+            "RatecodeID": 1.0,
+            "PULocationID": pickup + 1,
+            "DOLocationID": dropoff + 1,
+            "passenger_count": passenger_count,
+            "trip_distance": np.round(trip_distance, 2),
+            "fare_amount": fare_amount,
+            "extra": extra,
+            "mta_tax": 0.5,
+            "tip_amount": tip_amount,
+            "tolls_amount": 0.0,
+            "ehail_fee": np.nan,
+            "improvement_surcharge": 0.3,
+            "total_amount": total_amount,
+            "payment_type": rng.integers(1, 3, num_rows).astype(np.float64),
+            "trip_type": 1.0,
+            "congestion_surcharge": 0.0,
+        },
+        columns=TRIP_COLUMNS,
+    )
+
+
+def write_trips(
+    zones: pd.DataFrame,
+    output_dir: str,
+    num_rows: int,
+    months: int = 1,
+    start_month: str = "2021-06",
+    drift: float = 0.0,
+    dirty_fraction: float = 0.02,
+    seed: int = 42,
+) -> list:
+    """Writes the trips split evenly across monthly `green_tripdata_YYYY-MM.csv` files.
+
+    Each file is written in chunks of rows, with a seed per file and chunk, so the
+    output does not depend on the available memory.
+
+    Returns:
+        The paths of the trip files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for i, month in enumerate(pd.period_range(start_month, periods=months, freq="M")):
+        path = os.path.join(output_dir, f"green_tripdata_{month}.csv")
+        file_rows = num_rows // months + (i < num_rows % months)
+        for j, chunk_start in enumerate(range(0, file_rows, CHUNK_SIZE)):
+            trips = generate_trips(
+                zones,
+                min(CHUNK_SIZE, file_rows - chunk_start),
+                str(month),
+                drift,
+                dirty_fraction,
+                seed=[seed, i, j],
+            )
+            trips.to_csv(path, mode="w" if j == 0 else "a", header=j == 0, index=False)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--months", type=int, default=1)
+    parser.add_argument("--start-month", type=str, default="2021-06")
+    parser.add_argument("--drift", type=float, default=0.0)
+    parser.add_argument("--dirty-fraction", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output-dir", type=str, required=True)
+    parser.add_argument("--no-zones", action="store_false", dest="zones")
+    args = parser.parse_args()
+
+    zones = generate_zones(args.seed)
+    for path in write_trips(
+        zones,
+        os.path.join(args.output_dir, "data"),
+        args.rows,
+        args.months,
+        args.start_month,
+        args.drift,
+        args.dirty_fraction,
+        args.seed,
+    ):
+        print(f"Wrote {path}")
+    if args.zones:
+        zones_path = os.path.join(args.output_dir, "zones", "taxi_zones.zip")
+        os.makedirs(os.path.dirname(zones_path), exist_ok=True)
+        write_zones(zones, zones_path)
+        print(f"Wrote {zones_path}")
@@ -0,0 +1,132 @@
+"""Benchmarks removing the IAM policies from a generated CloudFormation template.
+
+Compares the template transformer in `infra/clean_template.py` with the previous
+implementation, which scanned the DependsOn of every resource for each policy, and
+times transforming several template files in parallel.
+
+Usage:
+    python benchmarks/template_transform.py --resources 5000
+"""
+import argparse
+import copy
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+
+from infra.clean_template import RemoveResourceTypes, TemplateTransformer  # noqa: E402
+
+
+def generate_template(num_resources: int, policy_fraction: float = 0.2, seed=42):
+    """Generates a template of roles, policies and functions that depend on them."""
+    rng = random.Random(seed)
+    resources = {}
+    roles, policies = [], []
+    for i in range(num_resources):
+        kind = rng.random()
+        if kind < policy_fraction and roles:
+            logical_id = f"Policy{i}"
+            resources[logical_id] = {
+                "Type": "AWS::IAM::Policy",
+                "Properties": {
+                    "PolicyName": logical_id,
+                    "Roles": [{"Ref": rng.choice(roles)}],
+                },
+            }
+            policies.append(logical_id)
+        elif kind < 0.4 or not roles:
+            logical_id = f"Role{i}"
+            resources[logical_id] = {
+                "Type": "AWS::IAM::Role",
+                "Properties": {"RoleName": logical_id},
+            }
+            roles.append(logical_id)
+        else:
+            logical_id = f"Function{i}"
+            role = rng.choice(roles)
+            resources[logical_id] = {
+                "Type": "AWS::Lambda::Function",
+                "Properties": {
+                    "Role": {"Fn::GetAtt": [role, "Arn"]},
+                    "Description": {"Fn::Sub": "Function for ${%s}" % role},
+                },
+                "DependsOn": rng.sample(policies, min(len(policies), 5)) + [role],
+            }
+    return {"Resources": resources}
+
+
+def legacy_remove_policy(t: dict) -> dict:
+    """The previous remove_policy implementation, without the file handling."""
+    policy_list = [
+        k for k in t["Resources"] if t["Resources"][k]["Type"] == "AWS::IAM::Policy"
+    ]
+    for p in policy_list:
+        del t["Resources"][p]
+    depends_on = [k for k in t["Resources"] if "DependsOn" in t["Resources"][k]]
+    for d in depends_on:
+        for p in policy_list:
+            if p in t["Resources"][d]["DependsOn"]:
+                t["Resources"][d]["DependsOn"].remove(p)
+        if len(t["Resources"][d]["DependsOn"]) == 0:
+            del t["Resources"][d]["DependsOn"]
+    return t
+
+
+def time_call(fn, *args) -> tuple:
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def main(num_resources: int, num_files: int):
+    template = generate_template(num_resources)
+    num_policies = sum(
+        r["Type"] == "AWS::IAM::Policy" for r in template["Resources"].values()
+    )
+    print(f"Generated {num_resources} resources with {num_policies} policies")
+
+    transformer = TemplateTransformer([RemoveResourceTypes(["AWS::IAM::Policy"])])
+    legacy, legacy_ms = time_call(legacy_remove_policy, copy.deepcopy(template))
+    transformed, transform_ms = time_call(
+        transformer.transform, copy.deepcopy(template)
+    )
+    assert transformed == legacy, "Transformed template differs from legacy"
+    print(f"{'legacy remove_policy':<28} {legacy_ms:>10.1f} ms")
+    print(f"{'TemplateTransformer':<28} {transform_ms:>10.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i in range(num_files):
+            path = os.path.join(tmp_dir, f"stack{i}.template.json")
+            with open(path, "w") as f:
+                json.dump(template, f)
+            paths.append(path)
+        _, serial_ms = time_call(
+            lambda: [transformer.transform_file(path) for path in paths]
+        )
+        for path in paths:
+            with open(path, "w") as f:
+                json.dump(template, f)
+        # Force a worker per file, ignoring the size threshold
+        _, parallel_ms = time_call(
+            transformer.transform_files, paths, os.cpu_count(), 0
+        )
+        for path in paths:
+            with open(path, "w") as f:
+                json.dump(template, f)
+        _, default_ms = time_call(transformer.transform_files, paths)
+    print(f"{f'{num_files} files serial':<28} {serial_ms:>10.1f} ms")
+    print(f"{f'{num_files} files parallel':<28} {parallel_ms:>10.1f} ms")
+    print(f"{f'{num_files} files default':<28} {default_ms:>10.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--resources", type=int, default=5000)
+    parser.add_argument("--files", type=int, default=4)
+    args = parser.parse_args()
+    main(args.resources, args.files)
@@ -0,0 +1,118 @@
+"""Benchmarks the compiled tree ensemble predictor against native xgboost predict.
+
+Trains an xgboost model with the build pipeline hyperparameters on a synthetic
+taxi test set, then compares the throughput of predicting the whole test set and
+the latency of predicting small batches with `pipelines/tree_ensemble.py` and with
+`Booster.predict` on a DMatrix, as in `score.py` and `evaluate.py`.
+
+Usage:
+    python benchmarks/tree_predictor.py --rows 100000 --batch-sizes 1 10 100 1000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+import xgboost
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "batch_pipeline", "pipelines"))
+
+from tree_ensemble import TreeEnsemble  # noqa: E402
+
+# The hyperparameters of the training step in the build pipeline
+HYPERPARAMETERS = {
+    "objective": "reg:squarederror",
+    "max_depth": 9,
+    "eta": 0.2,
+    "gamma": 4,
+    "min_child_weight": 300,
+    "subsample": 0.8,
+}
+NUM_ROUND = 100
+
+
+def generate_data(num_rows: int, seed: int = 42):
+    """Generates features like the preprocessed taxi data, and a fare target."""
+    rng = np.random.default_rng(seed)
+    pickup = rng.normal([40.75, -73.95], 0.05, size=(num_rows, 2))
+    dropoff = rng.normal([40.75, -73.95], 0.05, size=(num_rows, 2))
+    geo_distance = np.linalg.norm(pickup - dropoff, axis=1) * 100
+    X = np.column_stack(
+        [
+            rng.integers(1, 7, num_rows),
+            pickup,
+            dropoff,
+            geo_distance,
+            rng.integers(0, 24, num_rows),
+            rng.integers(0, 7, num_rows),
+            rng.integers(1, 13, num_rows),
+        ]
+    ).astype(np.float32)
+    y = 2.5 + 2.5 * geo_distance + rng.gamma(2, 1, num_rows)
+    return X, y
+
+
+def time_calls(fn, repeat: int) -> list:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def main(num_rows: int, batch_sizes: list, repeat: int):
+    X_train, y_train = generate_data(num_rows, seed=1)
+    X_test, _ = generate_data(num_rows, seed=2)
+    booster = xgboost.train(
+        HYPERPARAMETERS, xgboost.DMatrix(X_train, label=y_train), NUM_ROUND
+    )
+
+    start = time.perf_counter()
+    ensemble = TreeEnsemble.from_booster(booster)
+    compile_ms = (time.perf_counter() - start) * 1000
+    print(
+        f"Compiled {len(ensemble.roots)} trees with {len(ensemble.feature)} nodes "
+        f"and depth {ensemble.max_depth} in {compile_ms:.1f} ms"
+    )
+
+    predictors = {
+        "xgboost": lambda X: booster.predict(xgboost.DMatrix(X)),
+        "compiled": ensemble.predict,
+    }
+    max_diff = np.abs(predictors["compiled"](X_test) - predictors["xgboost"](X_test))
+    print(f"Max absolute difference: {max_diff.max():.2e}")
+
+    print(f"\n{'predictor':<10} {'rows':>8} {'rows/s':>12}")
+    for name, predict in predictors.items():
+        seconds = min(time_calls(lambda: predict(X_test), max(1, repeat // 10)))
+        print(f"{name:<10} {num_rows:>8} {num_rows / seconds:>12,.0f}")
+
+    print(f"\n{'predictor':<10} {'batch':>8} {'p50 us':>10} {'p99 us':>10}")
+    for batch_size in batch_sizes:
+        for name, predict in predictors.items():
+            # Wrap around the test set, so every batch is full
+            batches = [
+                X_test[i : i + batch_size]
+                for i in np.arange(repeat) * batch_size % (num_rows - batch_size + 1)
+            ]
+            times = []
+            for batch in batches:
+                times += time_calls(lambda: predict(batch), 1)
+            p50 = statistics.median(times) * 1e6
+            p99 = np.percentile(times, 99) * 1e6
+            print(f"{name:<10} {batch_size:>8} {p50:>10.1f} {p99:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument(
+        "--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000]
+    )
+    parser.add_argument("--repeat", type=int, default=100)
+    args = parser.parse_args()
+    main(args.rows, args.batch_sizes, args.repeat)
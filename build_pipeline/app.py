@@ -4,16 +4,13 @@ import json
 import logging
 import os
 
-# Import the pipeline
-from pipelines.pipeline import get_pipeline, upload_pipeline
-
-from aws_cdk import core
-from infra.sagemaker_pipeline_stack import SageMakerPipelineStack
-
 # Configure the logger
 logger = logging.getLogger(__name__)
 logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"))
 
+# Heavy modules (aws_cdk and sagemaker) are imported on the code paths that use them,
+# to keep the app startup fast.  See test_app.py for the import budget.
+
 
 def main(
     project_name,
@@ -23,9 +20,24 @@ def main(
     sagemaker_pipeline_description,
     sagemaker_pipeline_role,
     artifact_bucket,
+    incremental_baseline=False,
+    input_manifest=False,
+    compiled_predictor=False,
+    step_cache=False,
+    feature_cache=False,
+    profile_metrics=False,
 ):
+    # Import the pipeline
+    from pipelines.pipeline import get_pipeline, upload_pipeline
+
     # Use project_name for pipeline and model package group name
     model_package_group_name = project_name
+
+    # Select the input data partitions with a manifest if enabled
+    manifest_uri = None
+    if input_manifest:
+        manifest_uri = f"s3://{artifact_bucket}/{project_id}/manifests/build.json"
+
     pipeline = get_pipeline(
         region=region,
         role=sagemaker_pipeline_role,
@@ -33,6 +45,12 @@ def main(
         model_package_group_name=model_package_group_name,
         pipeline_name=sagemaker_pipeline_name,
         base_job_prefix=project_id,
+        incremental_baseline=incremental_baseline,
+        manifest_uri=manifest_uri,
+        compiled_predictor=compiled_predictor,
+        step_cache=step_cache,
+        feature_cache=feature_cache,
+        profile_metrics=profile_metrics,
     )
 
     # Create the pipeline definition
@@ -50,6 +68,9 @@ def main(
     )
 
     # Create App and stacks
+    from aws_cdk import core
+    from infra.sagemaker_pipeline_stack import SageMakerPipelineStack
+
     app = core.App()
 
     tags = [
@@ -96,6 +117,36 @@ if __name__ == "__main__":
         "--artifact-bucket",
         default=os.environ.get("ARTIFACT_BUCKET"),
     )
+    parser.add_argument(
+        "--incremental-baseline",
+        action="store_true",
+        default=os.environ.get("INCREMENTAL_BASELINE", "false").lower() == "true",
+    )
+    parser.add_argument(
+        "--input-manifest",
+        action="store_true",
+        default=os.environ.get("INPUT_MANIFEST", "false").lower() == "true",
+    )
+    parser.add_argument(
+        "--compiled-predictor",
+        action="store_true",
+        default=os.environ.get("COMPILED_PREDICTOR", "false").lower() == "true",
+    )
+    parser.add_argument(
+        "--step-cache",
+        action="store_true",
+        default=os.environ.get("STEP_CACHE", "false").lower() == "true",
+    )
+    parser.add_argument(
+        "--feature-cache",
+        action="store_true",
+        default=os.environ.get("FEATURE_CACHE", "false").lower() == "true",
+    )
+    parser.add_argument(
+        "--profile-metrics",
+        action="store_true",
+        default=os.environ.get("PROFILE_METRICS", "false").lower() == "true",
+    )
     args = vars(parser.parse_args())
     logger.info("args: {}".format(args))
     main(**args)
@@ -0,0 +1,124 @@
+"""Resolves the container image uris used by the pipelines and stacks.
+
+The registry accounts are precomputed from the SageMaker Python SDK image uri config
+for the images in use, so resolving an image uri for a region doesn't load and parse
+the SDK config files.  This module is shared by the build, batch and deployment
+pipelines, so keep the copies in sync when adding images.
+"""
+import functools
+
+# Registry accounts by region for the first party framework images
+FRAMEWORK_REGISTRIES = {
+    "af-south-1": "510948584623",
+    "ap-east-1": "651117190479",
+    "ap-northeast-1": "354813040037",
+    "ap-northeast-2": "366743142698",
+    "ap-south-1": "720646828776",
+    "ap-southeast-1": "121021644041",
+    "ap-southeast-2": "783357654285",
+    "ca-central-1": "341280168497",
+    "cn-north-1": "450853457545",
+    "cn-northwest-1": "451049120500",
+    "eu-central-1": "492215442770",
+    "eu-north-1": "662702820516",
+    "eu-south-1": "978288397137",
+    "eu-west-1": "141502667606",
+    "eu-west-2": "764974769150",
+    "eu-west-3": "659782779980",
+    "me-south-1": "801668240914",
+    "sa-east-1": "737474898029",
+    "us-east-1": "683313688378",
+    "us-east-2": "257758044811",
+    "us-gov-west-1": "414596584902",
+    "us-iso-east-1": "833128469047",
+    "us-west-1": "746614075791",
+    "us-west-2": "246618743249",
+}
+
+# Image repository, tag and registry account by region, keyed by framework and version
+IMAGES = {
+    ("model-monitor", "latest"): {
+        "repository": "sagemaker-model-monitor-analyzer",
+        "tag": "latest",
+        "registries": {
+            "af-south-1": "875698925577",
+            "ap-east-1": "001633400207",
+            "ap-northeast-1": "574779866223",
+            "ap-northeast-2": "709848358524",
+            "ap-south-1": "126357580389",
+            "ap-southeast-1": "245545462676",
+            "ap-southeast-2": "563025443158",
+            "ca-central-1": "536280801234",
+            "cn-north-1": "453000072557",
+            "cn-northwest-1": "453252182341",
+            "eu-central-1": "048819808253",
+            "eu-north-1": "895015795356",
+            "eu-south-1": "933208885752",
+            "eu-west-1": "468650794304",
+            "eu-west-2": "749857270468",
+            "eu-west-3": "680080141114",
+            "me-south-1": "607024016150",
+            "sa-east-1": "539772159869",
+            "us-east-1": "156813124566",
+            "us-east-2": "777275614652",
+            "us-west-1": "890145073186",
+            "us-west-2": "159807026194",
+        },
+    },
+    ("xgboost", "1.2-2"): {
+        "repository": "sagemaker-xgboost",
+        "tag": "1.2-2",
+        "registries": FRAMEWORK_REGISTRIES,
+    },
+    ("sklearn", "0.23-1"): {
+        "repository": "sagemaker-scikit-learn",
+        "tag": "0.23-1-cpu-py3",
+        "registries": FRAMEWORK_REGISTRIES,
+    },
+}
+
+# ECR domains for regions outside of the aws partition
+DOMAINS = {
+    "cn-north-1": "amazonaws.com.cn",
+    "cn-northwest-1": "amazonaws.com.cn",
+    "us-iso-east-1": "c2s.ic.gov",
+}
+
+
+def get_image(framework: str, version: str) -> dict:
+    image = IMAGES.get((framework, version))
+    if image is None:
+        raise ValueError(f"Unsupported image: {framework} version: {version}")
+    return image
+
+
+def get_image_uri(image: dict, region: str) -> str:
+    account = image["registries"][region]
+    domain = DOMAINS.get(region, "amazonaws.com")
+    return f"{account}.dkr.ecr.{region}.{domain}/{image['repository']}:{image['tag']}"
+
+
+@functools.lru_cache(maxsize=None)
+def retrieve(framework: str, region: str, version: str) -> str:
+    """Retrieves the image uri for a framework version in a region.
+
+    Args:
+        framework: The name of the framework, eg "xgboost" or "model-monitor".
+        region: The aws region.
+        version: The framework version.
+
+    Returns:
+        The ECR image uri.
+    """
+    image = get_image(framework, version)
+    if region not in image["registries"]:
+        raise ValueError(f"Unsupported region: {region} for image: {framework}")
+    return get_image_uri(image, region)
+
+
+def get_region_image_uris(framework: str, version: str) -> dict:
+    """Gets the image uri for each supported region of a framework version."""
+    image = get_image(framework, version)
+    return {
+        region: retrieve(framework, region, version) for region in image["registries"]
+    }
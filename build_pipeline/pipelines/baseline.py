@@ -0,0 +1,330 @@
+"""Incrementally computes the data quality baseline for the nyc taxi dataset.
+
+Statistics are computed as mergeable per input file partials, which are cached
+under the baseline output keyed by the source S3 key, ETag and code version.
+Only partitions for new or changed input files are read, and the cached partials
+are merged into Model Monitor compatible `statistics.json` and `constraints.json`.
+
+Partials keep the exact count of each value of a column up to `MAX_SKETCH_SIZE`
+values, beyond which the counts are compacted into weighted centroids, so the
+partials of continuous columns stay bounded however many rows they summarize.
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import pathlib
+from urllib.parse import urlparse
+
+import boto3
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+logger.addHandler(logging.StreamHandler())
+
+# The processing container directory, which is relocated to run the job locally
+PROCESSING_DIR = os.environ.get("PROCESSING_DIR", "/opt/ml/processing")
+
+s3 = boto3.client("s3")
+
+# Rounding applied to values before counting, to bound the size of partials
+VALUE_DECIMALS = 6
+NUM_BUCKETS = 10
+# The largest number of value counts kept per column of a partial
+MAX_SKETCH_SIZE = 4096
+
+
+def split_s3_uri(uri: str):
+    url_parsed = urlparse(uri)
+    return url_parsed.netloc, url_parsed.path.lstrip("/")
+
+
+def list_objects(uri: str) -> dict:
+    """Lists the objects under an S3 prefix as a dict of relative path to key and ETag.
+
+    Objects are keyed by their path relative to the prefix, so files with the same
+    name in different folders are kept apart.
+    """
+    bucket, prefix = split_s3_uri(os.path.join(uri, ""))
+    objects = {}
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for o in page.get("Contents", []):
+            # Skip the empty objects that represent folders
+            if o["Key"].endswith("/"):
+                continue
+            objects[os.path.relpath(o["Key"], prefix)] = {
+                "Bucket": bucket,
+                "Key": o["Key"],
+                "ETag": o["ETag"].strip('"'),
+            }
+    return objects
+
+
+def get_cache_key(source: dict, code_version: str) -> str:
+    key = f"{source['Bucket']}/{source['Key']}:{source['ETag']}:{code_version}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def compact(values: np.ndarray, counts: np.ndarray, max_size: int):
+    """Compacts sorted value counts into at most `max_size` weighted centroids.
+
+    Runs of values with about equal total counts are replaced by their weighted
+    mean, which keeps the total count and sum, and places each count within the
+    range of its run.  The min and max values are kept as centroids of their own.
+
+    Args:
+        values: The sorted unique values.
+        counts: The count of each value.
+        max_size: The largest number of values to keep.
+
+    Returns:
+        The compacted values and counts.
+    """
+    if len(values) <= max_size:
+        return values, counts
+    # Group the values between the min and max by their cumulative count
+    cumulative = np.cumsum(counts)
+    start = (cumulative - counts) / cumulative[-1]
+    group = 1 + np.minimum(np.floor(start * (max_size - 2)), max_size - 3)
+    group[0], group[-1] = 0, max_size - 1
+    group = group.astype(np.int64)
+    totals = np.bincount(group, weights=counts, minlength=max_size)
+    sums = np.bincount(group, weights=values * counts, minlength=max_size)
+    keep = totals > 0
+    return sums[keep] / totals[keep], totals[keep]
+
+
+def compute_partial(df: pd.DataFrame, decimals: int = VALUE_DECIMALS) -> dict:
+    """Computes mergeable value count statistics for each column of a partition.
+
+    Args:
+        df: The baseline partition.
+        decimals: The rounding applied to values before counting.
+
+    Returns:
+        The partial statistics.
+    """
+    features = {}
+    for name in df.columns:
+        col = df[name].to_numpy(dtype=float)
+        present = col[~np.isnan(col)]
+        values, counts = np.unique(np.round(present, decimals), return_counts=True)
+        values, counts = compact(values, counts, MAX_SKETCH_SIZE)
+        features[name] = {
+            "values": values.tolist(),
+            "counts": counts.tolist(),
+            "num_missing": int(len(col) - len(present)),
+            "sum_squares": float(np.dot(present, present)),
+            "is_integral": bool(np.all(np.mod(present, 1) == 0)),
+        }
+    return {"item_count": len(df), "features": features}
+
+
+def merge_partials(partials: list) -> dict:
+    """Merges partials by summing the counts of matching values."""
+    features = {}
+    names = [n for n in partials[0]["features"]] if partials else []
+    for name in names:
+        parts = [p["features"][name] for p in partials]
+        values = np.concatenate([np.asarray(p["values"], dtype=float) for p in parts])
+        counts = np.concatenate([np.asarray(p["counts"], dtype=float) for p in parts])
+        unique, inverse = np.unique(values, return_inverse=True)
+        counts = np.bincount(inverse, weights=counts, minlength=len(unique))
+        values, counts = compact(unique, counts, MAX_SKETCH_SIZE)
+        features[name] = {
+            "values": values,
+            "counts": counts,
+            "num_missing": sum(p["num_missing"] for p in parts),
+            "sum_squares": sum(p["sum_squares"] for p in parts),
+            "is_integral": all(p["is_integral"] for p in parts),
+        }
+    return {
+        "item_count": sum(p["item_count"] for p in partials),
+        "features": features,
+    }
+
+
+def get_sketch(values: np.ndarray, counts: np.ndarray) -> dict:
+    """Gets a KLL sketch that represents the value counts exactly.
+
+    Items at level i of the sketch have a weight of 2^i, so each value is added
+    to the levels of the set bits of its count.
+    """
+    counts = counts.astype(np.int64)
+    num_levels = int(counts.max()).bit_length() if len(counts) > 0 else 1
+    data = [values[(counts >> level) & 1 == 1].tolist() for level in range(num_levels)]
+    return {"parameters": {"c": 0.64, "k": 2048.0}, "data": data}
+
+
+def get_feature_statistics(name: str, feature: dict) -> dict:
+    values, counts = feature["values"], feature["counts"]
+    num_present = counts.sum()
+    is_integral = feature["is_integral"]
+    common = {"num_present": int(num_present), "num_missing": feature["num_missing"]}
+    if num_present == 0:
+        return {
+            "name": name,
+            "inferred_type": "Unknown",
+            "numerical_statistics": {"common": common},
+        }
+    total = np.dot(values, counts)
+    mean = total / num_present
+    # The sum of squares is exact, where the values may be compacted
+    std_dev = np.sqrt(max(feature["sum_squares"] / num_present - mean ** 2, 0.0))
+    edges = np.linspace(values[0], values[-1], NUM_BUCKETS + 1)
+    # Buckets include their upper edge, and the first bucket includes the minimum
+    index = np.clip(np.searchsorted(edges, values, side="left") - 1, 0, NUM_BUCKETS - 1)
+    bucket_counts = np.bincount(index, weights=counts, minlength=NUM_BUCKETS)
+    return {
+        "name": name,
+        "inferred_type": "Integral" if is_integral else "Fractional",
+        "numerical_statistics": {
+            "common": common,
+            "mean": float(mean),
+            "sum": float(total),
+            "std_dev": float(std_dev),
+            "min": float(values[0]),
+            "max": float(values[-1]),
+            "distribution": {
+                "kll": {
+                    "buckets": [
+                        {
+                            "lower_bound": float(edges[i]),
+                            "upper_bound": float(edges[i + 1]),
+                            "count": float(bucket_counts[i]),
+                        }
+                        for i in range(NUM_BUCKETS)
+                    ],
+                    "sketch": get_sketch(values, counts),
+                }
+            },
+        },
+    }
+
+
+def get_statistics(merged: dict) -> dict:
+    """Gets the baseline statistics in the Model Monitor `statistics.json` format."""
+    return {
+        "version": 0.0,
+        "dataset": {"item_count": merged["item_count"]},
+        "features": [
+            get_feature_statistics(name, feature)
+            for name, feature in merged["features"].items()
+        ],
+    }
+
+
+def get_constraints(statistics: dict) -> dict:
+    """Suggests baseline constraints in the Model Monitor `constraints.json` format."""
+    item_count = statistics["dataset"]["item_count"]
+    features = []
+    for feature in statistics["features"]:
+        num_stats = feature["numerical_statistics"]
+        constraint = {
+            "name": feature["name"],
+            "inferred_type": feature["inferred_type"],
+            "completeness": num_stats["common"]["num_present"] / item_count
+            if item_count > 0
+            else 0.0,
+        }
+        if "min" in num_stats:
+            constraint["num_constraints"] = {"is_non_negative": num_stats["min"] >= 0}
+        features.append(constraint)
+    return {
+        "version": 0.0,
+        "features": features,
+        "monitoring_config": {
+            "evaluate_constraints": "Enabled",
+            "emit_metrics": "Enabled",
+            "datatype_check_threshold": 1.0,
+            "domain_content_threshold": 1.0,
+            "distribution_constraints": {
+                "perform_comparison": "Enabled",
+                "comparison_threshold": 0.1,
+                "comparison_method": "Robust",
+                "categorical_comparison_threshold": 0.1,
+                "categorical_drift_method": "LInfinity",
+            },
+        },
+    }
+
+
+def get_manifest_prefix(manifest_uri: str) -> str:
+    """Gets the prefix of a manifest, which the listed input files are relative to."""
+    bucket, key = split_s3_uri(manifest_uri)
+    response = s3.get_object(Bucket=bucket, Key=key)
+    return json.loads(response["Body"].read())[0]["prefix"]
+
+
+def load_partial(partition: dict, source: dict, cache_uri: str, code_version: str):
+    """Loads the cached partial for a partition, or computes and caches it."""
+    cache_bucket, cache_prefix = split_s3_uri(cache_uri)
+    cache_key = os.path.join(
+        cache_prefix, f"{get_cache_key(source, code_version)}.json"
+    )
+    try:
+        response = s3.get_object(Bucket=cache_bucket, Key=cache_key)
+        logger.info(f"Using cached partial for {source['Key']}")
+        return json.loads(response["Body"].read())
+    except s3.exceptions.NoSuchKey:
+        pass
+
+    logger.info(f"Computing partial for {source['Key']}")
+    response = s3.get_object(Bucket=partition["Bucket"], Key=partition["Key"])
+    partial = compute_partial(pd.read_csv(response["Body"]))
+    partial["source"] = source
+    s3.put_object(
+        Bucket=cache_bucket,
+        Key=cache_key,
+        Body=json.dumps(partial).encode("utf-8"),
+    )
+    return partial
+
+
+def main(data_uri: str, partitions_uri: str, cache_uri: str, code_version: str):
+    sources = list_objects(data_uri)
+    partitions = list_objects(partitions_uri)
+    logger.info(f"Found {len(partitions)} baseline partitions")
+
+    partials = []
+    for name, partition in sorted(partitions.items()):
+        if name not in sources:
+            raise Exception(f"No input file found for baseline partition: {name}")
+        partials.append(load_partial(partition, sources[name], cache_uri, code_version))
+
+    statistics = get_statistics(merge_partials(partials))
+    constraints = get_constraints(statistics)
+
+    output_dir = f"{PROCESSING_DIR}/output"
+    pathlib.Path(output_dir).mkdir(parents=True, exist_ok=True)
+    logger.info(f"Writing baseline for {statistics['dataset']['item_count']} rows")
+    with open(f"{output_dir}/statistics.json", "w") as f:
+        json.dump(statistics, f)
+    with open(f"{output_dir}/constraints.json", "w") as f:
+        json.dump(constraints, f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data-uri", type=str, required=True)
+    parser.add_argument("--manifest-uri", type=str, default=None)
+    parser.add_argument("--partitions-uri", type=str, required=True)
+    parser.add_argument("--cache-uri", type=str, required=True)
+    parser.add_argument("--code-version", type=str, required=True)
+    args = parser.parse_args()
+    logger.info("Starting incremental baseline.")
+    # Partitions of input files selected by a manifest are relative to its prefix
+    data_uri = args.data_uri
+    if args.manifest_uri is not None:
+        data_uri = get_manifest_prefix(args.manifest_uri)
+    main(
+        data_uri,
+        os.path.join(args.partitions_uri, ""),
+        os.path.join(args.cache_uri, "partials", ""),
+        args.code_version,
+    )
+    logger.info("Done")
@@ -1,8 +1,11 @@
 """Evaluation script for measuring mean squared error."""
+import argparse
 import json
 import logging
+import os
 import pathlib
 import pickle
+import sys
 import tarfile
 
 import numpy as np
@@ -16,34 +19,96 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
 
+# The processing container directory, which is relocated to run the job locally
+PROCESSING_DIR = os.environ.get("PROCESSING_DIR", "/opt/ml/processing")
+
+
+def get_predictor(model, predictor: str, predictor_dir: str):
+    """Gets a function that predicts a feature array with the xgboost booster.
+
+    Args:
+        model: The xgboost booster.
+        predictor: Either `xgboost` for the native predict, or `compiled` to predict
+            small batches with the booster flattened into a tree ensemble, which has
+            the lower latency, and larger batches natively.
+        predictor_dir: The directory of the tree ensemble module.
+
+    Returns:
+        The predict function.
+    """
+
+    def predict_native(X):
+        return model.predict(xgboost.DMatrix(X))
+
+    if predictor == "compiled":
+        # Tree ensemble module is provided as a processing input alongside the script
+        sys.path.insert(0, predictor_dir)
+        from tree_ensemble import MAX_BATCH_SIZE, TreeEnsemble
+
+        ensemble = TreeEnsemble.from_booster(model)
+        return lambda X: (
+            ensemble.predict(X) if len(X) <= MAX_BATCH_SIZE else predict_native(X)
+        )
+    return predict_native
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--predictor", type=str, default="xgboost", choices=["xgboost", "compiled"]
+    )
+    parser.add_argument(
+        "--predictor-dir", type=str, default=f"{PROCESSING_DIR}/predictor"
+    )
+    # Profile the stages, optionally publishing them as CloudWatch metrics
+    parser.add_argument(
+        "--profiler-dir", type=str, default=f"{PROCESSING_DIR}/profiler"
+    )
+    parser.add_argument("--profile-dir", type=str, default=f"{PROCESSING_DIR}/profile")
+    parser.add_argument("--metrics-namespace", type=str, default=None)
+    parser.add_argument("--pipeline-name", type=str, default=None)
+    args, _ = parser.parse_known_args()
+
+    # Profiler module is provided as a processing input alongside the script
+    sys.path.insert(0, args.profiler_dir)
+    from profiler import Profiler
+
+    profiler = Profiler("evaluate")
+
     logger.debug("Starting evaluation.")
-    model_path = "/opt/ml/processing/model/model.tar.gz"
-    with tarfile.open(model_path) as tar:
-        tar.extractall(path=".")
+    with profiler.span("load_model"):
+        model_path = f"{PROCESSING_DIR}/model/model.tar.gz"
+        with tarfile.open(model_path) as tar:
+            tar.extractall(path=".")
 
-    logger.debug("Loading xgboost model.")
-    model = pickle.load(open("xgboost-model", "rb"))
+        logger.debug("Loading xgboost model.")
+        model = pickle.load(open("xgboost-model", "rb"))
+        logger.info(f"Predicting with the {args.predictor} predictor")
+        predict = get_predictor(model, args.predictor, args.predictor_dir)
 
     logger.debug("Reading test data.")
-    test_path = "/opt/ml/processing/test/test.csv"
-    df = pd.read_csv(test_path)
+    with profiler.span("load") as span:
+        test_path = f"{PROCESSING_DIR}/test/test.csv"
+        df = pd.read_csv(test_path)
+        span.add_rows(len(df))
 
     logger.debug("Reading test data.")
     y_test = df["fare_amount"].values
-    X_test = xgboost.DMatrix(df.drop("fare_amount", axis=1).values)
+    X_test = df.drop("fare_amount", axis=1).values
 
     logger.info("Performing predictions against test data.")
-    predictions = model.predict(X_test)
+    with profiler.span("predict", rows=len(X_test)):
+        predictions = predict(X_test)
 
     # See the regression metrics
     # see: https://docs.aws.amazon.com/sagemaker/latest/dg/model-monitor-model-quality-metrics.html
     logger.debug("Calculating metrics.")
-    mae = mean_absolute_error(y_test, predictions)
-    mse = mean_squared_error(y_test, predictions)
-    rmse = sqrt(mse)
-    r2 = r2_score(y_test, predictions)
-    std = np.std(y_test - predictions)
+    with profiler.span("metrics", rows=len(y_test)):
+        mae = mean_absolute_error(y_test, predictions)
+        mse = mean_squared_error(y_test, predictions)
+        rmse = sqrt(mse)
+        r2 = r2_score(y_test, predictions)
+        std = np.std(y_test - predictions)
     report_dict = {
         "regression_metrics": {
             "mae": {
@@ -65,10 +130,14 @@ if __name__ == "__main__":
         },
     }
 
-    output_dir = "/opt/ml/processing/evaluation"
+    output_dir = f"{PROCESSING_DIR}/evaluation"
     pathlib.Path(output_dir).mkdir(parents=True, exist_ok=True)
 
     logger.info("Writing out evaluation report with mse: %f", mse)
     evaluation_path = f"{output_dir}/evaluation.json"
     with open(evaluation_path, "w") as f:
         f.write(json.dumps(report_dict))
+
+    profiler.write(args.profile_dir)
+    if args.metrics_namespace is not None:
+        profiler.put_metrics(args.metrics_namespace, args.pipeline_name)
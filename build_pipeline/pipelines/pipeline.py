@@ -7,13 +7,20 @@
 
 Implements a get_pipeline(**kwargs) method.
 """
+import functools
+import hashlib
 import json
 import os
+import re
 
 import boto3
+import botocore.config
 import sagemaker
 import sagemaker.session
 
+from botocore.exceptions import ClientError
+from infra import image_uris
+
 from sagemaker.estimator import Estimator
 from sagemaker.debugger import Rule, rule_configs
 from sagemaker.inputs import TrainingInput
@@ -28,7 +35,6 @@ from sagemaker.processing import (
     Processor,
     ScriptProcessor,
 )
-from sagemaker.sklearn.processing import SKLearnProcessor
 from sagemaker.s3 import S3Uploader
 from sagemaker.workflow.conditions import ConditionLessThanOrEqualTo
 from sagemaker.workflow.condition_step import (
@@ -39,6 +45,7 @@ from sagemaker.workflow.parameters import (
     ParameterInteger,
     ParameterString,
 )
+from sagemaker.user_agent import prepend_user_agent
 from sagemaker.workflow.pipeline import Pipeline
 from sagemaker.workflow.properties import PropertyFile
 from sagemaker.workflow.steps import (
@@ -47,11 +54,59 @@ from sagemaker.workflow.steps import (
     CacheConfig,
 )
 from sagemaker.workflow.step_collections import RegisterModel
-from sagemaker.utils import name_from_base
 
 
 BASE_DIR = os.path.dirname(os.path.realpath(__file__))
 
+# The CloudWatch namespace of the pipeline metrics
+METRICS_NAMESPACE = "aws/sagemaker/ModelBuildingPipeline/data-metrics"
+
+# The timestamp of the job names generated when rendering a definition, and of the
+# profiler rule of training jobs
+GENERATED_NAME_PATTERN = re.compile(
+    r"(?<=-)\d{4}-\d{2}-\d{2}-\d{2}-\d{2}-\d{2}-\d{1,3}(?=/)|(?<=ProfilerReport-)\d+"
+)
+
+
+class LazySession(sagemaker.session.Session):
+    """A sagemaker session that creates its boto clients on first use.
+
+    Generating a pipeline definition doesn't call the SageMaker APIs, so deferring
+    the clients avoids loading the botocore service models when rendering pipelines.
+    """
+
+    def _initialize(
+        self,
+        boto_session,
+        sagemaker_client,
+        sagemaker_runtime_client,
+        sagemaker_featurestore_runtime_client,
+    ):
+        self.boto_session = boto_session or boto3.Session()
+        self._region_name = self.boto_session.region_name
+        if self._region_name is None:
+            raise ValueError(
+                "Must setup local AWS configuration with a region supported by SageMaker."
+            )
+        self.local_mode = False
+
+    @functools.cached_property
+    def sagemaker_client(self):
+        client = self.boto_session.client("sagemaker")
+        prepend_user_agent(client)
+        return client
+
+    @functools.cached_property
+    def sagemaker_runtime_client(self):
+        config = botocore.config.Config(read_timeout=80)
+        client = self.boto_session.client("runtime.sagemaker", config=config)
+        prepend_user_agent(client)
+        return client
+
+    @functools.cached_property
+    def sagemaker_featurestore_runtime_client(self):
+        return self.boto_session.client("sagemaker-featurestore-runtime")
+
 
 def get_session(region, default_bucket):
     """Gets the sagemaker session based on the region.
@@ -59,20 +114,253 @@ def get_session(region, default_bucket):
         region: the aws region to start the session
         default_bucket: the bucket to use for storing the artifacts
     Returns:
-        `sagemaker.session.Session instance
+        `sagemaker.session.Session instance, which creates its clients on first use
     """
 
     boto_session = boto3.Session(region_name=region)
+    return LazySession(boto_session=boto_session, default_bucket=default_bucket)
+
 
-    sagemaker_client = boto_session.client("sagemaker")
-    runtime_client = boto_session.client("sagemaker-runtime")
-    return sagemaker.session.Session(
-        boto_session=boto_session,
-        sagemaker_client=sagemaker_client,
-        sagemaker_runtime_client=runtime_client,
-        default_bucket=default_bucket,
+def get_baseline_step(
+    step_process: ProcessingStep,
+    region: str,
+    instance_type: str,
+    base_job_prefix: str,
+    sagemaker_session,
+    role: str,
+    cache_config: CacheConfig,
+) -> ProcessingStep:
+    """Gets the baseline step that runs the model monitor analyzer over the baseline.
+    Args:
+        step_process: the preprocess step with the baseline output
+        region: AWS region to create and run the pipeline.
+        instance_type: the instance type for the baseline job
+        base_job_prefix: the prefix to include after the bucket
+        sagemaker_session: the sagemaker session
+        role: IAM role to create and run steps and pipeline.
+        cache_config: the step cache configuration
+    Returns:
+        the baseline processing step
+    """
+    # Get the default model monitor container
+    model_monitor_container_uri = image_uris.retrieve(
+        framework="model-monitor", region=region, version="latest"
     )
 
+    # Create the baseline job using
+    dataset_format = DatasetFormat.csv()
+    env = {
+        "dataset_format": json.dumps(dataset_format),
+        "dataset_source": "/opt/ml/processing/input/baseline_dataset_input",
+        "output_path": "/opt/ml/processing/output",
+        "publish_cloudwatch_metrics": "Disabled",
+    }
+
+    monitor_analyzer = Processor(
+        image_uri=model_monitor_container_uri,
+        role=role,
+        instance_count=1,
+        instance_type=instance_type,
+        base_job_name=f"{base_job_prefix}/monitoring",
+        sagemaker_session=sagemaker_session,
+        max_runtime_in_seconds=1800,
+        env=env,
+    )
+
+    step_baseline = ProcessingStep(
+        name="BaselineJob",
+        processor=monitor_analyzer,
+        inputs=[
+            ProcessingInput(
+                source=step_process.properties.ProcessingOutputConfig.Outputs[
+                    "baseline"
+                ].S3Output.S3Uri,
+                destination="/opt/ml/processing/input/baseline_dataset_input",
+                input_name="baseline_dataset_input",
+            ),
+        ],
+        outputs=[
+            ProcessingOutput(
+                source="/opt/ml/processing/output",
+                # destination=baseline_output, # Use default output
+                output_name="monitoring_output",
+            ),
+        ],
+        cache_config=cache_config,
+    )
+
+    return step_baseline
+
+
+def get_code_version(code_files: list) -> str:
+    """Gets the sha256 of the contents of the code files in the pipelines dir."""
+    code_hash = hashlib.sha256()
+    for code_file in code_files:
+        with open(os.path.join(BASE_DIR, code_file), "rb") as f:
+            code_hash.update(f.read())
+    return code_hash.hexdigest()
+
+
+def get_incremental_baseline_step(
+    step_process: ProcessingStep,
+    region: str,
+    input_data: ParameterString,
+    baseline_output: ParameterString,
+    instance_type: str,
+    base_job_prefix: str,
+    sagemaker_session,
+    role: str,
+    cache_config: CacheConfig,
+    input_manifest: ParameterString = None,
+) -> ProcessingStep:
+    """Gets the baseline step that merges cached statistics partials per input file.
+    Args:
+        step_process: the preprocess step with the baseline partitions output
+        region: AWS region to create and run the pipeline.
+        input_data: the input data url, used to look up the source file ETags
+        baseline_output: the baseline url under which partials are cached
+        instance_type: the instance type for the baseline job
+        base_job_prefix: the prefix to include after the bucket
+        sagemaker_session: the sagemaker session
+        role: IAM role to create and run steps and pipeline.
+        cache_config: the step cache configuration
+        input_manifest: optional manifest url, whose prefix the ETags are looked up in
+    Returns:
+        the baseline processing step
+    """
+    # Invalidate cached partials when the preprocess or baseline code changes
+    code_version = get_code_version(["preprocess.py", "baseline.py"])
+    manifest_arguments = []
+    if input_manifest is not None:
+        manifest_arguments = ["--manifest-uri", input_manifest]
+
+    baseline_processor = ScriptProcessor(
+        image_uri=image_uris.retrieve(
+            framework="sklearn", region=region, version="0.23-1"
+        ),
+        command=["python3"],
+        instance_type=instance_type,
+        instance_count=1,
+        base_job_name=f"{base_job_prefix}/sklearn-baseline",
+        sagemaker_session=sagemaker_session,
+        role=role,
+    )
+
+    # Keep the same step and output name as the model monitor baseline job
+    return ProcessingStep(
+        name="BaselineJob",
+        processor=baseline_processor,
+        outputs=[
+            ProcessingOutput(
+                source="/opt/ml/processing/output",
+                output_name="monitoring_output",
+            ),
+        ],
+        code=os.path.join(BASE_DIR, "baseline.py"),
+        job_arguments=[
+            "--data-uri",
+            input_data,
+            "--partitions-uri",
+            step_process.properties.ProcessingOutputConfig.Outputs[
+                "baseline"
+            ].S3Output.S3Uri,
+            "--cache-uri",
+            baseline_output,
+            "--code-version",
+            code_version,
+        ]
+        + manifest_arguments,
+        cache_config=cache_config,
+    )
+
+
+def get_input_data(
+    input_data: ParameterString, input_manifest: ParameterString = None
+) -> ProcessingInput:
+    """Gets the input data for the preprocess step, sharded by S3 key.
+    Args:
+        input_data: the input data url
+        input_manifest: optional manifest url, to download only the listed partitions
+    Returns:
+        the processing input
+    """
+    if input_manifest is not None:
+        return ProcessingInput(
+            source=input_manifest,
+            destination="/opt/ml/processing/input/data",
+            s3_data_type="ManifestFile",
+            s3_data_distribution_type="ShardedByS3Key",
+        )
+    return ProcessingInput(
+        source=input_data,
+        destination="/opt/ml/processing/input/data",
+        s3_data_distribution_type="ShardedByS3Key",
+    )
+
+
+def get_cache_arguments(
+    input_data: ParameterString,
+    input_zones: ParameterString,
+    features_output: ParameterString = None,
+    step_cache_uri: str = None,
+    input_manifest: ParameterString = None,
+) -> list:
+    """Gets the preprocess arguments of the feature and step caches.
+    Args:
+        input_data: the input data url, used to look up the source file ETags
+        input_zones: the zones file url, whose ETag is part of the cache keys
+        features_output: optional url under which to cache the features per file
+        step_cache_uri: optional url under which to cache the step outputs
+        input_manifest: optional manifest url, whose prefix the ETags are looked up in
+    Returns:
+        the script arguments
+    """
+    if features_output is None and step_cache_uri is None:
+        return []
+    # Key the caches by the input objects, invalidated when the code changes
+    arguments = [
+        "--data-uri",
+        input_data,
+        "--zones-uri",
+        input_zones,
+        "--code-version",
+        get_code_version(["preprocess.py"]),
+    ]
+    if features_output is not None:
+        arguments += ["--cache-uri", features_output]
+    if step_cache_uri is not None:
+        arguments += ["--step-cache-uri", step_cache_uri]
+    if input_manifest is not None:
+        arguments += ["--manifest-uri", input_manifest]
+    return arguments
+
+
+def get_profiler_input() -> ProcessingInput:
+    """Gets the profiler module input, which the processing scripts time stages with."""
+    return ProcessingInput(
+        source=os.path.join(BASE_DIR, "profiler.py"),
+        destination="/opt/ml/processing/profiler",
+        input_name="profiler",
+    )
+
+
+def get_profile_output() -> ProcessingOutput:
+    """Gets the output of the profile.json written by the processing scripts."""
+    return ProcessingOutput(output_name="profile", source="/opt/ml/processing/profile")
+
+
+def get_profile_arguments(pipeline_name: str, profile_metrics: bool) -> list:
+    """Gets the script arguments to publish the stage profile as CloudWatch metrics.
+    Args:
+        pipeline_name: the pipeline name dimension of the metrics
+        profile_metrics: whether to publish the metrics
+    Returns:
+        the script arguments
+    """
+    if not profile_metrics:
+        return []
+    return ["--metrics-namespace", METRICS_NAMESPACE, "--pipeline-name", pipeline_name]
+
 
 def get_pipeline(
     region,
@@ -81,6 +369,12 @@ def get_pipeline(
     model_package_group_name,
     default_bucket,
     base_job_prefix,
+    incremental_baseline: bool = False,
+    manifest_uri: str = None,
+    compiled_predictor: bool = False,
+    step_cache: bool = False,
+    feature_cache: bool = False,
+    profile_metrics: bool = False,
 ) -> Pipeline:
     """Gets a SageMaker ML Pipeline instance working with on nyc taxi data.
     Args:
@@ -90,6 +384,15 @@ def get_pipeline(
         pipeline_name: the bucket to use for storing the artifacts
         model_package_group_name: the model package group name
         base_job_prefix: the prefix to include after the bucket
+        incremental_baseline: compute the baseline from cached per file partials
+        manifest_uri: optional manifest of the input data partitions to train on
+        compiled_predictor: evaluate with the model flattened into a tree ensemble
+        step_cache: skip preprocessing when its outputs are cached for the same code,
+            arguments and input objects
+        feature_cache: cache the features of each input file, so only new or changed
+            files are preprocessed
+        profile_metrics: publish the stage profiles of the preprocess and evaluate
+            jobs as CloudWatch metrics
     Returns:
         an instance of a pipeline
     """
@@ -104,6 +407,12 @@ def get_pipeline(
         name="InputDataUrl",
         default_value=f"s3://{default_bucket}/{base_job_prefix}/input/data",
     )
+    input_manifest = None
+    if manifest_uri is not None:
+        input_manifest = ParameterString(
+            name="InputManifestUrl",
+            default_value=manifest_uri,
+        )
     input_zones = ParameterString(
         name="InputZonesUrl",
         default_value=f"s3://{default_bucket}/{base_job_prefix}/input/zones/taxi_zones.zip",
@@ -131,33 +440,54 @@ def get_pipeline(
         name="OutputBaselineUrl",
         default_value=f"s3://{default_bucket}/{base_job_prefix}/baseline/",
     )
+    features_output = None
+    if feature_cache:
+        features_output = ParameterString(
+            name="OutputFeaturesUrl",
+            default_value=f"s3://{default_bucket}/{base_job_prefix}/features/",
+        )
 
     # Create cache configuration (Unable to pass parameter for expire_after value)
     cache_config = CacheConfig(enable_caching=True, expire_after="PT1H")
 
     # processing step for feature engineering
-    sklearn_processor = SKLearnProcessor(
-        framework_version="0.23-1",
+    sklearn_processor = ScriptProcessor(
+        image_uri=image_uris.retrieve(
+            framework="sklearn", region=region, version="0.23-1"
+        ),
+        command=["python3"],
         instance_type=processing_instance_type,
         instance_count=processing_instance_count,
         base_job_name=f"{base_job_prefix}/sklearn-preprocess",
         sagemaker_session=sagemaker_session,
         role=role,
     )
+    process_arguments = []
+    if incremental_baseline:
+        process_arguments += ["--partition-baseline"]
+    process_cache_config = cache_config
+    step_cache_uri = None
+    if step_cache:
+        # Cache the step outputs by content instead of for a fixed time after a run
+        step_cache_uri = (
+            f"s3://{default_bucket}/{base_job_prefix}/step-cache/preprocess/"
+        )
+        process_cache_config = CacheConfig(enable_caching=False)
+    process_arguments += get_cache_arguments(
+        input_data, input_zones, features_output, step_cache_uri, input_manifest
+    )
+    process_arguments += get_profile_arguments(pipeline_name, profile_metrics)
     step_process = ProcessingStep(
         name="PreprocessData",
         processor=sklearn_processor,
         inputs=[
-            ProcessingInput(
-                source=input_data,
-                destination="/opt/ml/processing/input/data",
-                s3_data_distribution_type="ShardedByS3Key",
-            ),
+            get_input_data(input_data, input_manifest),
             ProcessingInput(
                 source=input_zones,
                 destination="/opt/ml/processing/input/zones",
                 s3_data_distribution_type="FullyReplicated",
             ),
+            get_profiler_input(),
         ],
         outputs=[
             ProcessingOutput(output_name="train", source="/opt/ml/processing/train"),
@@ -168,73 +498,44 @@ def get_pipeline(
             ProcessingOutput(
                 output_name="baseline", source="/opt/ml/processing/baseline"
             ),
+            get_profile_output(),
         ],
         code=os.path.join(BASE_DIR, "preprocess.py"),
-        cache_config=cache_config,
+        job_arguments=process_arguments,
+        cache_config=process_cache_config,
     )
 
     # baseline job step
-    # Get the default model monitor container
-    model_monitor_container_uri = sagemaker.image_uris.retrieve(
-        framework="model-monitor",
-        region=region,
-        version="latest",
-    )
-
-    # Create the baseline job using
-    dataset_format = DatasetFormat.csv()
-    env = {
-        "dataset_format": json.dumps(dataset_format),
-        "dataset_source": "/opt/ml/processing/input/baseline_dataset_input",
-        "output_path": "/opt/ml/processing/output",
-        "publish_cloudwatch_metrics": "Disabled",
-    }
-
-    monitor_analyzer = Processor(
-        image_uri=model_monitor_container_uri,
-        role=role,
-        instance_count=1,
-        instance_type=baseline_instance_type,
-        base_job_name=f"{base_job_prefix}/monitoring",
-        sagemaker_session=sagemaker_session,
-        max_runtime_in_seconds=1800,
-        env=env,
-    )
-
-    step_baseline = ProcessingStep(
-        name="BaselineJob",
-        processor=monitor_analyzer,
-        inputs=[
-            ProcessingInput(
-                source=step_process.properties.ProcessingOutputConfig.Outputs[
-                    "baseline"
-                ].S3Output.S3Uri,
-                destination="/opt/ml/processing/input/baseline_dataset_input",
-                input_name="baseline_dataset_input",
-            ),
-        ],
-        outputs=[
-            ProcessingOutput(
-                source="/opt/ml/processing/output",
-                # destination=baseline_output, # Use default output
-                output_name="monitoring_output",
-            ),
-        ],
-        cache_config=cache_config,
-    )
+    if incremental_baseline:
+        step_baseline = get_incremental_baseline_step(
+            step_process=step_process,
+            region=region,
+            input_data=input_data,
+            baseline_output=baseline_output,
+            instance_type=baseline_instance_type,
+            base_job_prefix=base_job_prefix,
+            sagemaker_session=sagemaker_session,
+            role=role,
+            cache_config=cache_config,
+            input_manifest=input_manifest,
+        )
+    else:
+        step_baseline = get_baseline_step(
+            step_process=step_process,
+            region=region,
+            instance_type=baseline_instance_type,
+            base_job_prefix=base_job_prefix,
+            sagemaker_session=sagemaker_session,
+            role=role,
+            cache_config=cache_config,
+        )
 
     # Define the XGBoost training report rules
     # see: https://docs.aws.amazon.com/sagemaker/latest/dg/debugger-training-xgboost-report.html
     rules = [Rule.sagemaker(rule_configs.create_xgboost_report())]
 
     # training step for generating model artifacts
-    image_uri = sagemaker.image_uris.retrieve(
-        framework="xgboost",
-        region=region,
-        version="1.2-2",
-        py_version="py3",
-        instance_type=training_instance_type,
-    )
+    image_uri = image_uris.retrieve(framework="xgboost", region=region, version="1.2-2")
     xgb_train = Estimator(
         image_uri=image_uri,
         instance_type=training_instance_type,
@@ -294,27 +595,42 @@ def get_pipeline(
         output_name="evaluation",
         path="evaluation.json",
     )
+    eval_inputs = [
+        ProcessingInput(
+            source=step_train.properties.ModelArtifacts.S3ModelArtifacts,
+            destination="/opt/ml/processing/model",
+        ),
+        ProcessingInput(
+            source=step_process.properties.ProcessingOutputConfig.Outputs[
+                "test"
+            ].S3Output.S3Uri,
+            destination="/opt/ml/processing/test",
+        ),
+        get_profiler_input(),
+    ]
+    eval_arguments = get_profile_arguments(pipeline_name, profile_metrics)
+    if compiled_predictor:
+        # Pass the tree ensemble module to predict without xgboost DMatrix
+        eval_inputs += [
+            ProcessingInput(
+                source=os.path.join(BASE_DIR, "tree_ensemble.py"),
+                destination="/opt/ml/processing/predictor",
+                input_name="predictor",
+            ),
+        ]
+        eval_arguments += ["--predictor", "compiled"]
     step_eval = ProcessingStep(
         name="EvaluateModel",
         processor=script_eval,
-        inputs=[
-            ProcessingInput(
-                source=step_train.properties.ModelArtifacts.S3ModelArtifacts,
-                destination="/opt/ml/processing/model",
-            ),
-            ProcessingInput(
-                source=step_process.properties.ProcessingOutputConfig.Outputs[
-                    "test"
-                ].S3Output.S3Uri,
-                destination="/opt/ml/processing/test",
-            ),
-        ],
+        inputs=eval_inputs,
         outputs=[
             ProcessingOutput(
                 output_name="evaluation", source="/opt/ml/processing/evaluation"
             ),
+            get_profile_output(),
         ],
         code=os.path.join(BASE_DIR, "evaluate.py"),
+        job_arguments=eval_arguments or None,
         property_files=[evaluation_report],
         cache_config=cache_config,
     )
@@ -359,21 +675,27 @@ def get_pipeline(
         else_steps=[],
     )
 
+    parameters = [
+        input_source,
+        input_data,
+        input_zones,
+        processing_instance_type,
+        processing_instance_count,
+        baseline_instance_type,
+        training_instance_type,
+        model_approval_status,
+        model_output,
+        baseline_output,
+    ]
+    if features_output is not None:
+        parameters += [features_output]
+    if input_manifest is not None:
+        parameters += [input_manifest]
+
     # pipeline instance
     pipeline = Pipeline(
         name=pipeline_name,
-        parameters=[
-            input_source,
-            input_data,
-            input_zones,
-            processing_instance_type,
-            processing_instance_count,
-            baseline_instance_type,
-            training_instance_type,
-            model_approval_status,
-            model_output,
-            baseline_output,
-        ],
+        parameters=parameters,
         steps=[step_process, step_baseline, step_train, step_eval, step_cond],
         sagemaker_session=sagemaker_session,
     )
@@ -381,12 +703,62 @@ def get_pipeline(
     return pipeline
 
 
+def get_code_files() -> list:
+    """Gets the scripts in the pipelines dir, which are uploaded with the definition."""
+    return sorted(
+        f
+        for f in os.listdir(BASE_DIR)
+        if f.endswith(".py") and not f.startswith("test_")
+    )
+
+
+def get_definition_hash(pipeline_definition_body: str) -> str:
+    """Gets the sha256 of the canonicalized pipeline definition json and its code.
+
+    The job names generated when rendering a definition end with a timestamp, which
+    the SDK uses in the s3 uris of the uploaded code and of the default outputs.
+    These timestamps are removed, and the code is hashed by content instead.
+    """
+    definition = GENERATED_NAME_PATTERN.sub("", pipeline_definition_body)
+    canonical = json.dumps(
+        json.loads(definition), sort_keys=True, separators=(",", ":")
+    )
+    definition_hash = hashlib.sha256(canonical.encode("utf-8"))
+    definition_hash.update(get_code_version(get_code_files()).encode("utf-8"))
+    return definition_hash.hexdigest()
+
+
 def upload_pipeline(pipeline: Pipeline, default_bucket, base_job_prefix) -> str:
+    """Uploads the pipeline definition to a content addressed key in s3.
+
+    The key is derived from a hash of the definition, so the upload is skipped and
+    the existing key reused when the definition has not changed.
+
+    Args:
+        pipeline: the pipeline to upload the definition for
+        default_bucket: the bucket to upload the definition to
+        base_job_prefix: the prefix for the definition key
+
+    Returns:
+        The s3 key of the pipeline definition
+    """
     # Get the pipeline definition
     pipeline_definition_body = pipeline.definition()
-    # Upload the pipeline to a unique location in s3 based on git commit and timestamp
-    pipeline_key = name_from_base(f"{base_job_prefix}/pipeline.json")
+    definition_hash = get_definition_hash(pipeline_definition_body)
+    pipeline_key = f"{base_job_prefix}/pipeline-{definition_hash}.json"
+
+    # Check if the definition has already been uploaded
+    s3_client = pipeline.sagemaker_session.boto_session.client("s3")
+    try:
+        s3_client.head_object(Bucket=default_bucket, Key=pipeline_key)
+        return pipeline_key
+    except ClientError as e:
+        if e.response["Error"]["Code"] not in ("404", "NoSuchKey", "NotFound"):
+            raise
+
     S3Uploader.upload_string_as_file_body(
-        pipeline_definition_body, f"s3://{default_bucket}/{pipeline_key}"
+        pipeline_definition_body,
+        f"s3://{default_bucket}/{pipeline_key}",
+        sagemaker_session=pipeline.sagemaker_session,
     )
     return pipeline_key
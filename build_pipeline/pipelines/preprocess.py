@@ -1,14 +1,33 @@
-"""Feature engineers the nyc taxi dataset."""
+"""Feature engineers the nyc taxi dataset.
+
+When a cache uri is given, the enriched and cleaned features of each input file are
+cached under it keyed by the source S3 key and ETag, the zones ETag and the code
+version, so only new or changed input files are processed and cached partitions are
+concatenated.
+
+When a step cache uri is given, the outputs of the whole step are cached under it
+keyed by the code version, arguments and input object ETags, and restored instead of
+processing when the key matches, however long ago they were cached.
+"""
+import argparse
 import glob
+import hashlib
+import importlib.util
+import io
+import json
 import logging
 import os
 import subprocess
 import sys
+from urllib.parse import urlparse
 from zipfile import ZipFile
 
-# Install geopandas dependency before including pandas
-subprocess.check_call([sys.executable, "-m", "pip", "install", "geopandas==0.9.0"])
+# Install geopandas dependency before including pandas, unless already installed
+if importlib.util.find_spec("geopandas") is None:
+    subprocess.check_call([sys.executable, "-m", "pip", "install", "geopandas==0.9.0"])
 
+import boto3  # noqa: E402
+import numpy as np  # noqa: E402
 import pandas as pd  # noqa: E402
 import geopandas as gpd  # noqa: E402
 from sklearn.model_selection import train_test_split  # noqa: E402
@@ -17,6 +36,64 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 logger.addHandler(logging.StreamHandler())
 
+# The processing container directory, which is relocated to run the job locally
+PROCESSING_DIR = os.environ.get("PROCESSING_DIR", "/opt/ml/processing")
+
+# Profiler module is provided as a processing input alongside the script
+sys.path.insert(0, os.path.join(PROCESSING_DIR, "profiler"))
+from profiler import Profiler  # noqa: E402
+
+# The layout of the TLC trip record timestamps
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+TIMESTAMP_SEPARATORS = {4: b"-", 7: b"-", 10: b" ", 13: b":", 16: b":"}
+TIMESTAMP_LENGTH = 19
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+
+def split_s3_uri(uri: str):
+    url_parsed = urlparse(uri)
+    return url_parsed.netloc, url_parsed.path.lstrip("/")
+
+
+def list_objects(uri: str) -> dict:
+    """Lists the objects under an S3 prefix as a dict of relative path to key and ETag.
+
+    The relative path of an object is the path of its file under the processing input
+    directory, so files with the same name in different folders are kept apart.
+    """
+    bucket, prefix = split_s3_uri(os.path.join(uri, ""))
+    objects = {}
+    paginator = boto3.client("s3").get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for o in page.get("Contents", []):
+            if o["Key"].endswith("/"):
+                continue
+            objects[os.path.relpath(o["Key"], prefix)] = {
+                "Bucket": bucket,
+                "Key": o["Key"],
+                "ETag": o["ETag"].strip('"'),
+            }
+    return objects
+
+
+def get_object(uri: str) -> dict:
+    """Gets the key and ETag of an S3 object, or None if it doesn't exist."""
+    bucket, key = split_s3_uri(uri)
+    s3 = boto3.client("s3")
+    try:
+        response = s3.head_object(Bucket=bucket, Key=key)
+    except s3.exceptions.ClientError:
+        return None
+    return {"Bucket": bucket, "Key": key, "ETag": response["ETag"].strip('"')}
+
+
+def get_cache_key(source: dict, zones_source: dict, code_version: str) -> str:
+    key = (
+        f"{source['Bucket']}/{source['Key']}:{source['ETag']}:"
+        f"{zones_source['ETag']}:{code_version}"
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
 
 def extract_zones(zones_file: str, zones_dir: str):
     logger.info(f"Extracting zone file: {zones_file}")
@@ -53,6 +130,100 @@ def load_data(file_list: list):
     return pd.concat(dfs, ignore_index=True)
 
 
+def get_digits(chars: np.ndarray, start: int, end: int) -> np.ndarray:
+    # Gets the integer value of a fixed width field of ascii digits
+    value = np.zeros(len(chars), dtype=np.int64)
+    for i in range(start, end):
+        value = value * 10 + (chars[:, i] - ord("0"))
+    return value
+
+
+def days_from_civil(year: np.ndarray, month: np.ndarray, day: np.ndarray):
+    # Gets the days since 1970-01-01 for dates in the proleptic gregorian calendar
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * np.where(month > 2, month - 3, month + 9) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    return era * 146097 + day_of_era - 719468
+
+
+def get_days_in_month(year: np.ndarray, month: np.ndarray) -> np.ndarray:
+    # Gets the days in each month, with months out of range clipped
+    days = DAYS_IN_MONTH[np.clip(month, 1, 12) - 1]
+    is_leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    return days + ((month == 2) & is_leap)
+
+
+def parse_timestamps(values: pd.Series) -> dict:
+    """Parses timestamps with the fixed YYYY-MM-DD HH:MM:SS layout into date parts.
+
+    The digits are parsed from the ascii bytes of all values at once, avoiding the
+    format inference of `pd.to_datetime`.  If any value doesn't match the layout, or
+    has a field out of range such as month 13, the values are parsed with the explicit
+    format, and unparseable values are missing.
+
+    Args:
+        values: The timestamp strings.
+
+    Returns:
+        The epoch seconds, hour, weekday and month of each timestamp, as nullable
+        `Int64` and `Int8` arrays on both paths.
+    """
+    if pd.api.types.is_string_dtype(values.dtype):
+        chars = values.to_numpy(dtype=f"S{TIMESTAMP_LENGTH + 1}")
+        chars = chars.view(np.uint8).reshape(len(values), TIMESTAMP_LENGTH + 1)
+        digits = np.delete(chars[:, :TIMESTAMP_LENGTH], list(TIMESTAMP_SEPARATORS), 1)
+        is_valid = (
+            (chars[:, TIMESTAMP_LENGTH] == 0)
+            & np.all((digits >= ord("0")) & (digits <= ord("9")), axis=1)
+            & np.all(
+                [chars[:, i] == ord(c) for i, c in TIMESTAMP_SEPARATORS.items()],
+                axis=0,
+            )
+        )
+        if is_valid.all():
+            year, month, day = (
+                get_digits(chars, 0, 4),
+                get_digits(chars, 5, 7),
+                get_digits(chars, 8, 10),
+            )
+            hour, minute, second = (
+                get_digits(chars, 11, 13),
+                get_digits(chars, 14, 16),
+                get_digits(chars, 17, 19),
+            )
+            is_valid = (
+                (month >= 1)
+                & (month <= 12)
+                & (day >= 1)
+                & (day <= get_days_in_month(year, month))
+                & (hour < 24)
+                & (minute < 60)
+                & (second < 60)
+            )
+        if is_valid.all():
+            days = days_from_civil(year, month, day)
+            seconds = days * 86400 + hour * 3600 + minute * 60 + second
+            return {
+                "seconds": pd.array(seconds, dtype="Int64"),
+                "hour": pd.array(hour.astype(np.int8), dtype="Int8"),
+                # 1970-01-01 was a Thursday, with Monday=0 as in pandas
+                "weekday": pd.array(((days + 3) % 7).astype(np.int8), dtype="Int8"),
+                "month": pd.array(month.astype(np.int8), dtype="Int8"),
+            }
+
+    logger.warning("Parsing timestamps that don't match the layout")
+    timestamps = pd.to_datetime(values, format=TIMESTAMP_FORMAT, errors="coerce")
+    seconds = (timestamps - pd.Timestamp(0)).dt.total_seconds()
+    return {
+        "seconds": seconds.round().astype("Int64").array,
+        "hour": timestamps.dt.hour.astype("Int8").array,
+        "weekday": timestamps.dt.weekday.astype("Int8").array,
+        "month": timestamps.dt.month.astype("Int8").array,
+    }
+
+
 def enrich_data(trip_df: pd.DataFrame, zone_df: pd.DataFrame):
     # Join trip DF to zones for poth pickup and drop off locations
     trip_df = gpd.GeoDataFrame(
@@ -65,16 +236,16 @@ def enrich_data(trip_df: pd.DataFrame, zone_df: pd.DataFrame):
     )
 
     # Add date parts
-    trip_df["lpep_pickup_datetime"] = pd.to_datetime(trip_df["lpep_pickup_datetime"])
-    trip_df["hour"] = trip_df["lpep_pickup_datetime"].dt.hour
-    trip_df["weekday"] = trip_df["lpep_pickup_datetime"].dt.weekday
-    trip_df["month"] = trip_df["lpep_pickup_datetime"].dt.month
+    pickup = parse_timestamps(trip_df["lpep_pickup_datetime"])
+    trip_df["hour"] = pickup["hour"]
+    trip_df["weekday"] = pickup["weekday"]
+    trip_df["month"] = pickup["month"]
 
-    # Get calculated duration in minutes
-    trip_df["lpep_dropoff_datetime"] = pd.to_datetime(trip_df["lpep_dropoff_datetime"])
+    # Get calculated duration in minutes, including any days
+    dropoff = parse_timestamps(trip_df["lpep_dropoff_datetime"])
     trip_df["duration_minutes"] = (
-        trip_df["lpep_dropoff_datetime"] - trip_df["lpep_pickup_datetime"]
-    ).dt.seconds / 60
+        (dropoff["seconds"] - pickup["seconds"]) / 60
+    ).astype(np.float32)
 
     # Rename and filter cols
     trip_df = trip_df.rename(
@@ -116,11 +287,25 @@ def clean_data(trip_df: pd.DataFrame):
     return trip_df[cols]
 
 
-def save_files(base_dir: str, data_df: pd.DataFrame, val_size=0.2, test_size=0.05):
+def split_data(data_df: pd.DataFrame, val_size=0.2, test_size=0.05):
     logger.info(f"Splitting {len(data_df)} rows of data into train, val, test.")
     train_df, val_df = train_test_split(data_df, test_size=val_size, random_state=42)
     val_df, test_df = train_test_split(val_df, test_size=test_size, random_state=42)
+    return train_df, val_df, test_df
 
+
+def save_files(base_dir: str, data_df: pd.DataFrame, val_size=0.2, test_size=0.05):
+    train_df, val_df, test_df = split_data(data_df, val_size, test_size)
+    return write_files(base_dir, train_df, val_df, test_df)
+
+
+def write_files(
+    base_dir: str,
+    train_df: pd.DataFrame,
+    val_df: pd.DataFrame,
+    test_df: pd.DataFrame,
+    write_baseline: bool = True,
+):
     logger.info(f"Writing out datasets to {base_dir}")
     train_df.to_csv(f"{base_dir}/train/train.csv", header=False, index=False)
     val_df.to_csv(f"{base_dir}/validation/validation.csv", header=False, index=False)
@@ -129,14 +314,279 @@ def save_files(base_dir: str, data_df: pd.DataFrame, val_size=0.2, test_size=0.0
     test_df.to_csv(f"{base_dir}/test/test.csv", header=True, index=False)
 
     # Save training data as baseline with header
-    train_df.to_csv(f"{base_dir}/baseline/baseline.csv", header=True, index=False)
+    if write_baseline:
+        train_df.to_csv(f"{base_dir}/baseline/baseline.csv", header=True, index=False)
     return train_df, val_df, test_df
 
 
-def main(base_dir):
+class FeatureCache:
+    """Caches the features of each input file as columnar npz objects in S3.
+
+    Args:
+        input_dir: The processing input directory of the data files.
+        data_uri: The url the input files are relative to, used to look up the source
+            file ETags.
+        zones_uri: The zones file url, whose ETag is part of every key.
+        cache_uri: The url under which features are cached.
+        code_version: The version of the preprocessing code.
+    """
+
+    def __init__(
+        self,
+        input_dir: str,
+        data_uri: str,
+        zones_uri: str,
+        cache_uri: str,
+        code_version: str,
+    ):
+        self.s3 = boto3.client("s3")
+        self.input_dir = input_dir
+        self.sources = list_objects(data_uri)
+        self.zones_source = get_object(zones_uri)
+        self.cache_bucket, self.cache_prefix = split_s3_uri(cache_uri)
+        self.code_version = code_version
+
+    def get_key(self, file: str) -> str:
+        source = self.sources.get(os.path.relpath(file, self.input_dir))
+        if source is None or self.zones_source is None:
+            return None
+        cache_key = get_cache_key(source, self.zones_source, self.code_version)
+        return os.path.join(self.cache_prefix, f"{cache_key}.npz")
+
+    def get(self, file: str) -> pd.DataFrame:
+        key = self.get_key(file)
+        if key is None:
+            return None
+        try:
+            response = self.s3.get_object(Bucket=self.cache_bucket, Key=key)
+        except self.s3.exceptions.NoSuchKey:
+            return None
+        logger.info(f"Using cached features for {file}")
+        with np.load(io.BytesIO(response["Body"].read())) as columns:
+            return pd.DataFrame({name: columns[name] for name in columns.files})
+
+    def put(self, file: str, data_df: pd.DataFrame) -> None:
+        key = self.get_key(file)
+        if key is None:
+            logger.warning(f"No source object found for {file}, not caching")
+            return
+        body = io.BytesIO()
+        np.savez(body, **{name: data_df[name].to_numpy() for name in data_df.columns})
+        self.s3.put_object(Bucket=self.cache_bucket, Key=key, Body=body.getvalue())
+
+
+def get_step_key(code_version: str, arguments: dict, sources: list) -> str:
+    """Gets the content hash of the code version, arguments and input objects."""
+    key = {
+        "code_version": code_version,
+        "arguments": arguments,
+        "sources": sorted(f"{s['Bucket']}/{s['Key']}:{s['ETag']}" for s in sources),
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class StepCache:
+    """Caches the output directories of the step in S3, keyed by content hash.
+
+    The files of each output are saved under `<cache-uri>/<key>/<output-name>/`, and
+    the entry is indexed by `<cache-uri>/index/<key>.json`, which is written last so
+    a partially saved entry is never restored.  Files are streamed between S3 and
+    disk, so they are never held in memory.
+
+    Args:
+        cache_uri: The url under which step outputs are cached.
+        key: The content hash of the step.
+    """
+
+    def __init__(self, cache_uri: str, key: str):
+        self.s3 = boto3.client("s3")
+        self.cache_bucket, self.cache_prefix = split_s3_uri(cache_uri)
+        self.key = key
+
+    def get_index_key(self) -> str:
+        return os.path.join(self.cache_prefix, "index", f"{self.key}.json")
+
+    def get_file_key(self, name: str, file: str) -> str:
+        return os.path.join(self.cache_prefix, self.key, name, file)
+
+    def restore(self, output_dirs: dict) -> bool:
+        """Restores the output directories of a cached entry, if there is one."""
+        try:
+            response = self.s3.get_object(
+                Bucket=self.cache_bucket, Key=self.get_index_key()
+            )
+        except self.s3.exceptions.NoSuchKey:
+            return False
+        outputs = json.loads(response["Body"].read())["outputs"]
+        for name, output_dir in output_dirs.items():
+            for file in outputs[name]:
+                path = os.path.join(output_dir, file)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                self.s3.download_file(
+                    self.cache_bucket, self.get_file_key(name, file), path
+                )
+        logger.info(f"Restored the outputs of step cache key {self.key}")
+        return True
+
+    def save(self, output_dirs: dict) -> None:
+        """Saves the files of the output directories, then indexes the entry."""
+        logger.info(f"Saving the outputs with step cache key {self.key}")
+        outputs = {}
+        for name, output_dir in output_dirs.items():
+            files = glob.glob(f"{output_dir}/**/*", recursive=True)
+            outputs[name] = [
+                os.path.relpath(f, output_dir)
+                for f in sorted(files)
+                if os.path.isfile(f)
+            ]
+            for file in outputs[name]:
+                self.s3.upload_file(
+                    os.path.join(output_dir, file),
+                    self.cache_bucket,
+                    self.get_file_key(name, file),
+                )
+        self.s3.put_object(
+            Bucket=self.cache_bucket,
+            Key=self.get_index_key(),
+            Body=json.dumps({"outputs": outputs}).encode("utf-8"),
+        )
+
+
+def get_step_cache(
+    cache_uri: str,
+    code_version: str,
+    arguments: dict,
+    input_dir: str,
+    file_list: list,
+    data_uri: str,
+    zones_uri: str,
+) -> StepCache:
+    """Gets the step cache for the code, arguments and input objects.
+
+    Returns:
+        The step cache, or None if no cache uri is given or the source objects of
+        the inputs aren't found.
+    """
+    if cache_uri is None:
+        return None
+    sources = get_sources(input_dir, file_list, data_uri, zones_uri)
+    if sources is None:
+        logger.warning("No source objects found for the inputs, not caching")
+        return None
+    return StepCache(cache_uri, get_step_key(code_version, arguments, sources))
+
+
+def get_manifest_prefix(manifest_uri: str) -> str:
+    """Gets the prefix of a manifest, which the listed input files are relative to."""
+    bucket, key = split_s3_uri(manifest_uri)
+    response = boto3.client("s3").get_object(Bucket=bucket, Key=key)
+    return json.loads(response["Body"].read())[0]["prefix"]
+
+
+def get_sources(input_dir: str, file_list: list, data_uri: str, zones_uri: str) -> list:
+    """Gets the source objects of the input files and the zones file."""
+    if data_uri is None or zones_uri is None:
+        return None
+    data_sources = list_objects(data_uri)
+    sources = [data_sources.get(os.path.relpath(file, input_dir)) for file in file_list]
+    sources += [get_object(zones_uri)]
+    if None in sources:
+        return None
+    return sources
+
+
+def load_features(
+    file_list: list,
+    get_zones,
+    cache: FeatureCache = None,
+    profiler: Profiler = None,
+) -> list:
+    """Loads the enriched and cleaned features of each input file.
+
+    Args:
+        file_list: The input files.
+        get_zones: Returns the zones dataframe, only called if a file is processed.
+        cache: The optional feature cache.
+        profiler: The optional profiler of the load, enrich and clean stages.
+
+    Returns:
+        The features dataframe of each input file.
+    """
+    profiler = profiler or Profiler("preprocess")
+    features = []
+    for file in file_list:
+        data_df = None
+        if cache is not None:
+            with profiler.span("read_cache") as span:
+                data_df = cache.get(file)
+                if data_df is not None:
+                    span.add_rows(len(data_df))
+        if data_df is None:
+            logger.info(f"Processing input file {file}")
+            with profiler.span("load") as span:
+                trip_df = load_data([file])
+                span.add_rows(len(trip_df))
+            zone_df = get_zones()
+            with profiler.span("enrich", rows=len(trip_df)):
+                trip_df = enrich_data(trip_df, zone_df)
+            with profiler.span("clean", rows=len(trip_df)):
+                data_df = clean_data(trip_df)
+            if cache is not None:
+                with profiler.span("write_cache", rows=len(data_df)):
+                    cache.put(file, data_df)
+        features.append(data_df)
+    return features
+
+
+def save_partitioned_files(
+    base_dir: str,
+    input_dir: str,
+    file_list: list,
+    features: list,
+    profiler: Profiler = None,
+):
+    """Splits each input file independently and writes a baseline partition per file.
+
+    The split of an input file does not depend on the other input files, so the
+    baseline partition of an unchanged file is identical across runs and its
+    statistics can be cached by the incremental baseline job.  Partitions keep the
+    path of their input file relative to the input directory.
+    """
+    profiler = profiler or Profiler("preprocess")
+    splits = []
+    for file, data_df in zip(file_list, features):
+        with profiler.span("split", rows=len(data_df)):
+            train_df, val_df, test_df = split_data(data_df)
+        partition_path = os.path.join(
+            base_dir, "baseline", os.path.relpath(file, input_dir)
+        )
+        os.makedirs(os.path.dirname(partition_path), exist_ok=True)
+        logger.info(f"Writing baseline partition {partition_path}")
+        with profiler.span("write", rows=len(train_df)):
+            train_df.to_csv(partition_path, header=True, index=False)
+        splits.append((train_df, val_df, test_df))
+
+    with profiler.span("split"):
+        train_df, val_df, test_df = [pd.concat(dfs) for dfs in zip(*splits)]
+    with profiler.span("write", rows=len(train_df) + len(val_df) + len(test_df)):
+        return write_files(base_dir, train_df, val_df, test_df, write_baseline=False)
+
+
+def main(
+    base_dir,
+    partition_baseline=False,
+    data_uri: str = None,
+    cache_uri: str = None,
+    code_version: str = None,
+    zones_uri: str = None,
+    step_cache_uri: str = None,
+    profiler: Profiler = None,
+):
+    profiler = profiler or Profiler("preprocess")
+
     # Input data files
     input_dir = os.path.join(base_dir, "input/data")
-    input_file_list = glob.glob(f"{input_dir}/*.csv")
+    input_file_list = sorted(glob.glob(f"{input_dir}/**/*.csv", recursive=True))
     logger.info(f"Input file list: {input_file_list}")
     if len(input_file_list) == 0:
         raise Exception(f"No input files found in {input_dir}")
@@ -147,18 +597,93 @@ def main(base_dir):
     if not os.path.exists(zones_file):
         raise Exception(f"Zones file {zones_file} does not exist")
 
-    # Extract and load taxi zones geopandas dataframe
-    extract_zones(zones_file, zones_dir)
-    zone_df = load_zones(zones_dir)
+    # Restore the outputs of a previous run with identical code, arguments and inputs
+    step_cache = get_step_cache(
+        step_cache_uri,
+        code_version,
+        {"partition_baseline": partition_baseline},
+        input_dir,
+        input_file_list,
+        data_uri,
+        zones_uri,
+    )
+    output_dirs = {
+        name: os.path.join(base_dir, name)
+        for name in ["train", "validation", "test", "baseline"]
+    }
+    if step_cache is not None:
+        with profiler.span("restore_cache"):
+            restored = step_cache.restore(output_dirs)
+        if restored:
+            return None
 
-    # Load input files
-    data_df = load_data(input_file_list)
-    data_df = enrich_data(data_df, zone_df)
-    data_df = clean_data(data_df)
-    return save_files(base_dir, data_df)
+    # Extract and load taxi zones geopandas dataframe when first needed
+    zones = []
+
+    def get_zones():
+        if len(zones) == 0:
+            with profiler.span("load_zones"):
+                extract_zones(zones_file, zones_dir)
+                zones.append(load_zones(zones_dir))
+        return zones[0]
+
+    # Load the features of each input file, from the cache if given
+    cache = None
+    if cache_uri is not None:
+        cache = FeatureCache(input_dir, data_uri, zones_uri, cache_uri, code_version)
+    features = load_features(input_file_list, get_zones, cache, profiler)
+
+    # Write baseline partitions per input file for the incremental baseline
+    if partition_baseline:
+        splits = save_partitioned_files(
+            base_dir, input_dir, input_file_list, features, profiler
+        )
+    else:
+        with profiler.span("split") as span:
+            data_df = pd.concat(features, ignore_index=True)
+            span.add_rows(len(data_df))
+            train_df, val_df, test_df = split_data(data_df)
+        with profiler.span("write", rows=len(data_df)):
+            splits = write_files(base_dir, train_df, val_df, test_df)
+
+    if step_cache is not None:
+        with profiler.span("save_cache"):
+            step_cache.save(output_dirs)
+    return splits
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--partition-baseline", action="store_true")
+    parser.add_argument("--data-uri", type=str, default=None)
+    parser.add_argument("--manifest-uri", type=str, default=None)
+    parser.add_argument("--cache-uri", type=str, default=None)
+    parser.add_argument("--code-version", type=str, default=None)
+    parser.add_argument("--zones-uri", type=str, default=None)
+    # Optionally skip processing when the step outputs are cached for the same inputs
+    parser.add_argument("--step-cache-uri", type=str, default=None)
+    # Profile the stages, optionally publishing them as CloudWatch metrics
+    parser.add_argument("--profile-dir", type=str, default=f"{PROCESSING_DIR}/profile")
+    parser.add_argument("--metrics-namespace", type=str, default=None)
+    parser.add_argument("--pipeline-name", type=str, default=None)
+    args, _ = parser.parse_known_args()
     logger.info("Starting preprocessing.")
-    main("/opt/ml/processing")
+    profiler = Profiler("preprocess")
+    # Input files selected by a manifest are downloaded relative to its prefix
+    data_uri = args.data_uri
+    if args.manifest_uri is not None:
+        data_uri = get_manifest_prefix(args.manifest_uri)
+    main(
+        PROCESSING_DIR,
+        args.partition_baseline,
+        data_uri,
+        os.path.join(args.cache_uri, "") if args.cache_uri else None,
+        args.code_version,
+        args.zones_uri,
+        args.step_cache_uri,
+        profiler,
+    )
+    profiler.write(args.profile_dir)
+    if args.metrics_namespace is not None:
+        profiler.put_metrics(args.metrics_namespace, args.pipeline_name)
     logger.info("Done")
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from pipelines import baseline
+from pipelines.baseline import compute_partial, get_statistics, merge_partials
+
+
+class StubPaginator:
+    def __init__(self, keys: list):
+        self.keys = keys
+
+    def paginate(self, Bucket: str, Prefix: str):
+        contents = [
+            {"Key": key, "ETag": f'"{i}"'}
+            for i, key in enumerate(self.keys)
+            if key.startswith(Prefix)
+        ]
+        yield {"Contents": contents}
+
+
+class StubS3:
+    def __init__(self, keys: list):
+        self.keys = keys
+
+    def get_paginator(self, name: str):
+        return StubPaginator(self.keys)
+
+
+def test_list_objects_by_relative_path(monkeypatch):
+    keys = [
+        "data/",
+        "data/a/trips.csv",
+        "data/b/trips.csv",
+        "data/trips.csv",
+        "data-old/trips.csv",
+    ]
+    monkeypatch.setattr(baseline, "s3", StubS3(keys))
+    objects = baseline.list_objects("s3://bucket/data")
+    assert sorted(objects) == ["a/trips.csv", "b/trips.csv", "trips.csv"]
+    assert objects["b/trips.csv"]["Key"] == "data/b/trips.csv"
+
+
+def test_partials_are_bounded(monkeypatch):
+    monkeypatch.setattr(baseline, "MAX_SKETCH_SIZE", 100)
+    rng = np.random.default_rng(0)
+    dfs = [
+        pd.DataFrame(
+            {
+                "geo_distance": rng.exponential(5, 10000),
+                "passenger_count": rng.integers(1, 7, 10000),
+            }
+        )
+        for _ in range(3)
+    ]
+    partials = [compute_partial(df) for df in dfs]
+    assert len(partials[0]["features"]["geo_distance"]["values"]) <= 100
+    assert len(partials[0]["features"]["passenger_count"]["values"]) == 6
+
+    merged = merge_partials(partials)
+    assert len(merged["features"]["geo_distance"]["values"]) <= 100
+    statistics = get_statistics(merged)
+    df = pd.concat(dfs)
+    distance, passengers = statistics["features"]
+    num_stats = distance["numerical_statistics"]
+    assert num_stats["common"]["num_present"] == 30000
+    assert np.isclose(num_stats["sum"], df["geo_distance"].round(6).sum())
+    assert np.isclose(num_stats["std_dev"], df["geo_distance"].std(ddof=0))
+    assert num_stats["min"] == df["geo_distance"].round(6).min()
+    assert num_stats["max"] == df["geo_distance"].round(6).max()
+    assert distance["inferred_type"] == "Fractional"
+    assert passengers["inferred_type"] == "Integral"
+    # Bucket counts are off by at most the counts of the runs crossing an edge
+    buckets = num_stats["distribution"]["kll"]["buckets"]
+    exact, _ = np.histogram(
+        df["geo_distance"], [b["lower_bound"] for b in buckets] + [num_stats["max"]]
+    )
+    assert np.abs(exact - [b["count"] for b in buckets]).max() < 30000 / 100 * 2
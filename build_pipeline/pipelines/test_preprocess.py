@@ -0,0 +1,181 @@
+import os
+import io
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Importing preprocess installs geopandas when it's missing, as in the container
+pytest.importorskip("geopandas")
+
+from pipelines import preprocess  # noqa: E402
+from pipelines.preprocess import (  # noqa: E402
+    FeatureCache,
+    parse_timestamps,
+    save_partitioned_files,
+    StepCache,
+)
+
+
+class StubS3:
+    exceptions = SimpleNamespace(ClientError=KeyError)
+
+    def __init__(self, etags: dict):
+        self.etags = etags
+
+    def get_paginator(self, name: str):
+        return self
+
+    def paginate(self, Bucket: str, Prefix: str):
+        contents = [
+            {"Key": key, "ETag": f'"{etag}"'}
+            for key, etag in self.etags.items()
+            if key.startswith(Prefix)
+        ]
+        yield {"Contents": contents}
+
+    def head_object(self, Bucket: str, Key: str):
+        return {"ETag": f'"{self.etags[Key]}"'}
+
+
+class StubObjects:
+    exceptions = SimpleNamespace(NoSuchKey=KeyError)
+
+    def __init__(self):
+        self.objects = {}
+
+    def get_object(self, Bucket: str, Key: str):
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes):
+        self.objects[Key] = Body
+
+    def download_file(self, Bucket: str, Key: str, Filename: str):
+        with open(Filename, "wb") as f:
+            f.write(self.objects[Key])
+
+    def upload_file(self, Filename: str, Bucket: str, Key: str):
+        with open(Filename, "rb") as f:
+            self.objects[Key] = f.read()
+
+
+def assert_parsed(values: pd.Series):
+    parsed = parse_timestamps(values)
+    timestamps = pd.to_datetime(values, format="%Y-%m-%d %H:%M:%S", errors="coerce")
+    seconds = (timestamps - pd.Timestamp(0)).dt.total_seconds().round()
+    expected = {
+        "seconds": seconds.astype("Int64"),
+        "hour": timestamps.dt.hour.astype("Int8"),
+        "weekday": timestamps.dt.weekday.astype("Int8"),
+        "month": timestamps.dt.month.astype("Int8"),
+    }
+    for name, values in expected.items():
+        # Both the fast path and the fallback give nullable integers
+        pd.testing.assert_extension_array_equal(parsed[name], values.array)
+    return parsed
+
+
+def test_parse_timestamps_matches_pandas():
+    rng = np.random.default_rng(0)
+    seconds = rng.integers(-(4 * 10 ** 9), 4 * 10 ** 9, 10000)
+    values = pd.Series(pd.to_datetime(seconds, unit="s").strftime("%Y-%m-%d %H:%M:%S"))
+    values[:4] = [
+        "2000-02-29 23:59:59",
+        "2100-02-28 00:00:00",
+        "1900-03-01 12:00:00",
+        "2021-01-01 00:00:00",
+    ]
+    assert_parsed(values)
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "2018-13-45 00:00:00",
+        "2018-00-10 00:00:00",
+        "2018-02-29 00:00:00",
+        "2018-04-31 00:00:00",
+        "2018-01-01 24:00:00",
+        "2018-01-01 00:60:00",
+        "2018-01-01 00:00:60",
+        "2018-01-01T00:00:00",
+        "2018-01-01",
+        "not a timestamp",
+    ],
+)
+def test_parse_timestamps_falls_back_on_bad_rows(value):
+    values = pd.Series(["2019-06-01 10:30:00", value, "2020-02-29 08:00:00"])
+    parsed = assert_parsed(values)
+    # The good rows are still parsed, and the bad row is missing where pandas
+    # rejects it, which clean_data drops
+    assert list(parsed["month"][[0, 2]]) == [6, 2]
+    assert parsed["hour"].dtype == "Int8"
+
+
+def test_feature_cache_keys_by_relative_path(monkeypatch):
+    etags = {
+        "data/2021/trips.csv": "a",
+        "data/2022/trips.csv": "a",
+        "zones/taxi_zones.zip": "z",
+    }
+    monkeypatch.setattr(preprocess.boto3, "client", lambda name: StubS3(etags))
+
+    def get_keys(input_dir: str):
+        cache = FeatureCache(
+            input_dir,
+            "s3://bucket/data",
+            "s3://bucket/zones/taxi_zones.zip",
+            "s3://bucket/features/",
+            "v1",
+        )
+        return [
+            cache.get_key(os.path.join(input_dir, path))
+            for path in ["2021/trips.csv", "2022/trips.csv", "trips.csv"]
+        ]
+
+    first, second, missing = get_keys("/opt/ml/processing/input/data")
+    assert first.startswith("features/") and second.startswith("features/")
+    assert first != second
+    assert missing is None
+
+    # A change to the zones invalidates the cached features of every file
+    etags["zones/taxi_zones.zip"] = "y"
+    assert get_keys("/opt/ml/processing/input/data")[:2] != [first, second]
+
+
+def test_partitions_keep_relative_paths(tmp_path):
+    for name in ["train", "validation", "test", "baseline"]:
+        (tmp_path / name).mkdir()
+    input_dir = str(tmp_path / "input" / "data")
+    files = [os.path.join(input_dir, path, "trips.csv") for path in ["2021", "2022"]]
+    features = [
+        pd.DataFrame({"fare_amount": np.arange(100.0) + i, "geo_distance": 1.0})
+        for i in range(2)
+    ]
+    save_partitioned_files(str(tmp_path), input_dir, files, features)
+    for path, df in zip(["2021", "2022"], features):
+        partition = pd.read_csv(tmp_path / "baseline" / path / "trips.csv")
+        assert partition["fare_amount"].isin(df["fare_amount"]).all()
+
+
+def test_step_cache_round_trip(monkeypatch, tmp_path):
+    s3 = StubObjects()
+    monkeypatch.setattr(preprocess.boto3, "client", lambda name: s3)
+    output_dirs = {name: tmp_path / "saved" / name for name in ["train", "baseline"]}
+    (output_dirs["train"]).mkdir(parents=True)
+    (output_dirs["train"] / "train.csv").write_text("1,2\n")
+    (output_dirs["baseline"] / "2021").mkdir(parents=True)
+    (output_dirs["baseline"] / "2021" / "trips.csv").write_text("a,b\n1,2\n")
+
+    step_cache = StepCache("s3://bucket/step-cache/", "key")
+    assert not step_cache.restore(output_dirs)
+    step_cache.save(output_dirs)
+    assert "step-cache/index/key.json" in s3.objects
+
+    restored_dirs = {name: tmp_path / "restored" / name for name in output_dirs}
+    assert step_cache.restore(restored_dirs)
+    assert (restored_dirs["train"] / "train.csv").read_text() == "1,2\n"
+    restored = restored_dirs["baseline"] / "2021" / "trips.csv"
+    assert restored.read_text() == "a,b\n1,2\n"
+    assert not StepCache("s3://bucket/step-cache/", "other").restore(restored_dirs)
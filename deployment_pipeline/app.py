@@ -1,30 +1,54 @@
 #!/usr/bin/env python3
 import argparse
+import functools
+import glob
 import json
 import logging
 import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
 
-from aws_cdk import core
 from infra.deployment_config import DeploymentConfig, VariantConfig
-from infra.sagemaker_stack import SageMakerStack
-from infra.model_registry import ModelRegistry
+
+if TYPE_CHECKING:
+    from aws_cdk import core
 
 
 # Configure the logger
 logger = logging.getLogger(__name__)
 logging.basicConfig(level="INFO")
 
-registry = ModelRegistry()
+# Heavy modules (aws_cdk and boto3) are imported on the code paths that use them,
+# to keep the app startup fast.  See test_app.py for the import budget.
 
 
-def create_endpoint(
-    app: core.App,
+@functools.lru_cache(maxsize=None)
+def get_registry():
+    """Gets the registry that caches lookups shared by the stages, and optionally
+    across synth invocations."""
+    from infra.model_registry import ModelRegistry
+
+    return ModelRegistry(
+        cache_ttl=int(os.environ.get("MODEL_REGISTRY_CACHE_TTL", 300)),
+        cache_path=os.environ.get("MODEL_REGISTRY_CACHE_PATH"),
+    )
+
+
+def get_stage_names(config_pattern: str = "*-config.json"):
+    """Gets the sorted stage names from the stage specific config files."""
+    return sorted(
+        os.path.basename(path)[: -len("-config.json")]
+        for path in glob.glob(config_pattern)
+    )
+
+
+def resolve_endpoint(
     project_name: str,
     project_id: str,
-    sagemaker_execution_role: str,
     artifact_bucket: str,
     stage_name: str,
 ):
+    registry = get_registry()
 
     # Define variables for passing down to stacks
     endpoint_name = f"sagemaker-{project_name}-{stage_name}"
@@ -34,13 +58,6 @@ def create_endpoint(
         )
     logger.info(f"Create endpoint: {endpoint_name}")
 
-    # Define the deployment tags
-    tags = [
-        core.CfnTag(key="sagemaker:deployment-stage", value=stage_name),
-        core.CfnTag(key="sagemaker:project-id", value=project_id),
-        core.CfnTag(key="sagemaker:project-name", value=project_name),
-    ]
-
     # Get the stage specific deployment config for sagemaker
     with open(f"{stage_name}-config.json", "r") as f:
         j = json.load(f)
@@ -83,6 +100,38 @@ def create_endpoint(
     reporting_uri = f"s3://{artifact_bucket}/{project_id}/monitoring"
     logger.info(f"Got reporting uri: {reporting_uri}")
 
+    return {
+        "stage_name": stage_name,
+        "endpoint_name": endpoint_name,
+        "deployment_config": deployment_config,
+        "baseline_uri": baseline_uri,
+        "data_capture_uri": data_capture_uri,
+        "reporting_uri": reporting_uri,
+    }
+
+
+def create_endpoint(
+    app: "core.App",
+    project_name: str,
+    project_id: str,
+    sagemaker_execution_role: str,
+    stage_name: str,
+    endpoint_name: str,
+    deployment_config: DeploymentConfig,
+    baseline_uri: str,
+    data_capture_uri: str,
+    reporting_uri: str,
+):
+    from aws_cdk import core
+    from infra.sagemaker_stack import SageMakerStack
+
+    # Define the deployment tags
+    tags = [
+        core.CfnTag(key="sagemaker:deployment-stage", value=stage_name),
+        core.CfnTag(key="sagemaker:project-id", value=project_id),
+        core.CfnTag(key="sagemaker:project-name", value=project_name),
+    ]
+
     return SageMakerStack(
         app,
         f"drift-deploy-{stage_name}",
@@ -103,26 +152,36 @@ def main(
     artifact_bucket: str,
 ):
 
-    # Create App and stacks
+    # Resolve the stages concurrently, as each blocks on registry lookups
+    stage_names = get_stage_names()
+    logger.info(f"Resolving stages: {stage_names}")
+    get_registry()
+    with ThreadPoolExecutor(max_workers=max(len(stage_names), 1)) as executor:
+        futures = [
+            executor.submit(
+                resolve_endpoint,
+                project_name=project_name,
+                project_id=project_id,
+                artifact_bucket=artifact_bucket,
+                stage_name=stage_name,
+            )
+            for stage_name in stage_names
+        ]
+        resolved = [future.result() for future in futures]
+
+    # Create App and stacks on the main thread, in stage order
+    from aws_cdk import core
+
     app = core.App()
 
-    # Create two different stages for staging and prod
-    create_endpoint(
-        app,
-        project_name=project_name,
-        project_id=project_id,
-        sagemaker_execution_role=sagemaker_execution_role,
-        artifact_bucket=artifact_bucket,
-        stage_name="staging",
-    )
-    create_endpoint(
-        app,
-        project_name=project_name,
-        project_id=project_id,
-        sagemaker_execution_role=sagemaker_execution_role,
-        artifact_bucket=artifact_bucket,
-        stage_name="prod",
-    )
+    for stage in resolved:
+        create_endpoint(
+            app,
+            project_name=project_name,
+            project_id=project_id,
+            sagemaker_execution_role=sagemaker_execution_role,
+            **stage,
+        )
 
     app.synth()
 
@@ -7,6 +7,8 @@ from aws_cdk import (
 
 import logging
 
+from infra.image_uris import get_region_image_uris
+
 logger = logging.getLogger(__name__)
 
 
@@ -205,36 +207,8 @@ class SageMakerStack(core.Stack):
             # TODO: Add cloud watch alarm
 
     def get_model_monitor_mapping(self):
-        region_to_account = {
-            "af-south-1": "875698925577",
-            "ap-east-1": "001633400207",
-            "ap-northeast-1": "574779866223",
-            "ap-northeast-2": "709848358524",
-            "ap-south-1": "126357580389",
-            "ap-southeast-1": "245545462676",
-            "ap-southeast-2": "563025443158",
-            "ca-central-1": "536280801234",
-            "cn-north-1": "453000072557",
-            "cn-northwest-1": "453252182341",
-            "eu-central-1": "048819808253",
-            "eu-north-1": "895015795356",
-            "eu-south-1": "933208885752",
-            "eu-west-1": "468650794304",
-            "eu-west-2": "749857270468",
-            "eu-west-3": "680080141114",
-            "me-south-1": "607024016150",
-            "sa-east-1": "539772159869",
-            "us-east-1": "156813124566",
-            "us-east-2": "777275614652",
-            "us-west-1": "890145073186",
-            "us-west-2": "159807026194",
-        }
         mapping = core.CfnMapping(self, "ModelAnalyzerMap")
-        container = "sagemaker-model-monitor-analyzer:latest"
-        for region in region_to_account:
-            mapping.set_value(
-                region,
-                "ImageUri",
-                f"{region_to_account[region]}.dkr.ecr.{region}.amazonaws.com/{container}",
-            )
+        region_to_image_uri = get_region_image_uris("model-monitor", "latest")
+        for region, image_uri in region_to_image_uri.items():
+            mapping.set_value(region, "ImageUri", image_uri)
         return mapping
@@ -1,8 +1,10 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from botocore.stub import Stubber
 import pytest
 
-from infra.model_registry import ModelRegistry
+from infra.model_registry import ModelRegistry, PipelineExecutionIndex
 
 
 def get_package(version: int, creation_time: datetime = datetime.fromtimestamp(0)):
@@ -338,6 +340,276 @@ def test_get_pipeline_execution_arn():
     pass
 
 
+def get_step(step_name: str, job_type: str, job_name: str):
+    return {
+        "StepName": step_name,
+        "StepStatus": "Succeeded",
+        "Metadata": {
+            job_type: {"Arn": f"arn:aws:sagemaker:REGION:ACCOUNT:job/{job_name}"}
+        },
+    }
+
+
+def get_processing_job(job_name: str, output_name: str):
+    return {
+        "ProcessingJobName": job_name,
+        "ProcessingJobArn": f"arn:aws:sagemaker:REGION:ACCOUNT:job/{job_name}",
+        "ProcessingJobStatus": "Completed",
+        "CreationTime": datetime.fromtimestamp(0),
+        "ProcessingResources": {
+            "ClusterConfig": {
+                "InstanceCount": 1,
+                "InstanceType": "ml.m5.xlarge",
+                "VolumeSizeInGB": 30,
+            }
+        },
+        "AppSpecification": {"ImageUri": "STUB"},
+        "ProcessingOutputConfig": {
+            "Outputs": [
+                {
+                    "OutputName": output_name,
+                    "S3Output": {
+                        "S3Uri": f"s3://bucket/{job_name}/{output_name}",
+                        "LocalPath": "/opt/ml/processing/output",
+                        "S3UploadMode": "EndOfJob",
+                    },
+                }
+            ]
+        },
+    }
+
+
 def test_get_processing_output():
-    # TODO: Implement
-    pass
+    # Create model registry
+    registry = ModelRegistry()
+    execution_arn = "arn:aws:sagemaker:REGION:ACCOUNT:pipeline/test/execution/1"
+
+    with Stubber(registry.sm_client) as stubber:
+        # Steps are paginated
+        expected_params = {"PipelineExecutionArn": execution_arn}
+        expected_response = {
+            "PipelineExecutionSteps": [{"StepName": "CheckEvaluation"}],
+            "NextToken": "MORE1",
+        }
+        stubber.add_response(
+            "list_pipeline_execution_steps", expected_response, expected_params
+        )
+        expected_params = {"PipelineExecutionArn": execution_arn, "NextToken": "MORE1"}
+        expected_response = {
+            "PipelineExecutionSteps": [
+                get_step("BaselineJob", "ProcessingJob", "baseline-job")
+            ],
+        }
+        stubber.add_response(
+            "list_pipeline_execution_steps", expected_response, expected_params
+        )
+        expected_params = {"ProcessingJobName": "baseline-job"}
+        expected_response = get_processing_job("baseline-job", "monitoring_output")
+        stubber.add_response(
+            "describe_processing_job", expected_response, expected_params
+        )
+
+        # Expect a single lookup of the steps and jobs for the execution
+        for _ in range(2):
+            response = registry.get_processing_output(execution_arn)
+            assert response == "s3://bucket/baseline-job/monitoring_output"
+        with pytest.raises(Exception):
+            registry.get_processing_output(execution_arn, output_name="missing")
+        stubber.assert_no_pending_responses()
+
+
+def test_pipeline_execution_index():
+    registry = ModelRegistry()
+    execution_arn = "arn:aws:sagemaker:REGION:ACCOUNT:pipeline/test/execution/1"
+
+    with Stubber(registry.sm_client) as stubber:
+        expected_params = {"PipelineExecutionArn": execution_arn}
+        expected_response = {
+            "PipelineExecutionSteps": [
+                get_step("PreprocessData", "ProcessingJob", "preprocess-job"),
+                get_step("TrainModel", "TrainingJob", "train-job"),
+                get_step("BaselineJob", "ProcessingJob", "baseline-job"),
+            ],
+        }
+        stubber.add_response(
+            "list_pipeline_execution_steps", expected_response, expected_params
+        )
+        # Describe calls are made in step order with a single worker
+        stubber.add_response(
+            "describe_processing_job",
+            get_processing_job("preprocess-job", "train"),
+            {"ProcessingJobName": "preprocess-job"},
+        )
+        stubber.add_response(
+            "describe_training_job",
+            {
+                "TrainingJobName": "train-job",
+                "TrainingJobArn": "arn:aws:sagemaker:REGION:ACCOUNT:job/train-job",
+                "ModelArtifacts": {"S3ModelArtifacts": "s3://bucket/model.tar.gz"},
+                "TrainingJobStatus": "Completed",
+                "SecondaryStatus": "Completed",
+                "AlgorithmSpecification": {"TrainingInputMode": "File"},
+                "ResourceConfig": {
+                    "InstanceType": "ml.m5.xlarge",
+                    "InstanceCount": 1,
+                    "VolumeSizeInGB": 30,
+                },
+                "StoppingCondition": {},
+                "CreationTime": datetime.fromtimestamp(0),
+            },
+            {"TrainingJobName": "train-job"},
+        )
+        stubber.add_response(
+            "describe_processing_job",
+            get_processing_job("baseline-job", "monitoring_output"),
+            {"ProcessingJobName": "baseline-job"},
+        )
+
+        index = PipelineExecutionIndex.from_execution(
+            registry.sm_client, execution_arn, max_workers=1
+        )
+        assert index.get_model_artifact() == "s3://bucket/model.tar.gz"
+        assert (
+            index.get_processing_output("PreprocessData", "train")
+            == "s3://bucket/preprocess-job/train"
+        )
+        assert (
+            index.get_processing_output()
+            == "s3://bucket/baseline-job/monitoring_output"
+        )
+        with pytest.raises(Exception):
+            index.get_model_artifact("EvaluateModel")
+
+
+def test_cached_pipeline_execution_arn():
+    # Create model registry
+    registry = ModelRegistry()
+    model_package_arn = get_package(1)["ModelPackageArn"]
+
+    with Stubber(registry.sm_client) as stubber:
+        # Expect only a single lookup of the artifact for the same package
+        expected_params = {"SourceUri": model_package_arn}
+        expected_response = {
+            "ArtifactSummaries": [{"ArtifactArn": "arn:aws:sagemaker:artifact/1"}]
+        }
+        stubber.add_response("list_artifacts", expected_response, expected_params)
+        expected_params = {"ArtifactArn": "arn:aws:sagemaker:artifact/1"}
+        expected_response = {
+            "MetadataProperties": {"GeneratedBy": "arn:aws:sagemaker:execution/1"}
+        }
+        stubber.add_response("describe_artifact", expected_response, expected_params)
+
+        for _ in range(3):
+            response = registry.get_pipeline_execution_arn(model_package_arn)
+            assert response == "arn:aws:sagemaker:execution/1"
+        stubber.assert_no_pending_responses()
+
+
+def test_cached_lookups_expire_and_persist(tmp_path):
+    cache_path = str(tmp_path / "registry.cache")
+    registry = ModelRegistry(cache_ttl=300, cache_path=cache_path)
+    calls = []
+
+    def lookup():
+        calls.append(1)
+        return [get_package(1)]
+
+    # Cached values are copies so callers can not modify the cache
+    response = registry.get_cached("key", lookup)
+    response[0]["ModelPackageArn"] = "modified"
+    assert registry.get_cached("key", lookup) == [get_package(1)]
+    assert len(calls) == 1
+
+    # Another registry shares the on-disk cache
+    other = ModelRegistry(cache_ttl=300, cache_path=cache_path)
+    assert other.get_cached("key", lookup) == [get_package(1)]
+    assert len(calls) == 1
+
+    # Expired entries are looked up again
+    expired = ModelRegistry(cache_ttl=0)
+    expired.get_cached("key", lookup)
+    expired.get_cached("key", lookup)
+    assert len(calls) == 3
+
+    other.clear_cache()
+    assert ModelRegistry(cache_path=cache_path).cache == {}
+
+
+def test_concurrent_lookups_call_once():
+    registry = ModelRegistry()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def lookup():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return [get_package(1)]
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        first = executor.submit(registry.get_cached, "key", lookup)
+        started.wait(5)
+        others = [executor.submit(registry.get_cached, "key", lookup) for _ in range(3)]
+        release.set()
+        results = [first.result()] + [f.result() for f in others]
+    assert len(calls) == 1
+    assert all(r == [get_package(1)] for r in results)
+
+    # A failed lookup is raised to the waiting callers, and not cached
+    def fail():
+        raise ValueError("lookup failed")
+
+    with pytest.raises(ValueError):
+        registry.get_cached("failed", fail)
+    assert registry.get_cached("failed", lookup) == [get_package(1)]
+
+
+def test_filter_package_version_at_scale():
+    """
+    Select from 10k packages with many versions, preserving order and duplicates.
+    """
+    packages = [get_package(v) for v in range(10000, 0, -1)]
+    versions = list(range(1, 10001, 3)) + [5000, 1, 5000]
+
+    registry = ModelRegistry()
+    response = registry.select_versioned_packages(packages, versions)
+    assert len(response) == len(versions)
+    assert [p["ModelPackageVersion"] for p in response] == versions
+
+
+def test_get_versioned_approved_model_packages_at_scale():
+    """
+    Stop paging through 10k packages once all requested versions are found.
+    """
+    registry = ModelRegistry()
+    packages = [get_package(v) for v in range(10000, 0, -1)]
+    page_size = 100
+
+    with Stubber(registry.sm_client) as stubber:
+        # Versions 9950 and 9750 are in the first three pages only
+        for page in range(3):
+            expected_params = {
+                "ModelPackageGroupName": "test-package-group",
+                "ModelApprovalStatus": "Approved",
+                "SortBy": "CreationTime",
+                "MaxResults": page_size,
+            }
+            if page > 0:
+                expected_params["NextToken"] = f"MORE{page}"
+            expected_response = {
+                "ModelPackageSummaryList": packages[
+                    page * page_size : (page + 1) * page_size
+                ],
+                "NextToken": f"MORE{page + 1}",
+            }
+            stubber.add_response(
+                "list_model_packages", expected_response, expected_params
+            )
+
+        response = registry.get_versioned_approved_packages(
+            model_package_group_name="test-package-group",
+            model_package_versions=[9750, 9950, 9750],
+        )
+        stubber.assert_no_pending_responses()
+        assert response == [get_package(9750), get_package(9950), get_package(9750)]
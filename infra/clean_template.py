@@ -1,15 +1,288 @@
+import argparse
+import glob
 import json
 import logging
 import os
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 # Get environment variables
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
 
+# Matches the resource in a Fn::Sub variable like ${Resource} or ${Resource.Arn}
+SUB_VARIABLE_RE = re.compile(r"\$\{([^!.}][^.}]*)(\.[^}]*)?\}")
+
+# The template bytes for each worker of a process pool, as a worker takes around
+# 10 ms to start and a template around 150 ms per MB to transform
+MIN_WORKER_BYTES = 1 << 20
+
 # Configure logging
 logger = logging.getLogger()
 logger.setLevel(LOG_LEVEL)
 
 
+def get_depends_on(resource: dict) -> list:
+    """Returns the DependsOn of a resource as a list
+
+    Args:
+        resource (dict): The CloudFormation resource
+
+    Returns:
+        list: The logical ids the resource depends on
+    """
+    depends_on = resource.get("DependsOn", [])
+    return [depends_on] if isinstance(depends_on, str) else depends_on
+
+
+def find_references(value, references: set) -> set:
+    """Adds the logical ids referenced with Ref, Fn::GetAtt or Fn::Sub in a template value
+
+    Args:
+        value: The template value to search
+        references (set): The set to add references to
+
+    Returns:
+        set: The references
+    """
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            for k, v in value.items():
+                if k == "Ref" and isinstance(v, str):
+                    references.add(v)
+                elif k == "Fn::GetAtt":
+                    target = v[0] if isinstance(v, list) else v.split(".")[0]
+                    if isinstance(target, str):
+                        references.add(target)
+                elif k == "Fn::Sub":
+                    sub, variables = (v[0], v[1]) if isinstance(v, list) else (v, {})
+                    if isinstance(sub, str):
+                        references.update(
+                            m.group(1)
+                            for m in SUB_VARIABLE_RE.finditer(sub)
+                            if m.group(1) not in variables
+                        )
+                    stack.append(variables)
+                else:
+                    stack.append(v)
+        elif isinstance(value, list):
+            stack.extend(value)
+    return references
+
+
+class DependencyGraph:
+    """Dependency graph of the resources in a CloudFormation template
+
+    Edges are built once from the DependsOn, Ref, Fn::GetAtt and Fn::Sub of each
+    resource, and are indexed in reverse so the dependents of a resource are found
+    without scanning.
+    """
+
+    def __init__(self, template: dict):
+        self.resources = template.get("Resources", {})
+        self.depends_on = {}
+        self.references = {}
+        self.dependents = defaultdict(set)
+        for logical_id, resource in self.resources.items():
+            self.add_resource(logical_id, resource)
+
+    def add_resource(self, logical_id: str, resource: dict) -> None:
+        self.resources[logical_id] = resource
+        self.depends_on[logical_id] = set(get_depends_on(resource))
+        self.references[logical_id] = find_references(
+            resource.get("Properties", {}), set()
+        )
+        for target in self.depends_on[logical_id] | self.references[logical_id]:
+            self.dependents[target].add(logical_id)
+
+    def remove_edges(self, logical_id: str) -> None:
+        targets = self.depends_on.pop(logical_id) | self.references.pop(logical_id)
+        for target in targets:
+            self.dependents[target].discard(logical_id)
+
+    def remove_resource(self, logical_id: str) -> None:
+        self.remove_edges(logical_id)
+        del self.resources[logical_id]
+
+    def remove_depends_on(self, logical_id: str, targets: set) -> None:
+        """Removes the DependsOn edges from a resource to the targets"""
+        if self.depends_on[logical_id].isdisjoint(targets):
+            return
+        resource = self.resources[logical_id]
+        depends_on = [d for d in get_depends_on(resource) if d not in targets]
+        if len(depends_on) > 0:
+            resource["DependsOn"] = depends_on
+        else:
+            resource.pop("DependsOn", None)
+        for target in targets & self.depends_on[logical_id]:
+            self.depends_on[logical_id].discard(target)
+            if target not in self.references[logical_id]:
+                self.dependents[target].discard(logical_id)
+
+
+class RemoveResourceTypes:
+    """Removes the resources of the given types, and the DependsOn edges to them"""
+
+    def __init__(self, resource_types: list):
+        self.resource_types = set(resource_types)
+
+    def __call__(self, template: dict, graph: DependencyGraph) -> None:
+        removed = {
+            k
+            for k, r in graph.resources.items()
+            if r.get("Type") in self.resource_types
+        }
+        for logical_id in sorted(removed):
+            logger.debug(
+                "Removing %s %s", graph.resources[logical_id]["Type"], logical_id
+            )
+            graph.remove_resource(logical_id)
+        StripDependsOn(removed)(template, graph)
+        for logical_id in sorted(removed):
+            referenced_by = sorted(graph.dependents[logical_id])
+            if len(referenced_by) > 0:
+                logger.warning(
+                    f"Removed resource {logical_id} is referenced by {referenced_by}"
+                )
+
+
+class StripDependsOn:
+    """Strips the DependsOn edges to the given logical ids"""
+
+    def __init__(self, logical_ids: set):
+        self.logical_ids = set(logical_ids)
+
+    def __call__(self, template: dict, graph: DependencyGraph) -> None:
+        dependents = set()
+        for logical_id in self.logical_ids:
+            dependents.update(graph.dependents.get(logical_id, ()))
+        for dependent in sorted(dependents):
+            if dependent in graph.resources:
+                graph.remove_depends_on(dependent, self.logical_ids)
+
+
+class RewriteReferences:
+    """Rewrites the Ref, Fn::GetAtt and DependsOn targets with a logical id mapping"""
+
+    def __init__(self, mapping: dict):
+        self.mapping = dict(mapping)
+
+    def rewrite(self, value):
+        if isinstance(value, dict):
+            rewritten = {}
+            for k, v in value.items():
+                if k == "Ref" and isinstance(v, str):
+                    rewritten[k] = self.mapping.get(v, v)
+                elif k == "Fn::GetAtt" and isinstance(v, list) and len(v) > 0:
+                    rewritten[k] = [self.mapping.get(v[0], v[0])] + v[1:]
+                elif k == "Fn::GetAtt" and isinstance(v, str):
+                    target, _, attribute = v.partition(".")
+                    rewritten[k] = ".".join(
+                        [self.mapping.get(target, target), attribute]
+                    )
+                elif k == "Fn::Sub":
+                    if isinstance(v, list):
+                        rewritten[k] = [self.rewrite_sub(v[0])] + self.rewrite(v[1:])
+                    else:
+                        rewritten[k] = self.rewrite_sub(v)
+                else:
+                    rewritten[k] = self.rewrite(v)
+            return rewritten
+        elif isinstance(value, list):
+            return [self.rewrite(v) for v in value]
+        return value
+
+    def rewrite_sub(self, sub):
+        if not isinstance(sub, str):
+            return sub
+        return SUB_VARIABLE_RE.sub(
+            lambda m: "${"
+            + self.mapping.get(m.group(1), m.group(1))
+            + (m.group(2) or "")
+            + "}",
+            sub,
+        )
+
+    def __call__(self, template: dict, graph: DependencyGraph) -> None:
+        dependents = set()
+        for logical_id in self.mapping:
+            dependents.update(graph.dependents.get(logical_id, ()))
+        for dependent in sorted(dependents):
+            resource = graph.resources[dependent]
+            graph.remove_edges(dependent)
+            if "Properties" in resource:
+                resource["Properties"] = self.rewrite(resource["Properties"])
+            if "DependsOn" in resource:
+                resource["DependsOn"] = [
+                    self.mapping.get(d, d) for d in get_depends_on(resource)
+                ]
+            graph.add_resource(dependent, resource)
+        if "Outputs" in template:
+            template["Outputs"] = self.rewrite(template["Outputs"])
+
+
+class TemplateTransformer:
+    """Applies a list of transforms to CloudFormation json templates
+
+    The dependency graph is built once per template and kept up to date by the
+    transforms, so each transform only visits the resources it changes.
+    """
+
+    def __init__(self, transforms: list):
+        self.transforms = transforms
+
+    def transform(self, template: dict) -> dict:
+        graph = DependencyGraph(template)
+        for transform in self.transforms:
+            transform(template, graph)
+        return template
+
+    def transform_file(self, input_path: str, output_path: str = None) -> str:
+        with open(input_path, "r") as f:
+            template = json.load(f)
+        self.transform(template)
+        output_path = output_path or input_path
+        logger.info(f"Writing template to: {output_path}")
+        with open(output_path, "w") as f:
+            json.dump(template, f, indent=2)
+        return output_path
+
+    def transform_files(
+        self,
+        paths: list,
+        max_workers: int = None,
+        min_worker_bytes: int = MIN_WORKER_BYTES,
+    ) -> list:
+        """Transforms the templates in place, in parallel processes when they are large
+
+        A process pool is only faster when each worker has enough to transform to
+        outweigh starting it, so there is at most one worker per `min_worker_bytes`
+        of templates, and templates below that are transformed serially.
+
+        Args:
+            paths (list): The template paths
+            max_workers (int): The maximum number of processes, defaults to the cpu
+                count, where 1 transforms the templates serially in this process
+            min_worker_bytes (int): The template bytes for each process
+
+        Returns:
+            list: The transformed template paths
+        """
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        max_workers = min(
+            len(paths),
+            max_workers or os.cpu_count() or 1,
+            total_bytes // max(min_worker_bytes, 1),
+        )
+        logger.info(f"Transforming {len(paths)} templates with {max_workers} workers")
+        if max_workers <= 1:
+            return [self.transform_file(path) for path in paths]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self.transform_file, paths))
+
+
 def remove_policy(input_path: str, output_path: str):
     """Remove all IAM policies from a CloudFormation json template
 
@@ -18,35 +291,25 @@ def remove_policy(input_path: str, output_path: str):
 
     for reference, check https://github.com/aws/aws-cdk/issues/14887
     """
-    with open(input_path, "r") as f:
-        t = json.load(f)
-
-    # Remove policies
-    policy_list = [
-        k for k in t["Resources"] if t["Resources"][k]["Type"] == "AWS::IAM::Policy"
-    ]
-    for p in policy_list:
-        logger.debug(f"Removing Policy {p}")
-        del t["Resources"][p]
-
-    # Remove policy dependencies
-    depends_on = [k for k in t["Resources"] if "DependsOn" in t["Resources"][k]]
-    for d in depends_on:
-        for p in policy_list:
-            if p in t["Resources"][d]["DependsOn"]:
-                logger.debug(f"Removing DependsOn {p}")
-                t["Resources"][d]["DependsOn"].remove(p)
-        if len(t["Resources"][d]["DependsOn"]) == 0:
-            del t["Resources"][d]["DependsOn"]
-
-    # Save file back
-    logger.info(f"Writing template to: {output_path}")
-    with open(output_path, "w") as f:
-        json.dump(t, f, indent=2)
+    TemplateTransformer([RemoveResourceTypes(["AWS::IAM::Policy"])]).transform_file(
+        input_path, output_path
+    )
 
 
 if __name__ == "__main__":
-    remove_policy(
-        "cdk.out/drift-pipeline.template.json",
-        "cdk.out/drift-pipeline-clean.template.json",
+    parser = argparse.ArgumentParser(
+        description="Transform the CloudFormation templates in the cdk directory"
+    )
+    parser.add_argument("--cdk-dir", default="cdk.out")
+    parser.add_argument("--pattern", default="*.template.json")
+    parser.add_argument(
+        "--remove-type", action="append", default=None, dest="remove_types"
+    )
+    parser.add_argument("--max-workers", type=int, default=None)
+    args = parser.parse_args()
+    transformer = TemplateTransformer(
+        [RemoveResourceTypes(args.remove_types or ["AWS::IAM::Policy"])]
+    )
+    transformer.transform_files(
+        sorted(glob.glob(os.path.join(args.cdk_dir, args.pattern))), args.max_workers
     )
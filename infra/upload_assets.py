@@ -1,9 +1,19 @@
 import boto3
+import collections
 import glob
+import hashlib
 import json
 import logging
 import os
+import stat
+import struct
+import threading
+import time
 import zipfile
+import zlib
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 # Get environment variables
@@ -13,6 +23,15 @@ BUCKET_PREFIX = os.getenv("BUCKET_PREFIX")
 BUCKET_ACL = os.getenv("BUCKET_ACL", "public-read")
 GITHUB_REF = os.getenv("GITHUB_REF", "local")
 GITHUB_SHA = os.getenv("GITHUB_SHA", "local")
+MAX_WORKERS = int(os.getenv("MAX_WORKERS", 8))
+ZIP_COMPRESSION_LEVEL = int(os.getenv("ZIP_COMPRESSION_LEVEL", 6))
+
+# Zip entries use a fixed 1980-01-01 timestamp, the earliest dos date, and utf-8 names
+ZIP_FORMAT_VERSION = 1
+ZIP_DOS_TIME = 0
+ZIP_DOS_DATE = (1 << 5) | 1
+ZIP_UTF8_FLAG = 0x800
+ZIP_MAX_SIZE = 0xFFFFFFFF
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -21,9 +40,54 @@ logger.setLevel(LOG_LEVEL)
 # s3 client
 s3 = boto3.client("s3")
 
+# Transfer config shared by the uploads, which switches to multipart for large files
+transfer_config = TransferConfig(multipart_threshold=8 * 1024 * 1024, max_concurrency=4)
+
+
+class ProgressReport:
+    """Thread safe progress and throughput report for the asset uploads"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.uploaded = 0
+        self.skipped = 0
+        self.bytes_uploaded = 0
+        self.start_time = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_bytes(self, bytes_amount: int) -> None:
+        with self._lock:
+            self.bytes_uploaded += bytes_amount
+
+    def complete(self, object_key: str, skipped: bool) -> None:
+        with self._lock:
+            if skipped:
+                self.skipped += 1
+            else:
+                self.uploaded += 1
+            done = self.uploaded + self.skipped
+        status = "Skipped existing" if skipped else "Uploaded"
+        logger.info(f"[{done}/{self.total}] {status} asset: {object_key}")
+
+    def summary(self) -> dict:
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            "uploaded": self.uploaded,
+            "skipped": self.skipped,
+            "bytes": self.bytes_uploaded,
+            "seconds": elapsed,
+            "mb_per_second": self.bytes_uploaded / 1024 / 1024 / elapsed
+            if elapsed > 0
+            else 0.0,
+        }
+
 
 def upload_file(
-    file_path: str, bucket_name: str, object_key: str, content_type: str
+    file_path: str,
+    bucket_name: str,
+    object_key: str,
+    content_type: str,
+    callback=None,
 ) -> None:
     """Upload file to s3 setting extra ags for ContentType, ACL, and Metadata for git hash
 
@@ -32,6 +96,7 @@ def upload_file(
         bucket_name (str): Name of bucket
         object_key (str): Name of object key
         content_type (str): Content type
+        callback (callable): Optional callback with the bytes transferred
     """
     logger.info(f"Uploading asset s3://{bucket_name}/{object_key}")
     s3.upload_file(
@@ -43,11 +108,32 @@ def upload_file(
             "ACL": BUCKET_ACL,
             "Metadata": {"git_ref": GITHUB_REF, "git_sha": GITHUB_SHA},
         },
+        Config=transfer_config,
+        Callback=callback,
     )
 
 
+def object_exists(bucket_name: str, object_key: str) -> bool:
+    """Returns true if the object exists in s3
+
+    Args:
+        bucket_name (str): Name of bucket
+        object_key (str): Name of object key
+
+    Returns:
+        bool: True if the object exists
+    """
+    try:
+        s3.head_object(Bucket=bucket_name, Key=object_key)
+        return True
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+
 def zip_filter(filename: str) -> bool:
-    """Returns true if file and not in ignore list
+    """Returns true if not in ignore list
 
     Args:
         filename (str): file name
@@ -58,8 +144,7 @@ def zip_filter(filename: str) -> bool:
     dir_name = os.path.basename(os.path.dirname(filename))
     base_name = os.path.basename(filename)
     return (
-        os.path.isfile(filename)
-        and base_name not in [".DS_Store"]
+        base_name not in [".DS_Store"]
         and not dir_name == "cdk.out"
         and not dir_name == "__pycache__"
         and not filename.endswith(".pyc")
@@ -67,33 +152,225 @@ def zip_filter(filename: str) -> bool:
     )
 
 
-def make_zipfile(source_dir: str) -> str:
-    """Makes a zip file for the sourc directory
+def list_zip_files(source_dir: str) -> list:
+    """Lists the files to zip in sorted order, so the zip is reproducible
+
+    Args:
+        source_dir (str): The source directory to zip
+
+    Returns:
+        list: Returns the (filename, arcname, stat) for each file
+    """
+    zip_files = []
+    for root, dirs, files in os.walk(source_dir):
+        dirs.sort()
+        for file in sorted(files):
+            filename = os.path.join(root, file)
+            if zip_filter(filename):
+                st = os.stat(filename)
+                if stat.S_ISREG(st.st_mode):
+                    arcname = os.path.relpath(filename, source_dir)
+                    zip_files.append((filename, arcname.replace(os.sep, "/"), st))
+    return sorted(zip_files, key=lambda f: f[1])
+
+
+def get_manifest_hash(zip_files: list, compression_level: int) -> str:
+    """Gets a hash of the file names, sizes and modified times to zip
+
+    Args:
+        zip_files (list): The (filename, arcname, stat) for each file
+        compression_level (int): The compression level
+
+    Returns:
+        str: Returns the manifest hash
+    """
+    manifest = {
+        "version": ZIP_FORMAT_VERSION,
+        "compression_level": compression_level,
+        "files": [
+            [arcname, st.st_size, st.st_mtime_ns, st.st_mode]
+            for _, arcname, st in zip_files
+        ],
+    }
+    return hashlib.sha256(json.dumps(manifest).encode("utf-8")).hexdigest()
+
+
+def compress_file(filename: str, compression_level: int) -> tuple:
+    """Reads and deflates a file, returning the method, crc and sizes with the data
+
+    Args:
+        filename (str): The file to compress
+        compression_level (int): The compression level
+
+    Returns:
+        tuple: Returns the (compress_type, crc, file_size, data)
+    """
+    with open(filename, "rb") as f:
+        data = f.read()
+    crc = zlib.crc32(data)
+    # Raw deflate stream without the zlib header, as stored in zip files
+    compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    if len(compressed) < len(data):
+        return zipfile.ZIP_DEFLATED, crc, len(data), compressed
+    return zipfile.ZIP_STORED, crc, len(data), data
+
+
+def compress_files(filenames: list, compression_level: int, max_workers: int):
+    """Compresses files in parallel, yielding them in order as they complete
+
+    At most twice as many files as workers are read and compressed ahead of the
+    file being written, so the memory doesn't grow with the number of files.
+
+    Args:
+        filenames (list): The files to compress
+        compression_level (int): The compression level
+        max_workers (int): The number of files to compress concurrently
+
+    Returns:
+        generator: Yields the (compress_type, crc, file_size, data) of each file
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque()
+        for filename in filenames:
+            if len(pending) == 2 * max_workers:
+                yield pending.popleft().result()
+            pending.append(executor.submit(compress_file, filename, compression_level))
+        while pending:
+            yield pending.popleft().result()
+
+
+def write_zip(output_filename: str, zip_files: list, compression_level: int) -> None:
+    """Writes a reproducible zip, compressing the files in parallel
+
+    Entries are written in the sorted order with a fixed timestamp and permissions, so
+    the same files always produce the same zip.  Each entry is written as soon as it
+    and the entries before it are compressed.
+
+    Args:
+        output_filename (str): The zip file to write
+        zip_files (list): The (filename, arcname, stat) for each file
+        compression_level (int): The compression level
+    """
+    central_directory = []
+    with open(output_filename, "wb") as f:
+        compressed_files = compress_files(
+            [filename for filename, _, _ in zip_files],
+            compression_level,
+            os.cpu_count(),
+        )
+        for (_, arcname, st), compressed_file in zip(zip_files, compressed_files):
+            compress_type, crc, file_size, data = compressed_file
+            if f.tell() > ZIP_MAX_SIZE or file_size > ZIP_MAX_SIZE:
+                raise ValueError(f"Zip file too large: {output_filename}")
+            name = arcname.encode("utf-8")
+            mode = 0o755 if st.st_mode & stat.S_IXUSR else 0o644
+            header_offset = f.tell()
+            f.write(
+                struct.pack(
+                    "<4s2B4HL2L2H",
+                    b"PK\003\004",
+                    20,
+                    0,
+                    ZIP_UTF8_FLAG,
+                    compress_type,
+                    ZIP_DOS_TIME,
+                    ZIP_DOS_DATE,
+                    crc,
+                    len(data),
+                    file_size,
+                    len(name),
+                    0,
+                )
+            )
+            f.write(name)
+            f.write(data)
+            central_directory.append(
+                struct.pack(
+                    "<4s4B4HL2L5H2L",
+                    b"PK\001\002",
+                    20,
+                    3,
+                    20,
+                    0,
+                    ZIP_UTF8_FLAG,
+                    compress_type,
+                    ZIP_DOS_TIME,
+                    ZIP_DOS_DATE,
+                    crc,
+                    len(data),
+                    file_size,
+                    len(name),
+                    0,
+                    0,
+                    0,
+                    0,
+                    (stat.S_IFREG | mode) << 16,
+                    header_offset,
+                )
+                + name
+            )
+        central_directory_offset = f.tell()
+        for record in central_directory:
+            f.write(record)
+        f.write(
+            struct.pack(
+                "<4s4H2LH",
+                b"PK\005\006",
+                0,
+                0,
+                len(central_directory),
+                len(central_directory),
+                f.tell() - central_directory_offset,
+                central_directory_offset,
+                0,
+            )
+        )
+
+
+def make_zipfile(
+    source_dir: str, compression_level: int = ZIP_COMPRESSION_LEVEL
+) -> str:
+    """Makes a reproducible zip file for the source directory
+
+    The manifest hash of the files is saved alongside the zip, so an unchanged source
+    directory reuses the existing zip without re-zipping.
 
     Args:
         source_dir (str): The source directory to zip
+        compression_level (int): The compression level from 0 to 9
 
     Returns:
         str: Returns the zip filename created
     """
     output_filename = source_dir + ".zip"
-    with zipfile.ZipFile(output_filename, "w", zipfile.ZIP_DEFLATED) as zip:
-        for root, dirs, files in os.walk(source_dir):
-            for file in files:
-                filename = os.path.join(root, file)
-                if zip_filter(filename):
-                    arcname = os.path.join(os.path.relpath(root, source_dir), file)
-                    zip.write(filename, arcname)
+    manifest_filename = output_filename + ".manifest"
+    zip_files = list_zip_files(source_dir)
+    manifest_hash = get_manifest_hash(zip_files, compression_level)
+    if os.path.isfile(output_filename) and os.path.isfile(manifest_filename):
+        with open(manifest_filename, "r") as f:
+            if f.read() == manifest_hash:
+                logger.info(f"Reusing unchanged zip: {output_filename}")
+                return output_filename
+    write_zip(output_filename, zip_files, compression_level)
+    with open(manifest_filename, "w") as f:
+        f.write(manifest_hash)
     return output_filename
 
 
-def upload_assets(cdk_dir: str = "cdk.out") -> None:
-    """Parses the asset files in cdk directory and uploads resources to S3
+def get_assets(cdk_dir: str = "cdk.out") -> dict:
+    """Parses the asset files in cdk directory into unique assets by destination
+
+    Stacks that share a source reference the same asset hash, so are only uploaded once.
 
     Args:
         cdk_dir (str): The cdk directory
+
+    Returns:
+        dict: The asset source by destination bucket and object key
     """
-    for asset_path in glob.glob(f"{cdk_dir}/*.assets.json"):
+    assets = {}
+    for asset_path in sorted(glob.glob(f"{cdk_dir}/*.assets.json")):
         logger.debug(f"Processing asset: {asset_path}")
         with open(asset_path, "r") as f:
             asset = json.load(f)
@@ -101,18 +378,71 @@ def upload_assets(cdk_dir: str = "cdk.out") -> None:
             meta = asset["files"][key]
             # Get source info
             src = meta["source"]
-            file_path = os.path.join(cdk_dir, src["path"])
-            content_type = "application/json"
-            if src["packaging"] == "zip":
-                logger.info(f"Packaging zip: {file_path}")
-                file_path = make_zipfile(file_path)
-                content_type = "application/zip"
             # Get the destination
             dest = meta["destinations"]["current_account-current_region"]
-            bucket_name = dest["bucketName"]
-            object_key = dest["objectKey"]
-            # Upload file to s3
-            upload_file(file_path, bucket_name, object_key, content_type)
+            assets[(dest["bucketName"], dest["objectKey"])] = {
+                "file_path": os.path.join(cdk_dir, src["path"]),
+                "packaging": src.get("packaging", "file"),
+            }
+    return assets
+
+
+def upload_asset(
+    src: dict, bucket_name: str, object_key: str, progress: ProgressReport
+) -> None:
+    """Packages and uploads an asset, unless it already exists
+
+    The CDK object key is the hash of the asset source, so an existing object has the
+    same content and the asset doesn't need to be packaged or uploaded again.
+
+    Args:
+        src (dict): The asset source file path and packaging
+        bucket_name (str): Name of bucket
+        object_key (str): Name of object key
+        progress (ProgressReport): The upload progress report
+    """
+    if object_exists(bucket_name, object_key):
+        progress.complete(object_key, skipped=True)
+        return
+    file_path = src["file_path"]
+    content_type = "application/json"
+    if src["packaging"] == "zip":
+        logger.info(f"Packaging zip: {file_path}")
+        file_path = make_zipfile(file_path)
+        content_type = "application/zip"
+    # Upload file to s3
+    upload_file(
+        file_path, bucket_name, object_key, content_type, callback=progress.add_bytes
+    )
+    progress.complete(object_key, skipped=False)
+
+
+def upload_assets(cdk_dir: str = "cdk.out", max_workers: int = MAX_WORKERS) -> dict:
+    """Parses the asset files in cdk directory and uploads resources to S3 concurrently
+
+    Args:
+        cdk_dir (str): The cdk directory
+        max_workers (int): The number of assets to upload concurrently
+
+    Returns:
+        dict: The upload summary
+    """
+    assets = get_assets(cdk_dir)
+    progress = ProgressReport(len(assets))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(upload_asset, src, bucket_name, object_key, progress)
+            for (bucket_name, object_key), src in assets.items()
+        ]
+        for future in as_completed(futures):
+            future.result()
+    summary = progress.summary()
+    logger.info(
+        f"Uploaded {summary['uploaded']} and skipped {summary['skipped']} existing "
+        f"assets, {summary['bytes'] / 1024 / 1024:.1f} MB in "
+        f"{summary['seconds']:.1f}s ({summary['mb_per_second']:.1f} MB/s)"
+    )
+    return summary
 
 
 if __name__ == "__main__":
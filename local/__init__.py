@@ -0,0 +1 @@
+"""Runs the build and batch SageMaker pipelines locally, for development and profiling."""
@@ -0,0 +1,163 @@
+"""Local stand-ins for the AWS clients used by the pipeline scripts and lambdas.
+
+S3 objects are files under `<work-dir>/s3/<bucket>/<key>`, processing jobs are
+described by the `description.json` the runner writes for each job, and CloudWatch
+metrics are appended to `<work-dir>/metrics.jsonl`.  Only the calls made by the
+scripts in this repository are implemented.
+"""
+import functools
+import hashlib
+import io
+import json
+import os
+import types
+from urllib.parse import urlparse
+
+import boto3
+from botocore.exceptions import ClientError
+
+# The environment variable with the work directory of a local pipeline run
+WORK_DIR_ENV = "LOCAL_PIPELINE_DIR"
+
+
+class NoSuchKey(ClientError):
+    def __init__(self, key: str):
+        super().__init__(
+            {"Error": {"Code": "NoSuchKey", "Message": f"No such key: {key}"}},
+            "GetObject",
+        )
+
+
+def get_etag(path: str) -> str:
+    """Gets the ETag of a file as S3 would for a single part upload."""
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(functools.partial(f.read, 1 << 20), b""):
+            md5.update(block)
+    return f'"{md5.hexdigest()}"'
+
+
+class LocalS3:
+    """An S3 client over a directory with a sub directory per bucket.
+
+    Args:
+        root: The directory of the buckets.
+    """
+
+    exceptions = types.SimpleNamespace(NoSuchKey=NoSuchKey)
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def get_path(self, bucket: str, key: str) -> str:
+        return os.path.join(self.root, bucket, key)
+
+    def get_uri_path(self, uri: str) -> str:
+        """Gets the local path of an S3 uri, or returns a local path unchanged."""
+        url_parsed = urlparse(uri)
+        if url_parsed.scheme != "s3":
+            return uri
+        return self.get_path(url_parsed.netloc, url_parsed.path.lstrip("/"))
+
+    def get_uri(self, path: str) -> str:
+        bucket, _, key = os.path.relpath(path, self.root).partition(os.sep)
+        return f"s3://{bucket}/{key.replace(os.sep, '/')}"
+
+    def list_objects_v2(self, Bucket: str, Prefix: str = "", **kwargs) -> dict:
+        bucket_dir = self.get_path(Bucket, "")
+        # Walk from the deepest directory of the prefix, then filter by the prefix
+        prefix_dir = os.path.join(bucket_dir, os.path.dirname(Prefix))
+        contents = []
+        for dir_path, _, files in os.walk(prefix_dir):
+            for file in files:
+                path = os.path.join(dir_path, file)
+                key = os.path.relpath(path, bucket_dir).replace(os.sep, "/")
+                if key.startswith(Prefix):
+                    contents.append(
+                        {
+                            "Key": key,
+                            "ETag": get_etag(path),
+                            "Size": os.path.getsize(path),
+                        }
+                    )
+        response = {"KeyCount": len(contents), "IsTruncated": False}
+        if contents:
+            response["Contents"] = sorted(contents, key=lambda o: o["Key"])
+        return response
+
+    def get_paginator(self, operation_name: str):
+        if operation_name != "list_objects_v2":
+            raise ValueError(f"No local paginator for: {operation_name}")
+        return types.SimpleNamespace(
+            paginate=lambda **kwargs: iter([self.list_objects_v2(**kwargs)])
+        )
+
+    def head_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        path = self.get_path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise ClientError(
+                {"Error": {"Code": "404", "Message": "Not Found"}}, "HeadObject"
+            )
+        return {"ETag": get_etag(path), "ContentLength": os.path.getsize(path)}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs) -> dict:
+        path = self.get_path(Bucket, Key)
+        if not os.path.isfile(path):
+            raise NoSuchKey(Key)
+        with open(path, "rb") as f:
+            body = f.read()
+        return {"Body": io.BytesIO(body), "ContentLength": len(body)}
+
+    def put_object(self, Bucket: str, Key: str, Body, **kwargs) -> dict:
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        elif not isinstance(Body, bytes):
+            Body = Body.read()
+        path = self.get_path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(Body)
+        return {"ETag": f'"{hashlib.md5(Body).hexdigest()}"'}
+
+
+class LocalSageMaker:
+    """A SageMaker client that describes the processing jobs of a local run."""
+
+    def __init__(self, work_dir: str):
+        self.work_dir = work_dir
+
+    def describe_processing_job(self, ProcessingJobName: str) -> dict:
+        path = os.path.join(
+            self.work_dir, "jobs", ProcessingJobName, "description.json"
+        )
+        with open(path, "r") as f:
+            return json.load(f)
+
+
+class LocalCloudWatch:
+    """A CloudWatch client that appends the put metrics to a json lines file."""
+
+    def __init__(self, work_dir: str):
+        self.path = os.path.join(work_dir, "metrics.jsonl")
+
+    def put_metric_data(self, Namespace: str, MetricData: list) -> dict:
+        with open(self.path, "a") as f:
+            for metric in MetricData:
+                f.write(json.dumps({"Namespace": Namespace, **metric}, default=str))
+                f.write("\n")
+        return {}
+
+
+def get_client(work_dir: str, service_name: str, *args, **kwargs):
+    if service_name == "s3":
+        return LocalS3(os.path.join(work_dir, "s3"))
+    if service_name == "sagemaker":
+        return LocalSageMaker(work_dir)
+    if service_name == "cloudwatch":
+        return LocalCloudWatch(work_dir)
+    raise ValueError(f"No local stand-in for the {service_name} client")
+
+
+def install_clients(work_dir: str):
+    """Replaces `boto3.client` with the local stand-ins for a work directory."""
+    boto3.client = functools.partial(get_client, work_dir)
@@ -0,0 +1,181 @@
+"""Local stand-ins for the containers that run the pipeline steps.
+
+The local runner starts each step as a process running one of these commands, with
+the AWS clients replaced by the stand-ins in `local.aws`:
+
+* `script`: runs a processing script, as the ScriptProcessor containers do.
+* `model-monitor`: computes a baseline, or the drift against a baseline, with the
+  same statistics as `baseline.py` and `drift.py` in place of the Model Monitor
+  analyzer container.
+* `xgboost`: trains with the xgboost package in place of the built-in algorithm
+  container, from the hyperparameters and channels under a job directory.
+* `lambda`: invokes a lambda handler with an event.
+"""
+import argparse
+import glob
+import importlib.util
+import json
+import logging
+import os
+import pickle
+import runpy
+import sys
+
+from local.aws import install_clients, WORK_DIR_ENV
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# The chunk of rows read at once by the model monitor stand-in
+CHUNK_SIZE = 100000
+
+
+def run_script(path: str, args: list):
+    sys.argv = [path] + args
+    sys.path.insert(0, os.path.dirname(path))
+    runpy.run_path(path, run_name="__main__")
+
+
+def read_dataset(dataset_dir: str, header: bool):
+    """Reads the csv files of a dataset in chunks, naming headerless columns `_c<i>`."""
+    # Imported where used, so the lambda processes start without loading pandas
+    import pandas as pd
+
+    for file in sorted(glob.glob(f"{dataset_dir}/**/*.csv", recursive=True)):
+        for df in pd.read_csv(file, header=0 if header else None, chunksize=CHUNK_SIZE):
+            if not header:
+                df.columns = [f"_c{i}" for i in range(len(df.columns))]
+            yield df
+
+
+def write_json(path: str, value: dict):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(value, f)
+
+
+def run_model_monitor():
+    """Runs the analyzer over the dataset source, as configured by its environment."""
+    dataset_format = json.loads(os.environ["dataset_format"])
+    header = dataset_format.get("csv", {}).get("header", True)
+    dataset = read_dataset(os.environ["dataset_source"], header)
+    output_path = os.environ["output_path"]
+
+    if "baseline_statistics" in os.environ:
+        sys.path.insert(0, os.path.join(ROOT_DIR, "batch_pipeline", "pipelines"))
+        from drift import DriftAccumulator
+
+        with open(os.environ["baseline_statistics"], "r") as f:
+            accumulator = DriftAccumulator(json.load(f))
+        with open(os.environ["baseline_constraints"], "r") as f:
+            constraints = json.load(f)
+        for df in dataset:
+            accumulator.update(df)
+        logger.info(f"Computing drift for {accumulator.item_count} rows")
+        write_json(f"{output_path}/statistics.json", accumulator.statistics())
+        violations = accumulator.violations(constraints)
+        logger.info(f"Found {len(violations['violations'])} violations")
+        if len(violations["violations"]) > 0:
+            write_json(f"{output_path}/constraint_violations.json", violations)
+    else:
+        sys.path.insert(0, os.path.join(ROOT_DIR, "build_pipeline", "pipelines"))
+        from baseline import compute_partial, get_constraints, get_statistics
+        from baseline import merge_partials
+
+        statistics = get_statistics(
+            merge_partials([compute_partial(df) for df in dataset])
+        )
+        logger.info(f"Writing baseline for {statistics['dataset']['item_count']} rows")
+        write_json(f"{output_path}/statistics.json", statistics)
+        write_json(f"{output_path}/constraints.json", get_constraints(statistics))
+
+
+def parse_hyperparameter(value: str):
+    try:
+        return json.loads(value)
+    except ValueError:
+        return value
+
+
+def load_channel(channel_dir: str):
+    """Loads a headerless csv channel with the label in the first column."""
+    import pandas as pd
+    import xgboost
+
+    df = pd.concat(read_dataset(channel_dir, header=False), ignore_index=True)
+    return xgboost.DMatrix(df.iloc[:, 1:].values, label=df.iloc[:, 0].values)
+
+
+def train_xgboost(job_dir: str):
+    """Trains an xgboost booster like the built-in xgboost algorithm container.
+
+    Args:
+        job_dir: The job directory, laid out like `/opt/ml` with the hyperparameters
+            under `input/config` and a directory per channel under `input/data`.
+    """
+    import xgboost
+
+    with open(f"{job_dir}/input/config/hyperparameters.json", "r") as f:
+        params = {k: parse_hyperparameter(v) for k, v in json.load(f).items()}
+    num_round = params.pop("num_round")
+    early_stopping_rounds = params.pop("early_stopping_rounds", None)
+
+    # Early stopping uses the last evaluation set, which is the validation channel
+    evals = [(load_channel(f"{job_dir}/input/data/train"), "train")]
+    if os.path.isdir(f"{job_dir}/input/data/validation"):
+        evals += [(load_channel(f"{job_dir}/input/data/validation"), "validation")]
+    else:
+        early_stopping_rounds = None
+
+    booster = xgboost.train(
+        params,
+        evals[0][0],
+        num_boost_round=num_round,
+        evals=evals,
+        early_stopping_rounds=early_stopping_rounds,
+        verbose_eval=10,
+    )
+    os.makedirs(f"{job_dir}/model", exist_ok=True)
+    with open(f"{job_dir}/model/xgboost-model", "wb") as f:
+        pickle.dump(booster, f)
+
+
+def invoke_lambda(script: str, handler: str, event_path: str, output_path: str):
+    module_name, function_name = handler.rsplit(".", 1)
+    spec = importlib.util.spec_from_file_location(module_name, script)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    with open(event_path, "r") as f:
+        event = json.load(f)
+    response = getattr(module, function_name)(event, None)
+    with open(output_path, "w") as f:
+        json.dump(response, f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    script_parser = commands.add_parser("script")
+    script_parser.add_argument("path", type=str)
+    script_parser.add_argument("args", nargs=argparse.REMAINDER)
+    commands.add_parser("model-monitor")
+    xgboost_parser = commands.add_parser("xgboost")
+    xgboost_parser.add_argument("job_dir", type=str)
+    lambda_parser = commands.add_parser("lambda")
+    for name in ["script", "handler", "event_path", "output_path"]:
+        lambda_parser.add_argument(name, type=str)
+    args = parser.parse_args()
+
+    install_clients(os.environ[WORK_DIR_ENV])
+    # Processing scripts configure their own logging
+    if args.command != "script":
+        logging.basicConfig(level=logging.INFO)
+    if args.command == "script":
+        run_script(args.path, args.args)
+    elif args.command == "model-monitor":
+        run_model_monitor()
+    elif args.command == "xgboost":
+        train_xgboost(args.job_dir)
+    else:
+        invoke_lambda(args.script, args.handler, args.event_path, args.output_path)
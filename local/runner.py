@@ -0,0 +1,815 @@
+"""Runs the build or batch pipeline locally, with a process per step.
+
+Each step of the pipeline runs as a local process, with its inputs and outputs
+mapped to a job directory that mirrors `/opt/ml/processing`, and S3 uris mapped to
+`<work-dir>/s3/<bucket>/<key>`.  Steps start as soon as the steps they depend on
+complete, so independent steps such as the baseline and training jobs run in
+parallel.  The training, Model Monitor and lambda steps run the stand-ins in
+`local.containers`.
+
+Processing and training steps are cached by content in `<work-dir>/cache`, keyed by
+a hash of their code, configuration and the ETags of their input objects, and are
+skipped when the key and their outputs are unchanged, however old the entry is.
+
+Every step is timed, and the step timings and the critical path through the step
+dependencies are reported and written to `<work-dir>/run.json`.
+
+Usage:
+    python -m local.runner build --work-dir /tmp/drift
+    python -m local.runner batch --work-dir /tmp/drift --kwarg inline_drift=true
+"""
+import argparse
+import concurrent.futures
+import hashlib
+import importlib
+import json
+import logging
+import operator
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import time
+from unittest import mock
+
+from local.aws import get_etag, LocalS3, WORK_DIR_ENV
+
+logger = logging.getLogger(__name__)
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+# The container directory that processing inputs and outputs are mapped from
+PROCESSING_DIR = "/opt/ml/processing"
+MODEL_MONITOR_REPOSITORY = "sagemaker-model-monitor-analyzer"
+
+BUCKET = "local"
+ROLE_ARN = "arn:aws:iam::123456789012:role/local"
+
+PIPELINES = {
+    "build": {
+        "project": "build_pipeline",
+        "kwargs": {
+            "role": ROLE_ARN,
+            "pipeline_name": "drift-build",
+            "model_package_group_name": "drift",
+            "default_bucket": BUCKET,
+            "base_job_prefix": "drift",
+        },
+    },
+    "batch": {
+        "project": "batch_pipeline",
+        "kwargs": {
+            "role": ROLE_ARN,
+            "pipeline_name": "drift-batch",
+            "default_bucket": BUCKET,
+            "base_job_prefix": "drift",
+            "lambda_role_arn": ROLE_ARN,
+            "data_uri": f"s3://{BUCKET}/drift/batch",
+            "model_uri": f"s3://{BUCKET}/drift/model/model.tar.gz",
+            "transform_uri": f"s3://{BUCKET}/drift/transform",
+            "baseline_uri": f"s3://{BUCKET}/drift/baseline",
+        },
+    },
+}
+
+COMPARISONS = {
+    "Equals": operator.eq,
+    "GreaterThan": operator.gt,
+    "GreaterThanOrEqualTo": operator.ge,
+    "LessThan": operator.lt,
+    "LessThanOrEqualTo": operator.le,
+}
+
+STEP_REFERENCE_RE = re.compile(r"Steps\.([^.\[\]]+)")
+
+# The step types that run jobs, whose outputs are cached by content
+CACHED_STEP_TYPES = ["Processing", "Training"]
+
+
+def stub_upload(local_path, desired_s3_uri, *args, **kwargs):
+    return f"{desired_s3_uri}/{os.path.basename(local_path)}"
+
+
+def load_pipeline(project: str, region: str, **kwargs):
+    """Gets the pipeline of a project, with the calls that would reach AWS stubbed."""
+    # Projects share the package names of their modules, so drop any imported ones
+    for name in list(sys.modules):
+        if name.split(".")[0] in ("pipelines", "infra"):
+            del sys.modules[name]
+    # The project infra directories are namespace packages, which the infra package
+    # of the root directory would shadow
+    sys.path[:] = [os.path.join(ROOT_DIR, project)] + [
+        p for p in sys.path if os.path.abspath(p) != ROOT_DIR
+    ]
+    module = importlib.import_module("pipelines.pipeline")
+    with mock.patch(
+        "sagemaker.session.Session.default_bucket",
+        return_value=kwargs["default_bucket"],
+    ), mock.patch("sagemaker.s3.S3Uploader.upload", side_effect=stub_upload):
+        return module.get_pipeline(region=region, **kwargs)
+
+
+def to_expr(value):
+    """Replaces the parameters, properties and functions in a value by their expr."""
+    if hasattr(value, "expr"):
+        return value.expr
+    if isinstance(value, dict):
+        return {k: to_expr(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_expr(v) for v in value]
+    return value
+
+
+def flatten_steps(steps: list) -> list:
+    """Replaces the step collections in a list of steps by their steps."""
+    return [s for step in steps for s in getattr(step, "steps", [step])]
+
+
+def get_step_values(step) -> list:
+    """Gets the values of a step that can reference parameters or other steps."""
+    step_type = step.step_type.value
+    if step_type == "Processing":
+        return (
+            [i.source for i in step.inputs or []]
+            + [o.destination for o in step.outputs or []]
+            + list(step.job_arguments or [])
+            + list((step.processor.env or {}).values())
+        )
+    if step_type == "Training":
+        return [i.config for i in step.inputs.values()]
+    if step_type == "Model":
+        return [step.model.model_data]
+    if step_type == "Lambda":
+        return list(step.inputs.values())
+    if step_type == "Condition":
+        return [c.to_request() for c in step.conditions]
+    if step_type == "RegisterModel":
+        return [step.model_data, step.approval_status]
+    raise ValueError(f"No local runner for {step_type} step: {step.name}")
+
+
+def get_parameters(pipeline, overrides: dict) -> dict:
+    """Gets the pipeline parameter values, with the overrides cast to their type."""
+    overrides = dict(overrides)
+    values = {}
+    for parameter in pipeline.parameters:
+        value = overrides.pop(parameter.name, parameter.default_value)
+        if isinstance(value, str) and parameter.parameter_type.python_type != str:
+            value = json.loads(value)
+        values[parameter.name] = value
+    if overrides:
+        raise ValueError(f"Unknown pipeline parameters: {', '.join(overrides)}")
+    return values
+
+
+def copy_file(src: str, dst: str):
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    shutil.copyfile(src, dst)
+
+
+class LocalPipeline:
+    """Runs the steps of a pipeline as local processes in a work directory.
+
+    Args:
+        pipeline: The SageMaker pipeline.
+        work_dir: The directory of the local S3 buckets and the step jobs.
+        bucket: The bucket of the outputs of steps without an output destination.
+        parameters: Values to override the pipeline parameter defaults by name.
+        max_workers: The maximum number of steps run at once, by default all.
+        cache_dir: The directory of the step cache entries, or None to run all steps.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        work_dir: str,
+        bucket: str = BUCKET,
+        parameters: dict = None,
+        max_workers: int = None,
+        cache_dir: str = None,
+    ):
+        self.pipeline = pipeline
+        self.work_dir = os.path.abspath(work_dir)
+        self.s3 = LocalS3(os.path.join(self.work_dir, "s3"))
+        self.bucket = bucket
+        self.parameters = get_parameters(pipeline, parameters or {})
+        self.steps = {}
+        self.dependencies = {}
+        for step in flatten_steps(pipeline.steps):
+            self.add_step(step)
+        for name, dependencies in self.dependencies.items():
+            unknown = dependencies - set(self.steps)
+            if unknown:
+                raise ValueError(f"Step {name} depends on unknown steps: {unknown}")
+        # Like a pipeline execution, run all steps whose dependencies succeeded
+        self.max_workers = max_workers or len(self.steps)
+        self.properties = {name: {} for name in self.steps}
+        self.cache_dir = cache_dir
+        self.cache_hits = set()
+        self.job_names = {}
+        self.status = {}
+        self.timings = {}
+        self.wall_time = None
+        self.run_steps = {
+            "Processing": self.run_processing,
+            "Training": self.run_training,
+            "Model": self.run_create_model,
+            "Lambda": self.run_lambda,
+            "Condition": self.run_condition,
+            "RegisterModel": self.run_register_model,
+        }
+
+    def add_step(self, step, condition: str = None):
+        """Adds a step, and the steps of its branches if it is a condition step."""
+        references = json.dumps(to_expr(get_step_values(step)))
+        dependencies = set(STEP_REFERENCE_RE.findall(references))
+        # Steps can depend on other steps by name or by instance
+        dependencies |= {getattr(d, "name", d) for d in step.depends_on or []}
+        if condition is not None:
+            dependencies.add(condition)
+        self.steps[step.name] = step
+        self.dependencies[step.name] = dependencies
+        if step.step_type.value == "Condition":
+            for branch_step in flatten_steps(step.if_steps + step.else_steps):
+                self.add_step(branch_step, step.name)
+
+    def get(self, path: str):
+        if path.startswith("Parameters."):
+            return self.parameters[path[len("Parameters.") :]]
+        match = re.match(r"Steps\.([^.]+)\.(.+)", path)
+        if match is None or match.group(2) not in self.properties[match.group(1)]:
+            raise ValueError(f"No value for {path} in the local run")
+        return self.properties[match.group(1)][match.group(2)]
+
+    def resolve(self, value):
+        """Resolves the parameters, properties and functions in a value."""
+        expr = to_expr(value)
+        if isinstance(expr, list):
+            return [self.resolve(v) for v in expr]
+        if not isinstance(expr, dict):
+            return expr
+        if "Get" in expr:
+            return self.get(expr["Get"])
+        if "Std:Join" in expr:
+            join = expr["Std:Join"]
+            return join["On"].join(str(self.resolve(v)) for v in join["Values"])
+        if "Std:JsonGet" in expr:
+            json_get = expr["Std:JsonGet"]
+            with open(self.resolve(json_get["PropertyFile"]), "r") as f:
+                value = json.load(f)
+            for part in re.findall(r"[^.\[\]]+", json_get["Path"]):
+                value = value[int(part)] if isinstance(value, list) else value[part]
+            return value
+        return {k: self.resolve(v) for k, v in expr.items()}
+
+    def evaluate(self, condition: dict) -> bool:
+        condition_type = condition["Type"]
+        if condition_type in COMPARISONS:
+            return COMPARISONS[condition_type](
+                self.resolve(condition["LeftValue"]),
+                self.resolve(condition["RightValue"]),
+            )
+        if condition_type == "In":
+            values = [self.resolve(v) for v in condition["Values"]]
+            return self.resolve(condition["QueryValue"]) in values
+        if condition_type == "Not":
+            return not self.evaluate(condition["Expression"])
+        if condition_type == "Or":
+            return any(self.evaluate(c) for c in condition["Conditions"])
+        raise ValueError(f"Unsupported condition type: {condition_type}")
+
+    def get_job_name(self, name: str) -> str:
+        return self.job_names.get(name, name)
+
+    def get_job_dir(self, job_name: str) -> str:
+        job_dir = os.path.join(self.work_dir, "jobs", job_name)
+        shutil.rmtree(job_dir, ignore_errors=True)
+        os.makedirs(job_dir)
+        return job_dir
+
+    def download(self, uri: str, local_dir: str, s3_data_type: str = "S3Prefix"):
+        """Copies the objects under an S3 prefix, or listed in a manifest, to a dir."""
+        os.makedirs(local_dir, exist_ok=True)
+        if s3_data_type == "ManifestFile":
+            with open(self.s3.get_uri_path(uri), "r") as f:
+                manifest = json.load(f)
+            prefix = manifest[0]["prefix"]
+            for key in manifest[1:]:
+                copy_file(
+                    self.s3.get_uri_path(prefix + key), os.path.join(local_dir, key)
+                )
+            return
+        path = self.s3.get_uri_path(uri)
+        if os.path.isfile(path):
+            copy_file(path, os.path.join(local_dir, os.path.basename(path)))
+        elif os.path.isdir(path):
+            for dir_path, _, files in os.walk(path):
+                for file in files:
+                    src = os.path.join(dir_path, file)
+                    copy_file(src, os.path.join(local_dir, os.path.relpath(src, path)))
+        else:
+            raise FileNotFoundError(f"No input data at {uri}")
+
+    def upload(self, local_dir: str, uri: str):
+        """Moves the files of a job output directory to the objects under a uri."""
+        path = self.s3.get_uri_path(uri)
+        for dir_path, _, files in os.walk(local_dir):
+            for file in files:
+                src = os.path.join(dir_path, file)
+                dst = os.path.join(path, os.path.relpath(src, local_dir))
+                os.makedirs(os.path.dirname(dst), exist_ok=True)
+                os.replace(src, dst)
+
+    def call(self, job_dir: str, command: list, env: dict = None, cwd: str = None):
+        """Runs a `local.containers` command as a process, logging to the job dir."""
+        python_path = [ROOT_DIR] + os.environ.get("PYTHONPATH", "").split(os.pathsep)
+        env = {
+            **os.environ,
+            **(env or {}),
+            WORK_DIR_ENV: self.work_dir,
+            "PYTHONPATH": os.pathsep.join(p for p in python_path if p),
+        }
+        log_path = os.path.join(job_dir, "output.log")
+        with open(log_path, "w") as log:
+            result = subprocess.run(
+                [sys.executable, "-m", "local.containers"] + command,
+                cwd=cwd or job_dir,
+                env=env,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        if result.returncode != 0:
+            raise RuntimeError(
+                f"Exited with code {result.returncode}, see the log at {log_path}"
+            )
+
+    def stage_processing_inputs(self, step, processing_dir: str, relocate) -> list:
+        """Downloads the inputs and code of a processing step into its job directory.
+
+        Returns:
+            The command that runs the step.
+        """
+        for processing_input in step.inputs or []:
+            self.download(
+                self.resolve(processing_input.source),
+                relocate(processing_input.destination),
+                processing_input.s3_data_type,
+            )
+        for output in step.outputs or []:
+            os.makedirs(relocate(output.source), exist_ok=True)
+
+        if step.code is not None:
+            code_path = os.path.join(
+                processing_dir, "input", "code", os.path.basename(step.code)
+            )
+            copy_file(step.code, code_path)
+            arguments = [relocate(a) for a in step.job_arguments or []]
+            return ["script", code_path] + arguments
+        if MODEL_MONITOR_REPOSITORY in step.processor.image_uri:
+            return ["model-monitor"]
+        raise ValueError(f"No local stand-in for: {step.processor.image_uri}")
+
+    def upload_processing_outputs(self, step, job_name: str, relocate) -> list:
+        """Uploads the outputs of a processing step and sets their uri properties.
+
+        Outputs go to their destination, or to a default uri in the bucket.
+
+        Returns:
+            The outputs of the job description.
+        """
+        outputs = []
+        for output in step.outputs or []:
+            uri = self.resolve(output.destination)
+            if uri is None:
+                uri = f"s3://{self.bucket}/{self.pipeline.name}/{job_name}/{output.output_name}"
+            self.upload(relocate(output.source), uri)
+            self.properties[step.name][
+                f"ProcessingOutputConfig.Outputs['{output.output_name}'].S3Output.S3Uri"
+            ] = uri
+            outputs.append(
+                {"OutputName": output.output_name, "S3Output": {"S3Uri": uri}}
+            )
+        return outputs
+
+    def run_processing(self, step):
+        job_name = self.get_job_name(step.name)
+        job_dir = self.get_job_dir(job_name)
+        processing_dir = os.path.join(job_dir, "processing")
+
+        def relocate(value) -> str:
+            return str(self.resolve(value)).replace(PROCESSING_DIR, processing_dir)
+
+        command = self.stage_processing_inputs(step, processing_dir, relocate)
+        env = {k: relocate(v) for k, v in (step.processor.env or {}).items()}
+        env["PROCESSING_DIR"] = processing_dir
+        description = {
+            "ProcessingJobName": job_name,
+            "ProcessingJobStatus": "Completed",
+            "ExitMessage": "",
+            "ProcessingOutputConfig": {"Outputs": []},
+        }
+        work_dir = os.path.join(job_dir, "work")
+        os.makedirs(work_dir)
+        description_path = os.path.join(job_dir, "description.json")
+        self.properties[step.name]["ProcessingJobName"] = job_name
+        try:
+            self.call(job_dir, command, env, cwd=work_dir)
+        except RuntimeError as e:
+            description.update(ProcessingJobStatus="Failed", ExitMessage=str(e))
+            with open(description_path, "w") as f:
+                json.dump(description, f)
+            raise
+
+        description["ProcessingOutputConfig"][
+            "Outputs"
+        ] = self.upload_processing_outputs(step, job_name, relocate)
+        with open(description_path, "w") as f:
+            json.dump(description, f)
+
+        for property_file in step.property_files or []:
+            uri = self.properties[step.name][
+                f"ProcessingOutputConfig.Outputs['{property_file.output_name}'].S3Output.S3Uri"
+            ]
+            self.properties[step.name][
+                f"PropertyFiles.{property_file.name}"
+            ] = os.path.join(self.s3.get_uri_path(uri), property_file.path)
+
+    def run_training(self, step):
+        if "xgboost" not in step.estimator.image_uri:
+            raise ValueError(f"No local stand-in for: {step.estimator.image_uri}")
+        job_name = self.get_job_name(step.name)
+        job_dir = self.get_job_dir(job_name)
+        for channel, training_input in step.inputs.items():
+            s3_data_source = training_input.config["DataSource"]["S3DataSource"]
+            self.download(
+                self.resolve(s3_data_source["S3Uri"]),
+                os.path.join(job_dir, "input", "data", channel),
+                s3_data_source["S3DataType"],
+            )
+        # Hyperparameters are passed to the container as strings
+        hyperparameters = {
+            k: str(self.resolve(v)) for k, v in step.estimator.hyperparameters().items()
+        }
+        os.makedirs(os.path.join(job_dir, "input", "config"))
+        with open(f"{job_dir}/input/config/hyperparameters.json", "w") as f:
+            json.dump(hyperparameters, f)
+
+        self.call(job_dir, ["xgboost", job_dir])
+
+        # Package the model directory as the model artifacts
+        model_path = os.path.join(job_dir, "output", "model.tar.gz")
+        os.makedirs(os.path.dirname(model_path))
+        with tarfile.open(model_path, "w:gz") as tar:
+            for file in os.listdir(os.path.join(job_dir, "model")):
+                tar.add(os.path.join(job_dir, "model", file), arcname=file)
+        output_path = self.resolve(step.estimator.output_path)
+        output_uri = f"{output_path.rstrip('/')}/{job_name}/output"
+        self.upload(os.path.dirname(model_path), output_uri)
+        self.properties[step.name].update(
+            {
+                "TrainingJobName": job_name,
+                "ModelArtifacts.S3ModelArtifacts": f"{output_uri}/model.tar.gz",
+            }
+        )
+
+    def run_create_model(self, step):
+        model_data = self.resolve(step.model.model_data)
+        if not os.path.isfile(self.s3.get_uri_path(model_data)):
+            raise FileNotFoundError(f"No model data at {model_data}")
+        self.properties[step.name]["ModelName"] = f"{self.pipeline.name}-{step.name}"
+
+    def run_lambda(self, step):
+        if step.lambda_func.script is None:
+            raise ValueError(f"No local script for lambda step: {step.name}")
+        job_dir = self.get_job_dir(step.name)
+        event_path = os.path.join(job_dir, "event.json")
+        response_path = os.path.join(job_dir, "response.json")
+        with open(event_path, "w") as f:
+            json.dump({k: self.resolve(v) for k, v in step.inputs.items()}, f)
+
+        self.call(
+            job_dir,
+            [
+                "lambda",
+                step.lambda_func.script,
+                step.lambda_func.handler,
+                event_path,
+                response_path,
+            ],
+        )
+
+        with open(response_path, "r") as f:
+            response = json.load(f)
+        for output in step.outputs:
+            self.properties[step.name][
+                f"OutputParameters['{output.output_name}']"
+            ] = response.get(output.output_name)
+
+    def run_condition(self, step):
+        outcome = all(self.evaluate(c.to_request()) for c in step.conditions)
+        logger.info(f"Condition {step.name} evaluated to {outcome}")
+        self.properties[step.name]["Outcome"] = outcome
+
+    def run_register_model(self, step):
+        registry_path = os.path.join(
+            self.work_dir, "model-registry", f"{step.model_package_group_name}.jsonl"
+        )
+        os.makedirs(os.path.dirname(registry_path), exist_ok=True)
+        version = 1
+        if os.path.exists(registry_path):
+            with open(registry_path, "r") as f:
+                version += sum(1 for _ in f)
+        model_package_arn = (
+            f"arn:aws:sagemaker:local:123456789012:model-package/"
+            f"{step.model_package_group_name}/{version}"
+        )
+        model_package = {
+            "ModelPackageArn": model_package_arn,
+            "ModelPackageVersion": version,
+            "ModelApprovalStatus": self.resolve(step.approval_status),
+            "ModelDataUrl": self.resolve(step.model_data),
+            "ImageUri": step.image_uri or step.estimator.image_uri,
+        }
+        if step.model_metrics is not None:
+            model_package["ModelMetrics"] = step.model_metrics._to_request_dict()
+        with open(registry_path, "a") as f:
+            f.write(json.dumps(model_package) + "\n")
+        self.properties[step.name]["ModelPackageArn"] = model_package_arn
+
+    def get_fingerprint(self, uri: str) -> list:
+        """Gets the relative path and ETag of each object under a uri or local path."""
+        path = self.s3.get_uri_path(uri)
+        if os.path.isfile(path):
+            return [[os.path.basename(path), get_etag(path)]]
+        fingerprint = []
+        for dir_path, _, files in os.walk(path):
+            for file in files:
+                file_path = os.path.join(dir_path, file)
+                fingerprint.append(
+                    [os.path.relpath(file_path, path), get_etag(file_path)]
+                )
+        return sorted(fingerprint)
+
+    def get_input_fingerprint(self, uri: str, s3_data_type: str) -> list:
+        if s3_data_type != "ManifestFile":
+            return self.get_fingerprint(uri)
+        with open(self.s3.get_uri_path(uri), "r") as f:
+            manifest = json.load(f)
+        prefix = manifest[0]["prefix"]
+        return [
+            [key, get_etag(self.s3.get_uri_path(prefix + key))] for key in manifest[1:]
+        ]
+
+    def get_cache_key(self, step) -> str:
+        """Gets the content hash of the configuration and input objects of a job step.
+
+        Output destinations are left out of the key, as they can include the time the
+        pipeline was defined, so a cached step keeps the outputs it was run with.
+        """
+        if step.step_type.value == "Processing":
+            config = {
+                "image_uri": step.processor.image_uri,
+                "code": get_etag(step.code) if step.code is not None else None,
+                "arguments": self.resolve(list(step.job_arguments or [])),
+                "env": self.resolve(step.processor.env or {}),
+                "inputs": [
+                    [
+                        i.destination,
+                        self.get_input_fingerprint(
+                            self.resolve(i.source), i.s3_data_type
+                        ),
+                    ]
+                    for i in step.inputs or []
+                ],
+                "outputs": [[o.output_name, o.source] for o in step.outputs or []],
+            }
+        else:
+            config = {
+                "image_uri": step.estimator.image_uri,
+                "hyperparameters": self.resolve(step.estimator.hyperparameters()),
+                "output_path": self.resolve(step.estimator.output_path),
+                "inputs": {
+                    channel: self.get_input_fingerprint(
+                        self.resolve(i.config["DataSource"]["S3DataSource"]["S3Uri"]),
+                        i.config["DataSource"]["S3DataSource"]["S3DataType"],
+                    )
+                    for channel, i in step.inputs.items()
+                },
+            }
+        key = json.dumps([step.step_type.value, config], sort_keys=True, default=str)
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def restore(self, name: str, key: str) -> bool:
+        """Restores the properties of a cached step, if its outputs are unchanged."""
+        path = os.path.join(self.cache_dir, f"{key}.json")
+        if not os.path.exists(path):
+            return False
+        with open(path, "r") as f:
+            entry = json.load(f)
+        for uri, fingerprint in entry["outputs"].items():
+            if self.get_fingerprint(uri) != fingerprint:
+                logger.info(f"Not using cached step {name}, its output {uri} changed")
+                return False
+        self.properties[name] = entry["properties"]
+        return True
+
+    def save(self, name: str, key: str):
+        outputs = {
+            uri: self.get_fingerprint(uri)
+            for uri in self.properties[name].values()
+            if isinstance(uri, str) and uri.startswith("s3://")
+        }
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(os.path.join(self.cache_dir, f"{key}.json"), "w") as f:
+            json.dump(
+                {"step": name, "properties": self.properties[name], "outputs": outputs},
+                f,
+            )
+
+    def run_cached(self, step):
+        """Runs a job step, unless its outputs are cached for the same key."""
+        key = self.get_cache_key(step)
+        # Name the job by its key, so the outputs of other cached jobs are kept
+        self.job_names[step.name] = f"{step.name}-{key[:12]}"
+        if self.restore(step.name, key):
+            logger.info(f"Using the cached outputs of step {step.name}")
+            self.cache_hits.add(step.name)
+            return
+        self.run_steps[step.step_type.value](step)
+        self.save(step.name, key)
+
+    def run_step(self, name: str):
+        step = self.steps[name]
+        logger.info(f"Starting step {name}")
+        start = time.perf_counter()
+        try:
+            if self.cache_dir is not None and step.step_type.value in CACHED_STEP_TYPES:
+                self.run_cached(step)
+            else:
+                self.run_steps[step.step_type.value](step)
+        finally:
+            end = time.perf_counter()
+            self.timings[name] = {
+                "start": start - self.start_time,
+                "end": end - self.start_time,
+                "duration": end - start,
+            }
+        logger.info(f"Completed step {name} in {end - start:.1f}s")
+
+    def get_ready_steps(self) -> list:
+        """Gets the steps whose dependencies succeeded, skipping steps after skips."""
+        ready = []
+        changed = True
+        while changed:
+            changed = False
+            for name, dependencies in self.dependencies.items():
+                if name in self.status:
+                    continue
+                statuses = [self.status.get(d) for d in dependencies]
+                if "Skipped" in statuses:
+                    self.status[name] = "Skipped"
+                    changed = True
+                elif all(s == "Succeeded" for s in statuses):
+                    self.status[name] = "Executing"
+                    ready.append(name)
+        return ready
+
+    def skip_branch(self, step):
+        """Skips the steps of the branch of a condition step that was not taken."""
+        outcome = self.properties[step.name]["Outcome"]
+        for branch_step in flatten_steps(step.else_steps if outcome else step.if_steps):
+            self.status[branch_step.name] = "Skipped"
+
+    def run(self) -> bool:
+        """Runs the steps in parallel as their dependencies succeed.
+
+        Like a pipeline execution, no more steps are started after a step fails.
+
+        Returns:
+            Whether all steps succeeded or were skipped.
+        """
+        os.makedirs(self.work_dir, exist_ok=True)
+        self.start_time = time.perf_counter()
+        failed = False
+        running = {}
+        with concurrent.futures.ThreadPoolExecutor(self.max_workers) as executor:
+            while True:
+                if not failed:
+                    for name in self.get_ready_steps():
+                        running[executor.submit(self.run_step, name)] = name
+                if not running:
+                    break
+                done, _ = concurrent.futures.wait(
+                    running, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                        self.status[name] = "Succeeded"
+                        if self.steps[name].step_type.value == "Condition":
+                            self.skip_branch(self.steps[name])
+                    except Exception as e:
+                        logger.error(f"Step {name} failed: {e}")
+                        self.status[name] = "Failed"
+                        failed = True
+        self.wall_time = time.perf_counter() - self.start_time
+        for name in self.steps:
+            self.status.setdefault(name, "NotStarted")
+        return not failed
+
+    def get_critical_path(self) -> list:
+        """Gets the chain of dependent steps that were run with the longest duration."""
+        finish, previous = {}, {}
+        for name in sorted(self.timings, key=lambda n: self.timings[n]["end"]):
+            # Dependencies always end before their dependent steps start
+            dependencies = [d for d in self.dependencies[name] if d in finish]
+            previous[name] = max(dependencies, key=finish.get, default=None)
+            start = finish[previous[name]] if previous[name] is not None else 0
+            finish[name] = start + self.timings[name]["duration"]
+        path = []
+        name = max(finish, key=finish.get, default=None)
+        while name is not None:
+            path.insert(0, name)
+            name = previous[name]
+        return path
+
+    def summary(self) -> dict:
+        critical_path = self.get_critical_path()
+        return {
+            "pipeline": self.pipeline.name,
+            "parameters": self.parameters,
+            "wall_time": self.wall_time,
+            "steps": {
+                name: {
+                    "status": self.status[name],
+                    "cached": name in self.cache_hits,
+                    "depends_on": sorted(self.dependencies[name]),
+                    **self.timings.get(name, {}),
+                }
+                for name in self.steps
+            },
+            "critical_path": critical_path,
+            "critical_path_time": sum(
+                self.timings[name]["duration"] for name in critical_path
+            ),
+        }
+
+    def report(self) -> str:
+        summary = self.summary()
+        lines = [f"{'step':<24} {'status':<12} {'start s':>8} {'duration s':>10}"]
+        for name, step in summary["steps"].items():
+            status = "Cached" if step["cached"] else step["status"]
+            start = f"{step['start']:.1f}" if "start" in step else "-"
+            duration = f"{step['duration']:.1f}" if "duration" in step else "-"
+            lines.append(f"{name:<24} {status:<12} {start:>8} {duration:>10}")
+        lines.append(
+            f"\nCritical path: {' -> '.join(summary['critical_path'])} "
+            f"({summary['critical_path_time']:.1f}s of {summary['wall_time']:.1f}s wall time)"
+        )
+        return "\n".join(lines)
+
+
+def parse_assignments(assignments: list, parse_values: bool = False) -> dict:
+    values = {}
+    for assignment in assignments:
+        name, _, value = assignment.partition("=")
+        if parse_values:
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        values[name] = value
+    return values
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pipeline", type=str, choices=PIPELINES)
+    parser.add_argument("--work-dir", type=str, required=True)
+    parser.add_argument("--region", type=str, default="us-east-1")
+    # Pipeline parameter overrides, and get_pipeline keyword arguments as json
+    parser.add_argument("--parameter", action="append", default=[])
+    parser.add_argument("--kwarg", action="append", default=[])
+    parser.add_argument("--max-workers", type=int, default=None)
+    parser.add_argument("--no-cache", action="store_false", dest="cache")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    config = PIPELINES[args.pipeline]
+    kwargs = {**config["kwargs"], **parse_assignments(args.kwarg, parse_values=True)}
+    local_pipeline = LocalPipeline(
+        load_pipeline(config["project"], args.region, **kwargs),
+        args.work_dir,
+        bucket=kwargs["default_bucket"],
+        parameters=parse_assignments(args.parameter),
+        max_workers=args.max_workers,
+        cache_dir=os.path.join(args.work_dir, "cache") if args.cache else None,
+    )
+    succeeded = local_pipeline.run()
+    with open(os.path.join(local_pipeline.work_dir, "run.json"), "w") as f:
+        json.dump(local_pipeline.summary(), f, indent=2)
+    print(local_pipeline.report())
+    sys.exit(0 if succeeded else 1)
@@ -0,0 +1,134 @@
+import boto3
+import pytest
+from sagemaker.processing import ProcessingInput, ProcessingOutput, ScriptProcessor
+from sagemaker.session import Session
+from sagemaker.workflow.condition_step import ConditionStep
+from sagemaker.workflow.conditions import ConditionGreaterThan
+from sagemaker.workflow.parameters import ParameterInteger
+from sagemaker.workflow.pipeline import Pipeline
+from sagemaker.workflow.steps import ProcessingStep
+
+from local.aws import LocalS3
+from local.runner import LocalPipeline
+
+
+def test_local_s3(tmp_path):
+    s3 = LocalS3(str(tmp_path))
+    s3.put_object(Bucket="bucket", Key="data/2021-06-01.csv", Body=b"a,b\n1,2\n")
+    s3.put_object(Bucket="bucket", Key="data/2021-06-02.csv", Body="a,b\n3,4\n")
+    s3.put_object(Bucket="bucket", Key="database.csv", Body=b"")
+
+    pages = s3.get_paginator("list_objects_v2").paginate(
+        Bucket="bucket", Prefix="data/"
+    )
+    keys = [o["Key"] for page in pages for o in page["Contents"]]
+    assert keys == ["data/2021-06-01.csv", "data/2021-06-02.csv"]
+    # Prefixes match keys, not only directories
+    assert s3.list_objects_v2(Bucket="bucket", Prefix="data")["KeyCount"] == 3
+    response = s3.get_object(Bucket="bucket", Key="data/2021-06-02.csv")
+    assert response["Body"].read() == b"a,b\n3,4\n"
+    assert s3.get_uri_path("s3://bucket/data") == str(tmp_path / "bucket" / "data")
+    with pytest.raises(s3.exceptions.NoSuchKey):
+        s3.get_object(Bucket="bucket", Key="data/missing.csv")
+
+
+def get_session() -> Session:
+    # Pass the region, so the session doesn't depend on the local AWS configuration
+    return Session(boto3.Session(region_name="us-east-1"))
+
+
+def get_pipeline():
+    threshold = ParameterInteger(name="Threshold", default_value=1)
+    step_if = ConditionStep(
+        name="If", conditions=[ConditionGreaterThan(left=threshold, right=0)]
+    )
+    step_else = ConditionStep(
+        name="Else", conditions=[ConditionGreaterThan(left=threshold, right=0)]
+    )
+    step_check = ConditionStep(
+        name="Check",
+        conditions=[ConditionGreaterThan(left=threshold, right=0)],
+        if_steps=[step_if],
+        else_steps=[step_else],
+    )
+    step_after = ConditionStep(
+        name="After",
+        conditions=[ConditionGreaterThan(left=threshold, right=0)],
+        depends_on=["Else"],
+    )
+    return Pipeline(
+        name="local",
+        parameters=[threshold],
+        steps=[step_check, step_after],
+        sagemaker_session=get_session(),
+    )
+
+
+@pytest.mark.parametrize(
+    "threshold,taken,skipped",
+    [("1", "If", ["Else", "After"]), ("0", "Else", ["If"])],
+)
+def test_condition_branches(tmp_path, threshold, taken, skipped):
+    local_pipeline = LocalPipeline(
+        get_pipeline(), str(tmp_path), parameters={"Threshold": threshold}
+    )
+    assert local_pipeline.dependencies["If"] == {"Check"}
+    assert local_pipeline.run()
+    assert local_pipeline.status[taken] == "Succeeded"
+    assert all(local_pipeline.status[name] == "Skipped" for name in skipped)
+    assert local_pipeline.get_critical_path()[:2] == ["Check", taken]
+
+
+def test_unknown_parameter(tmp_path):
+    with pytest.raises(ValueError):
+        LocalPipeline(get_pipeline(), str(tmp_path), parameters={"Unknown": "1"})
+
+
+def test_step_cache(tmp_path):
+    script = tmp_path / "count.py"
+    script.write_text(
+        "import os\n"
+        "base = os.environ['PROCESSING_DIR']\n"
+        "rows = open(f'{base}/input/data.csv').read().splitlines()\n"
+        "open(f'{base}/output/count.txt', 'w').write(str(len(rows)))\n"
+    )
+    data_path = tmp_path / "data.csv"
+    data_path.write_text("a\n1\n")
+    step = ProcessingStep(
+        name="Count",
+        processor=ScriptProcessor(
+            image_uri="python",
+            command=["python3"],
+            role="role",
+            instance_count=1,
+            instance_type="ml.m5.xlarge",
+            sagemaker_session=get_session(),
+        ),
+        inputs=[
+            ProcessingInput(
+                source=str(data_path), destination="/opt/ml/processing/input"
+            )
+        ],
+        outputs=[
+            ProcessingOutput(output_name="count", source="/opt/ml/processing/output")
+        ],
+        code=str(script),
+    )
+    pipeline = Pipeline(name="local", steps=[step], sagemaker_session=get_session())
+
+    def run():
+        local_pipeline = LocalPipeline(
+            pipeline, str(tmp_path / "work"), cache_dir=str(tmp_path / "cache")
+        )
+        assert local_pipeline.run()
+        uri = local_pipeline.properties["Count"][
+            "ProcessingOutputConfig.Outputs['count'].S3Output.S3Uri"
+        ]
+        with open(local_pipeline.s3.get_uri_path(uri) + "/count.txt") as f:
+            return "Count" in local_pipeline.cache_hits, f.read()
+
+    assert run() == (False, "2")
+    assert run() == (True, "2")
+    # A changed input object changes the cache key
+    data_path.write_text("a\n1\n2\n")
+    assert run() == (False, "3")